@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+Local stand-in for the glider API and ERDDAP servers, replaying responses recorded
+with GLIDER_HTTP_RECORD. Point the scripts at it with
+GLIDER_HTTP_REPLAY=http://127.0.0.1:PORT
+
+Requests are served from /scheme/host/path?query. /__stats__ returns the number of
+requests and bytes served since the last /__reset__.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from requests.utils import requote_uri
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fixture_dir, latency=0, bandwidth=None):
+        super().__init__(address, ReplayHandler)
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'bytes': 0, 'missing': 0}
+
+    def count(self, **kwargs):
+        with self.lock:
+            for k, v in kwargs.items():
+                self.stats[k] += v
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/__stats__':
+            with server.lock:
+                body = json.dumps(server.stats).encode('utf-8')
+            self.send_body(200, body, 'application/json')
+            return
+        if self.path == '/__reset__':
+            server.reset()
+            self.send_body(200, b'{}', 'application/json')
+            return
+
+        scheme, _, rest = self.path.lstrip('/').partition('/')
+        url = f'{scheme}://{rest}'
+        # same normalization as glider_http.fixture_name
+        name = hashlib.sha256(requote_uri(url).encode('utf-8')).hexdigest()
+        body_file = os.path.join(server.fixture_dir, f'{name}.body')
+        meta_file = os.path.join(server.fixture_dir, f'{name}.json')
+        if server.latency:
+            time.sleep(server.latency)
+        if not os.path.isfile(body_file):
+            server.count(requests=1, missing=1)
+            print(f'No fixture for {url}', file=sys.stderr)
+            self.send_body(404, f'No fixture for {url}'.encode('utf-8'), 'text/plain')
+            return
+        with open(meta_file) as f:
+            meta = json.load(f)
+        with open(body_file, 'rb') as f:
+            body = f.read()
+        if server.bandwidth:
+            time.sleep(len(body)/server.bandwidth)
+        server.count(requests=1, bytes=len(body))
+        self.send_body(meta['status'], body, meta['content_type'])
+
+    def log_message(self, format, *args):
+        return
+
+
+def start(fixture_dir, port=0, latency=0, bandwidth=None):
+    """
+    Start a replay server in a background thread, returns the server (server.server_address
+    has the port if 0 was requested).
+    """
+    server = ReplayServer(('127.0.0.1', port), fixture_dir, latency, bandwidth)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(args):
+    server = ReplayServer(('127.0.0.1', args.port), args.fixtures, args.latency/1000,
+                          args.bandwidth*1e6 if args.bandwidth else None)
+    print(f'Replaying {args.fixtures} on http://127.0.0.1:{server.server_address[1]}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    return
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('-f', '--fixtures',
+                            help='directory of recorded responses',
+                            default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+
+    arg_parser.add_argument('-p', '--port',
+                            help='port to listen on',
+                            default=8765,
+                            type=int)
+
+    arg_parser.add_argument('-l', '--latency',
+                            help='delay added to every response (milliseconds)',
+                            default=0,
+                            type=float)
+
+    arg_parser.add_argument('-b', '--bandwidth',
+                            help='simulated bandwidth (MB/s); default unlimited',
+                            default=None,
+                            type=float)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
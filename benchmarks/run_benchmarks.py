@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+"""
+End-to-end benchmarks for the scripts, run against recorded API/ERDDAP responses.
+
+record: run each case in cases.json against the live servers, saving every response
+        to the fixtures directory (GLIDER_HTTP_RECORD)
+run:    start a replay server on the fixtures and run each case against it
+        (GLIDER_HTTP_REPLAY), reporting wall time, request count, bytes transferred
+        and peak memory. Exits 1 if a case regresses against the stored baselines.
+
+Case arguments can use {repo}, {fixtures} and {output}. Files a case needs other than
+http responses go in FIXTURES/files; a case with "listing" gets a synthetic
+fileopen_time listing there (see synthetic.py) if the file doesn't exist yet:
+    "listing": {"file": "NAME.txt", "glider": "ru40", "start": "2025-02-27T14:36", "n": 20000}
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+import replay_server
+import synthetic
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(bench_dir)
+scripts_dir = os.path.join(repo_dir, 'scripts')
+
+# how much worse than baseline a measurement can be before it counts as a regression
+tolerances = {'wall_time_s': 0.25, 'requests': 0, 'bytes': 0.05, 'peak_memory_mb': 0.2}
+
+
+def run_case(name, case, env, fixture_dir, output_dir):
+    """
+    Run one script in a subprocess, returns (returncode, wall time, peak memory MB)
+    """
+    fmt = {'repo': repo_dir, 'fixtures': fixture_dir, 'output': output_dir}
+    cmd = [sys.executable, os.path.join(scripts_dir, case['script'])] + [a.format(**fmt) for a in case['args']]
+    log_file = os.path.join(output_dir, f'{name}.log')
+    t0 = time.perf_counter()
+    with open(log_file, 'w') as log:
+        p = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=repo_dir, env=env)
+        _, status, rusage = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - t0
+    # ru_maxrss is in kilobytes on linux, bytes on macos
+    peak_memory = rusage.ru_maxrss/1024 if sys.platform != 'darwin' else rusage.ru_maxrss/1024/1024
+    return p.returncode, wall_time, peak_memory
+
+
+def make_case_files(case, fixture_dir):
+    """
+    Write the synthetic listing a case asks for, unless it is already there
+    """
+    listing = case.get('listing')
+    if not listing:
+        return
+    fname = os.path.join(fixture_dir, 'files', listing['file'])
+    if os.path.isfile(fname):
+        return
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    rng = synthetic.np.random.default_rng(listing.get('seed', 0))
+    rows = synthetic.binary_listing(os.path.join('/data', listing['glider']), listing['glider'], listing['start'],
+                                    listing['n'], rng)
+    with open(fname, 'w') as f:
+        f.write('\n'.join(synthetic.listing_lines(rows))+'\n')
+
+
+def case_env(cache_dir, **extra):
+    env = dict(os.environ)
+    env['GLIDER_CACHE_DIR'] = cache_dir
+    env['MPLBACKEND'] = 'Agg'
+    env.update(extra)
+    return env
+
+
+def compare(results, baselines):
+    regressions = []
+    for name, result in results.items():
+        if name not in baselines:
+            continue
+        for metric, tolerance in tolerances.items():
+            baseline = baselines[name].get(metric)
+            if baseline is None:
+                continue
+            if result[metric] > baseline*(1+tolerance) and result[metric] > baseline:
+                regressions.append(f'{name} {metric}: {result[metric]:.6g} (baseline {baseline:.6g})')
+    return regressions
+
+
+def main(args):
+    with open(args.cases) as f:
+        cases = json.load(f)
+    if args.only:
+        cases = {k: v for k, v in cases.items() if k in args.only.split(',')}
+    os.makedirs(args.output, exist_ok=True)
+
+    if args.mode == 'record':
+        os.makedirs(args.fixtures, exist_ok=True)
+        for name, case in cases.items():
+            make_case_files(case, args.fixtures)
+            with tempfile.TemporaryDirectory() as cache_dir:
+                env = case_env(cache_dir, GLIDER_HTTP_RECORD=args.fixtures, GLIDER_ERDDAP_CACHE='0')
+                returncode, wall_time, _ = run_case(name, case, env, args.fixtures, args.output)
+            print(f'recorded {name} ({wall_time:.1f} s, exit {returncode})')
+        return
+
+    server = replay_server.start(args.fixtures, latency=args.latency/1000)
+    replay = f'http://127.0.0.1:{server.server_address[1]}'
+    results = {}
+    for name, case in cases.items():
+        make_case_files(case, args.fixtures)
+        runs = []
+        for i in range(args.repeat):
+            cache_dir = tempfile.mkdtemp()
+            urlopen(f'{replay}/__reset__').read()
+            env = case_env(cache_dir, GLIDER_HTTP_REPLAY=replay)
+            if not args.warm_cache:
+                env['GLIDER_ERDDAP_CACHE'] = '0'
+            returncode, wall_time, peak_memory = run_case(name, case, env, args.fixtures, args.output)
+            stats = json.loads(urlopen(f'{replay}/__stats__').read())
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            runs.append({'returncode': returncode, 'wall_time_s': wall_time, 'requests': stats['requests'],
+                         'bytes': stats['bytes'], 'missing_fixtures': stats['missing'], 'peak_memory_mb': peak_memory})
+        # best of the repeats for time and memory, counts are the same every run
+        result = runs[0].copy()
+        result['wall_time_s'] = min(r['wall_time_s'] for r in runs)
+        result['peak_memory_mb'] = min(r['peak_memory_mb'] for r in runs)
+        results[name] = result
+    server.shutdown()
+
+    print(f"{'case':<22}{'exit':>5}{'time (s)':>10}{'requests':>10}{'MB':>10}{'peak MB':>10}{'missing':>9}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['returncode']:>5}{r['wall_time_s']:>10.2f}{r['requests']:>10}"
+              f"{r['bytes']/1e6:>10.2f}{r['peak_memory_mb']:>10.1f}{r['missing_fixtures']:>9}")
+
+    with open(os.path.join(args.output, 'results.json'), 'w') as f:
+        json.dump(results, f, indent=4)
+
+    if args.update_baselines:
+        baselines = {}
+        if os.path.isfile(args.baselines):
+            with open(args.baselines) as f:
+                baselines = json.load(f)
+        for name, r in results.items():
+            baselines[name] = {k: r[k] for k in tolerances}
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=4)
+        print(f'Baselines written to {args.baselines}')
+        return
+
+    if not os.path.isfile(args.baselines):
+        print(f'No baselines found at {args.baselines}, run with --update_baselines to create them.')
+        return
+
+    with open(args.baselines) as f:
+        baselines = json.load(f)
+    failed = [name for name, r in results.items() if r['returncode'] != 0]
+    regressions = compare(results, baselines)
+    for name in failed:
+        print(f'FAILED: {name} exited with {results[name]["returncode"]}, see {args.output}/{name}.log')
+    for r in regressions:
+        print(f'REGRESSION: {r}')
+    if failed or regressions:
+        return 1
+
+    return
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('mode',
+                            help='record fixtures from the live servers, or run benchmarks against them',
+                            choices=['record', 'run'])
+
+    arg_parser.add_argument('-c', '--cases',
+                            help='json file of benchmark cases',
+                            default=os.path.join(bench_dir, 'cases.json'))
+
+    arg_parser.add_argument('--only',
+                            help='run only these cases, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('-f', '--fixtures',
+                            help='directory of recorded responses',
+                            default=os.path.join(bench_dir, 'fixtures'))
+
+    arg_parser.add_argument('-o', '--output',
+                            help='directory for script output, logs and results.json',
+                            default=os.path.join(bench_dir, 'output'))
+
+    arg_parser.add_argument('-b', '--baselines',
+                            help='json file of baseline results',
+                            default=os.path.join(bench_dir, 'baselines.json'))
+
+    arg_parser.add_argument('--update_baselines',
+                            help='store this run as the new baselines instead of comparing',
+                            action='store_true')
+
+    arg_parser.add_argument('-l', '--latency',
+                            help='latency added to every replayed response (milliseconds)',
+                            default=50,
+                            type=float)
+
+    arg_parser.add_argument('-r', '--repeat',
+                            help='number of times to run each case (best time/memory is kept)',
+                            default=1,
+                            type=int)
+
+    arg_parser.add_argument('--warm_cache',
+                            help='leave the ERDDAP response cache on during runs, so responses repeated within a run come from disk; every run starts with an empty cache either way, and without this option the cache is off',
+                            action='store_true')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
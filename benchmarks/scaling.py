@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""
+Scaling benchmarks for the get_binary_info file checks, the check_tbd_gaps gap logic and
+the reconcile_binaries join on synthetic inputs (see synthetic.py) from 10^3 to 10^6 files/segments. Reports the
+time at each size and the scaling exponent between sizes (1 is linear, 2 quadratic).
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import synthetic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import get_binary_info
+import check_tbd_gaps
+import reconcile_binaries
+
+
+def run_binary_info(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lines = synthetic.listing_lines(synthetic.binary_listing('/data', 'ru00', '2024-01-01T12:00', n, rng))
+    t = time.perf_counter()
+    binary_list = get_binary_info.parse_binary_list(lines, cwd='/')
+    t0 = binary_list['time'].min()
+    t1 = binary_list['time'].max()
+    for ftype, files in binary_list.groupby('filetype'):
+        get_binary_info.analyze_filetype(files, ftype, t0, t1, 2, 2, 12, binary_list['directory'])
+    return time.perf_counter() - t, len(lines)
+
+
+def run_gaps(n, seed=0):
+    segment_info = synthetic.make_segments(n, seed=seed)
+    t = time.perf_counter()
+    segment_info = check_tbd_gaps.flag_segments(segment_info, True)
+    gap_times = check_tbd_gaps.find_gaps(segment_info)
+    check_tbd_gaps.gap_segments(segment_info, gap_times)
+    return time.perf_counter() - t, len(segment_info)
+
+
+def run_reconcile(n, seed=0):
+    rng = np.random.default_rng(seed)
+    names, shorts, _, _ = synthetic.segment_names('ru00', '2024-01-01', n, rng)
+    # 1% of segments missing from each side, files on disk under a mix of long and 8.3 names
+    in_erddap = rng.random(n) > 0.01
+    on_disk = rng.random(n) > 0.01
+    source_files = [f'{name}-{ftype}({short})' for ftype in ['sbd', 'tbd']
+                    for name, short, keep in zip(names, shorts, in_erddap) if keep]
+    disk_names = {ftype: [name if i % 2 else short for i, (name, short) in enumerate(zip(names, shorts)) if on_disk[i]]
+                  for ftype in ['sbd', 'tbd']}
+    t = time.perf_counter()
+    reconcile_binaries.reconcile(source_files, disk_names)
+    return time.perf_counter() - t, n
+
+
+def main(args):
+    benchmarks = {'binary_info': run_binary_info, 'gaps': run_gaps, 'reconcile': run_reconcile}
+    if args.kind != 'all':
+        benchmarks = {args.kind: benchmarks[args.kind]}
+    sizes = [10**p for p in range(3, int(np.log10(args.max_size))+1)]
+
+    for name, run in benchmarks.items():
+        print(f'\n{name}')
+        print(f"{'n':>10}{'time (s)':>12}{'us/item':>10}{'exponent':>10}")
+        previous = None
+        for n in sizes:
+            elapsed, count = run(n, args.seed)
+            exponent = ''
+            if previous:
+                exponent = f'{np.log(elapsed/previous[0])/np.log(count/previous[1]):.2f}'
+            print(f'{count:>10}{elapsed:>12.3f}{elapsed/count*1e6:>10.1f}{exponent:>10}', flush=True)
+            previous = (elapsed, count)
+            if elapsed > args.time_limit:
+                print(f'stopping, {elapsed:.0f} s is over the {args.time_limit} s limit')
+                break
+
+    return
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('kind',
+                            nargs='?',
+                            choices=['all', 'binary_info', 'gaps', 'reconcile'],
+                            default='all')
+
+    arg_parser.add_argument('-n', '--max_size',
+                            help='largest number of files/segments',
+                            default=10**6,
+                            type=int)
+
+    arg_parser.add_argument('-t', '--time_limit',
+                            help='skip larger sizes once one size takes longer than this (seconds)',
+                            default=120,
+                            type=float)
+
+    arg_parser.add_argument('-s', '--seed',
+                            default=0,
+                            type=int)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+Synthetic data for scale testing get_binary_info and check_tbd_gaps.
+
+tree:     fake Slocum binary directory tree (sparse files with real-looking ASCII headers
+          across dbd/ebd/sbd/tbd, duplicated into several directories, with gaps) plus the
+          grep 'fileopen_time' listing get_binary_info reads
+listing:  only the listing, for sizes too big to put on disk
+segments: segment table like the one check_tbd_gaps builds from ERDDAP, as csv, plus
+          the ERDDAP responses check_tbd_gaps requests for it, as replay fixtures
+          (see replay_server.py)
+"""
+
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+filetypes = ['dbd', 'ebd', 'sbd', 'tbd']
+header_template = """dbd_label:    DBD(dinkum_binary_data)file
+encoding_ver:    5
+num_ascii_tags:    14
+all_sensors:    0
+filename:    {name}
+the8x3_filename:    {short}
+filename_extension:    {ext}
+filename_label:    {name}-{ext}({short})
+mission_name:    MICRO.MI
+fileopen_time:    {fileopen}
+sensors_per_cycle:    {nsensors}
+num_label_lines:    3
+num_segments:    1
+segment_filename_0:    {name}
+"""
+
+
+def fileopen_times(times):
+    """
+    Slocum fileopen_time strings for a DatetimeIndex, e.g. Mon_Jan__1_00:00:00_2024
+    """
+    days = pd.Index(times.day.astype(str)).str.rjust(2, '_')
+    return list(times.strftime('%a_%b_') + days + times.strftime('_%H:%M:%S_%Y'))
+
+
+def segment_names(glider, start, n, rng, segment_hours=2, gap_fraction=0.01, gap_hours=(6, 48)):
+    """
+    Long and 8.3 names and open times for n consecutive segments, with some gaps
+    """
+    durations = rng.normal(segment_hours, segment_hours/4, n).clip(0.1)
+    gaps = np.where(rng.random(n) < gap_fraction, rng.uniform(*gap_hours, n), 0.05)
+    offsets = np.concatenate([[0], np.cumsum(durations+gaps)[:-1]])
+    times = pd.Timestamp(start) + pd.to_timedelta(offsets, unit='h')
+    mission = np.arange(n)//500
+    segment = np.arange(n) % 500
+    names = [f'{glider}-{y}-{d}-{m}-{s}' for y, d, m, s in zip(times.year, times.dayofyear-1, mission, segment)]
+    shorts = [f'{m:04d}{s:04d}' for m, s in zip(mission, segment)]
+    return names, shorts, times, durations
+
+
+def binary_listing(root, glider, start, n_files, rng, n_dirs=2, duplicate_fraction=0.5, **kwargs):
+    """
+    Rows of (path, name, short name, filetype, fileopen_time) spread across filetypes and
+    directories, about n_files in all. The first directory has every file, the others a
+    random duplicated subset, like binaries copied off the glider more than once.
+    """
+    n_segments = max(1, n_files//(len(filetypes)*(1+duplicate_fraction*(n_dirs-1))))
+    names, shorts, times, _ = segment_names(glider, start, int(n_segments), rng, **kwargs)
+    opens = fileopen_times(times)
+    rows = []
+    dirs = [os.path.join(root, f'from-glider-{d}') for d in range(n_dirs)]
+    for ext in filetypes:
+        for d, directory in enumerate(dirs):
+            keep = np.ones(len(names), dtype=bool) if d == 0 else rng.random(len(names)) < duplicate_fraction
+            for i in np.where(keep)[0]:
+                rows.append((os.path.join(directory, ext, f'{names[i]}.{ext}'), names[i], shorts[i], ext, opens[i]))
+    return rows
+
+
+def listing_lines(rows):
+    return [f'{path}:fileopen_time:    {t}' for path, name, short, ext, t in rows]
+
+
+def make_tree(root, glider, start, n_files, seed=0, file_size=256*1024, **kwargs):
+    """
+    Write sparse binary files with ASCII headers under root, returns the listing lines
+    """
+    rng = np.random.default_rng(seed)
+    rows = binary_listing(root, glider, start, n_files, rng, **kwargs)
+    for path, name, short, ext, t in rows:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = header_template.format(name=name, short=short, ext=ext, fileopen=t,
+                                        nsensors=rng.integers(20, 1800)).encode('ascii')
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.truncate(max(file_size, len(header)))
+    return listing_lines(rows)
+
+
+def make_segments(n_segments, glider='ru00', start='2024-01-01', seed=0, bad_fraction=0.02,
+                  gap_fraction=0.01, check_sci=True):
+    """
+    Segment table with the columns check_tbd_gaps builds before flagging gaps
+    """
+    rng = np.random.default_rng(seed)
+    names, shorts, times, durations = segment_names(glider, start, n_segments, rng, gap_fraction=gap_fraction)
+    n = len(names)
+    nDepth = rng.integers(500, 5000, n)
+    # runs of segments with no science data, as when tbds haven't come in
+    bad = np.zeros(n, dtype=bool)
+    starts = np.where(rng.random(n) < bad_fraction/5)[0]
+    for s in starts:
+        bad[s:s+rng.integers(1, 10)] = True
+    nTemp = np.where(bad, 0, (nDepth*rng.uniform(0.5, 1, n)).astype(int))
+    maxDepth = rng.uniform(20, 1000, n)
+    nProfiles = np.where(bad, 0, np.maximum(1, (nTemp/(maxDepth*3)).astype(int)))
+    t0 = pd.Series(times)
+    segment_info = pd.DataFrame({'source_file': [f'{name}-sbd({short})' for name, short in zip(names, shorts)],
+                                 't0': t0,
+                                 't1': t0 + pd.to_timedelta(durations, unit='h'),
+                                 'tLength': durations,
+                                 'nDepth': nDepth,
+                                 'nTemp': nTemp,
+                                 'maxDepth': maxDepth,
+                                 'nProfiles': nProfiles if check_sci else np.nan})
+    # ERDDAP hands back source files in name order, not time order
+    return segment_info.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def erddap_csv(df, units):
+    """
+    ERDDAP .csv response body: header row, units row, data
+    """
+    body = ','.join(df.columns) + '\n' + ','.join(units) + '\n' + df.to_csv(index=False, header=False)
+    return body.encode('utf-8')
+
+
+def write_fixture(fixture_dir, url, body, status=200, content_type='text/csv;charset=UTF-8'):
+    from glider_http import fixture_name
+    name = fixture_name(url)
+    with open(os.path.join(fixture_dir, f'{name}.body'), 'wb') as f:
+        f.write(body)
+    with open(os.path.join(fixture_dir, f'{name}.json'), 'w') as f:
+        json.dump({'url': url, 'status': status, 'content_type': content_type}, f)
+
+
+def segment_data(segment, rng, points=50):
+    times = pd.date_range(segment['t0'], segment['t1'], periods=points)
+    depth = rng.uniform(0, segment['maxDepth'], points)
+    depth[[0, -1]] = [0, segment['maxDepth']]
+    temp = np.full(points, np.nan) if segment['nTemp'] == 0 else rng.uniform(4, 28, points)
+    return pd.DataFrame({'time': times.strftime('%Y-%m-%dT%H:%M:%SZ'), 'depth': depth, 'sci_water_temp': temp})
+
+
+def make_gap_check_fixtures(fixture_dir, deployment, segment_info, seed=0, points=50):
+    """
+    Replay fixtures for the ERDDAP requests check_tbd_gaps makes for deployment
+    """
+    from erddapy import ERDDAP
+    from glider_http import ru_erddap_server
+    os.makedirs(fixture_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    ru_erddap = ERDDAP(server=ru_erddap_server, protocol='tabledap')
+    ru_erddap.dataset_id = f'{deployment}-trajectory-raw-rt'
+    ru_erddap.variables = ['source_file', 'time', 'depth', 'sci_water_temp']
+    segments = segment_info.sort_values(by='source_file')
+    data = pd.concat([segment_data(segment, rng, points).assign(source_file=segment['source_file'])
+                      for _, segment in segments.iterrows()], ignore_index=True)
+    write_fixture(fixture_dir, ru_erddap.get_download_url(response='csv'),
+                  erddap_csv(data[ru_erddap.variables], ['', 'UTC', 'm', 'degree_Celsius']))
+
+    ru_erddap_sci = ERDDAP(server=ru_erddap_server, protocol='tabledap')
+    ru_erddap_sci.dataset_id = f'{deployment}-profile-sci-rt'
+    ru_erddap_sci.variables = ['source_file', 'profile_time']
+    url = ru_erddap_sci.get_download_url(response='csv', distinct=True)
+    with_profiles = segments[segments['nProfiles'] > 0]
+    if len(with_profiles) > 0:
+        profiles = pd.concat([pd.DataFrame({'source_file': segment['source_file'],
+                                            'profile_time': pd.date_range(segment['t0'], segment['t1'], periods=int(segment['nProfiles'])).strftime('%Y-%m-%dT%H:%M:%SZ')})
+                              for _, segment in with_profiles.iterrows()], ignore_index=True)
+        write_fixture(fixture_dir, url, erddap_csv(profiles, ['', 'UTC']))
+    else:
+        write_fixture(fixture_dir, url, b'Error {\n    code=404;\n    message="Not Found: Your query produced no matching results.";\n}\n',
+                      status=404, content_type='text/plain;charset=UTF-8')
+
+
+def main(args):
+    os.makedirs(args.output, exist_ok=True)
+    deployment = f'{args.glider}-{pd.Timestamp(args.start).strftime("%Y%m%dT%H%M")}'
+    if args.kind == 'segments':
+        segment_info = make_segments(args.n, args.glider, args.start, args.seed)
+        fname = os.path.join(args.output, f'{deployment}_segments.csv')
+        segment_info.to_csv(fname, index=False)
+        if args.fixtures:
+            make_gap_check_fixtures(args.fixtures, deployment, segment_info, args.seed)
+            print(f'wrote ERDDAP fixtures for {deployment} to {args.fixtures}')
+    else:
+        if args.kind == 'tree':
+            lines = make_tree(os.path.join(args.output, deployment), args.glider, args.start, args.n, args.seed)
+        else:
+            rng = np.random.default_rng(args.seed)
+            lines = listing_lines(binary_listing(os.path.join(args.output, deployment), args.glider, args.start, args.n, rng))
+        fname = os.path.join(args.output, f'{deployment}_binary_open_times.txt')
+        with open(fname, 'w') as f:
+            f.write('\n'.join(lines)+'\n')
+    print(f'wrote {fname}')
+
+    return
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('kind',
+                            choices=['tree', 'listing', 'segments'])
+
+    arg_parser.add_argument('-n', '--n',
+                            help='number of binary files (tree, listing) or segments',
+                            default=1000,
+                            type=int)
+
+    arg_parser.add_argument('-o', '--output',
+                            help='output directory',
+                            default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output', 'synthetic'))
+
+    arg_parser.add_argument('-f', '--fixtures',
+                            help='segments only: also write ERDDAP replay fixtures for check_tbd_gaps to this directory',
+                            default=None)
+
+    arg_parser.add_argument('-g', '--glider',
+                            default='ru00')
+
+    arg_parser.add_argument('-t', '--start',
+                            help='deployment start time',
+                            default='2024-01-01T12:00')
+
+    arg_parser.add_argument('-s', '--seed',
+                            default=0,
+                            type=int)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -10,13 +10,209 @@ import sys
 import argparse
 import os
 import glob
+import json
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 from datetime import datetime, timezone
 from erddapy import ERDDAP
+from glider_http import ru_erddap_server
+from erddap_stream import GroupAggregator, aggregate_erddap
+import erddap_cache
+import glider_metrics
+from glider_metrics import stage
 warnings.simplefilter("ignore")
 
+# per-segment statistics from the raw trajectory (time, depth, sci_water_temp by source_file)
+segment_ops = {'t0': ('time', 'min'),
+               't1': ('time', 'max'),
+               'nDepth': ('depth', 'nonzero'),
+               'nTemp': ('sci_water_temp', 'nonzero'),
+               'maxDepth': ('depth', 'max')}
+
+
+def erddap_segment_info(deployment):
+    """
+    Segment statistics from the deployment's raw trajectory on the RU ERDDAP, in one
+    streamed request
+    """
+    ru_erddap = ERDDAP(server=ru_erddap_server, protocol='tabledap')
+    ru_erddap.dataset_id = f'{deployment}-trajectory-raw-rt'
+    ru_erddap.variables = ['source_file', 'time', 'depth', 'sci_water_temp']
+    return aggregate_erddap(ru_erddap, 'source_file', segment_ops)
+
+
+def erddap_profile_counts(deployment):
+    """
+    Number of science profiles per source file from the deployment's profile-sci dataset
+    """
+    ru_erddap_sci = ERDDAP(server=ru_erddap_server, protocol='tabledap')
+    ru_erddap_sci.dataset_id = f'{deployment}-profile-sci-rt'
+    ru_erddap_sci.variables = ['source_file', 'profile_time']
+    profiles = aggregate_erddap(ru_erddap_sci, 'source_file', {'nProfiles': ('profile_time', 'count')},
+                                distinct=True, time_columns=('profile_time',))
+    return profiles.set_index('source_file')['nProfiles']
+
+
+def nc_segment_info(fname):
+    """
+    Segment statistics for one NetCDF file, reading only time, depth, sci_water_temp
+    and source_file
+    """
+    import xarray as xr
+    with xr.open_dataset(fname) as ds:
+        time = pd.to_datetime(ds['time'].values)
+        n = len(time)
+        data = pd.DataFrame({'time': time})
+        for v in ['depth', 'sci_water_temp']:
+            data[v] = ds[v].values.astype(float) if v in ds.variables else np.full(n, np.nan)
+        source_file = ds['source_file'].values if 'source_file' in ds.variables else ds.attrs.get('source_file', os.path.basename(fname))
+        if np.ndim(source_file) == 0 or np.shape(source_file) != (n,):
+            # one source file for the whole nc file
+            source_file = np.full(n, np.asarray(source_file).ravel()[0] if np.size(source_file) else os.path.basename(fname), dtype=object)
+        data['source_file'] = [sf.decode('utf-8') if isinstance(sf, bytes) else str(sf) for sf in source_file]
+    aggregator = GroupAggregator('source_file', segment_ops)
+    aggregator.update(data)
+    return aggregator.result()
+
+
+def local_segment_info(nc_files, workers=None):
+    """
+    Segment statistics from the deployment's NetCDF output on disk, one file per process
+    """
+    aggregator = GroupAggregator('source_file', segment_ops)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(nc_segment_info, nc_files, chunksize=8):
+            aggregator.merge(result)
+    return aggregator.result()
+
+
+def flag_segments(segment_info, check_sci=True):
+    """
+    Sort segments by start time and flag those that look like they are missing
+    tbd data (tbdFlag) or science profiles (sciFlag)
+    """
+    segment_info = segment_info.sort_values(by='t0', ignore_index=True)
+    segment_info['tbdFlag'] = segment_info['nTemp']==0
+    if check_sci:
+        nopro = np.logical_and(segment_info['nProfiles']==0, segment_info['nTemp']>10)
+        notenoughprodata = segment_info['nTemp'] > segment_info['nProfiles']*segment_info['maxDepth']*3
+        segment_info['sciFlag'] = np.logical_and(nopro, notenoughprodata)
+    else:
+        segment_info['sciFlag'] = False
+    return segment_info
+
+
+def find_gaps(segment_info, fullgapthreshold=6, run_break=12):
+    """
+    Times (t0, t1) of runs of flagged segments (fullgap False; a new run starts when
+    flagged segments start more than run_break hours apart) and of stretches longer
+    than fullgapthreshold hours with no segments at all (fullgap True).
+    segment_info must be sorted by t0 (see flag_segments).
+    """
+    t0 = segment_info['t0'].to_numpy(dtype='datetime64[ns]')
+    t1 = segment_info['t1'].to_numpy(dtype='datetime64[ns]')
+    bad = (segment_info['tLength'] > 1).to_numpy() & (segment_info['tbdFlag'] | segment_info['sciFlag']).to_numpy(dtype=bool)
+
+    bad_t0 = t0[bad]
+    bad_t1 = t1[bad]
+    run_starts = np.array([], dtype=int)
+    run_ends = np.array([], dtype=int)
+    if len(bad_t0) > 0:
+        breaks = np.flatnonzero(np.diff(bad_t0) > np.timedelta64(run_break, 'h'))
+        run_starts = np.append(0, breaks+1)
+        run_ends = np.append(breaks, len(bad_t0)-1)
+
+    # hours between the end of each segment and the start of the next
+    empty = (t0[1:] - t1[:-1])/np.timedelta64(1, 'h') > fullgapthreshold
+
+    gap_times = pd.DataFrame({'t0': np.concatenate((bad_t0[run_starts], t1[:-1][empty])),
+                              't1': np.concatenate((bad_t1[run_ends], t0[1:][empty])),
+                              'fullgap': np.concatenate((np.zeros(len(run_starts), dtype=bool), np.ones(empty.sum(), dtype=bool)))})
+    return gap_times.sort_values(by='t0', kind='stable', ignore_index=True)
+
+
+def gap_segments(segment_info, gap_times):
+    """
+    Index of the segments starting in each gap (none for gaps with no data).
+    segment_info must be sorted by t0.
+    """
+    t0 = segment_info['t0'].to_numpy(dtype='datetime64[ns]')
+    first = np.searchsorted(t0, gap_times['t0'].to_numpy(dtype='datetime64[ns]'), side='left')
+    last = np.searchsorted(t0, gap_times['t1'].to_numpy(dtype='datetime64[ns]'), side='left')
+    last = np.where(gap_times['fullgap'].to_numpy(dtype=bool), first, last)
+    return [np.arange(a, b) for a, b in zip(first, last)]
+
+
+def binary_names(directory):
+    """
+    Long and 8.3 names (without extension) of the files in a binary directory
+    """
+    if not os.path.isdir(directory):
+        return set()
+    return {f.split('.', 1)[0] for f in os.listdir(directory) if not f.startswith('.')}
+
+
+def gap_report(segment_info, gap_times, gap_segment_index, tbd_names=None):
+    """
+    Gaps with the flagged segments in each, as a list of dicts. tbd_found is whether a
+    tbd file for the segment is on disk (None if not checked).
+    """
+    fmt = '%Y-%m-%dT%H:%M:%S'
+    gaps = []
+    for i in range(len(gap_times)):
+        segments = []
+        for k in gap_segment_index[i]:
+            sf = segment_info['source_file'][k]
+            tbd_found = None
+            if segment_info['tbdFlag'][k] and tbd_names is not None:
+                tbd_found = '-'.join(sf.split('-')[:5]) in tbd_names or sf.split('(')[-1][:-1] in tbd_names
+            segments.append({'source_file': sf,
+                             't0': segment_info['t0'][k].strftime(fmt),
+                             't1': segment_info['t1'][k].strftime(fmt),
+                             'tbdFlag': bool(segment_info['tbdFlag'][k]),
+                             'sciFlag': bool(segment_info['sciFlag'][k]),
+                             'tbd_found': tbd_found})
+        gaps.append({'t0': gap_times['t0'][i].strftime(fmt),
+                     't1': gap_times['t1'][i].strftime(fmt),
+                     'fullgap': bool(gap_times['fullgap'][i]),
+                     'segments': segments})
+    return gaps
+
+
+def print_status(status, max_lag):
+    """
+    Text report for one deployment's entry from main()
+    """
+    print(f"*****  {status['deployment']} data status:\n")
+
+    if status['lag_hours'] < max_lag and len(status['gaps'])==0:
+        print('No data gap issues found.\n\n')
+        return
+
+    if status['lag_hours'] > max_lag:
+        print(f"Latest data {status['latest_data'][:16]} ({round(status['lag_hours'],1)} hours)\n")
+
+    for gap in status['gaps']:
+        print(f"Gap from {gap['t0'][:16]} to {gap['t1'][:16]}")
+        if gap['fullgap']:
+            print('No data in this range.\n')
+            continue
+        print('Includes segments')
+        for segment in gap['segments']:
+            problems = []
+            if segment['tbdFlag']:
+                tbdtxt = 'possibly unprocessed tbd'
+                if segment['tbd_found'] is not None:
+                    tbdtxt += ' (FOUND)' if segment['tbd_found'] else ' (not found)'
+                problems.append(tbdtxt)
+            if segment['sciFlag']:
+                problems.append('possibly missing data in sci-profile')
+            print(f"{segment['source_file']} {', '.join(problems)}")
+        print('\n')
+
+
 def main(args):
     if type(args.check_tbds) is str and args.check_tbds.lower() in ['f', 'false']:
         args.check_tbds = False
@@ -28,141 +224,98 @@ def main(args):
         args.check_sci = True
     if type(args.slocum_dir) is str and args.slocum_dir.lower()=='none':
         args.slocum_dir = None
+    results = []
     for deployment in args.deployments:
         glider = '-'.join(deployment.split('-')[:-1])
         deployment_time = deployment.split('-')[-1]
         deployment_year = deployment_time[:4]   
+        if args.slocum_dir:
+            deployment_directory = os.path.join(args.slocum_dir, 'deployments', deployment_year, deployment)
+        if args.source == 'local' and not (args.slocum_dir and os.path.isdir(deployment_directory)):
+            print(f'Deployment directory for {deployment} not found under {args.slocum_dir}, unable to read local files.\n\n')
+            results.append({'deployment': deployment, 'error': 'Deployment directory not found'})
+            continue
         if args.check_tbds:
             if not args.slocum_dir:
                 print(f'Data directory not provided, unable to check tbd availability for {deployment}.\n')
                 args.check_tbds=False
             else:
-                deployment_directory = os.path.join(args.slocum_dir, 'deployments', deployment_year, deployment)
                 if not os.path.isdir(deployment_directory):
                     print(f'Deployment directory {deployment_directory} does not exist, check deployment name and/or data directory provided. Will not check for tbd availability.\n')
                     args.check_tbds=False
 
         try:
-            ru_erddap = ERDDAP(server='http://slocum-data.marine.rutgers.edu/erddap', protocol='tabledap')
-            ru_erddap.dataset_id = f'{deployment}-trajectory-raw-rt'
-
-            ru_erddap.variables = ['source_file']
-            segment_info = ru_erddap.to_pandas(distinct=True)
-            segment_info['t0'] = np.nan
-            segment_info['t1'] = np.nan
-            segment_info['tLength'] = np.nan
-            segment_info['nDepth'] = np.nan
-            segment_info['nTemp'] = np.nan
-            segment_info['maxDepth'] = np.nan
+            if args.source == 'local':
+                nc_files = sorted(glob.glob(os.path.join(deployment_directory, 'data', 'out', 'nc', args.nc_files)))
+                if len(nc_files)==0:
+                    print(f"No files matching {os.path.join(deployment_directory, 'data', 'out', 'nc', args.nc_files)}, unable to check {deployment}.\n\n")
+                    results.append({'deployment': deployment, 'error': 'No local NetCDF files'})
+                    continue
+                with stage('read nc files'):
+                    segment_info = local_segment_info(nc_files, args.workers)
+            else:
+                # one streamed request for the whole deployment, summarized per segment as it is read
+                with stage('fetch segment data'):
+                    segment_info = erddap_segment_info(deployment)
+            segment_info['tLength'] = (segment_info['t1']-segment_info['t0'])/np.timedelta64(1, 'h')
             segment_info['nProfiles'] = np.nan
 
-            ru_erddap.variables = ['time', 'depth', 'sci_water_temp']
-
             if args.check_sci:
-                ru_erddap_sci = ERDDAP(server='http://slocum-data.marine.rutgers.edu/erddap', protocol='tabledap')
-                ru_erddap_sci.dataset_id = f'{deployment}-profile-sci-rt'
-                ru_erddap_sci.variables = ['profile_time']
-
-            for f in range(len(segment_info)):
-                # print(f'{f}/{len(segment_info)}')
-                ru_erddap.constraints = {'source_file=': segment_info['source_file'][f]}
-                segment_data = ru_erddap.to_xarray()
-                segment_info['t0'][f] = pd.to_datetime(min(segment_data['time'].data))
-                segment_info['t1'][f] = pd.to_datetime(max(segment_data['time'].data))
-                segment_info['tLength'][f] = (segment_info['t1'][f]-segment_info['t0'][f]).total_seconds()/60/60
-                segment_info['nDepth'][f] = np.sum(np.logical_and(segment_data['depth'].data!=0, ~np.isnan(segment_data['depth'].data)))
-                segment_info['nTemp'][f] = np.sum(np.logical_and(segment_data['sci_water_temp'].data!=0, ~np.isnan(segment_data['sci_water_temp'].data)))
-                segment_info['maxDepth'][f] = np.nanmax(segment_data['depth'])
-                if args.check_sci:
-                    ru_erddap_sci.constraints = {'source_file=': segment_info['source_file'][f]}
-                    try:
-                        segment_data_sci = ru_erddap_sci.to_pandas(distinct=True)
-                        segment_info['nProfiles'][f] = len(segment_data_sci)
-                    except:
-                        segment_info['nProfiles'][f] = 0
+                try:
+                    with stage('fetch profiles'):
+                        nProfiles = erddap_profile_counts(deployment)
+                except:
+                    nProfiles = pd.Series(dtype=float)
+                    if args.source == 'local':
+                        # don't flag every segment when ERDDAP is down
+                        print(f'Unable to read {deployment}-profile-sci-rt, not checking science profiles.\n')
+                        nProfiles = None
+                if nProfiles is not None:
+                    segment_info['nProfiles'] = segment_info['source_file'].map(nProfiles).fillna(0)
         except:
-            print(f'Issue reading from dataset {deployment}-trajectory-raw-rt and/or {deployment}-profile-sci-rt using erddapy.\n\n')
+            if args.source == 'local':
+                print(f'Issue reading local NetCDF files for {deployment}.\n\n')
+            else:
+                print(f'Issue reading from dataset {deployment}-trajectory-raw-rt and/or {deployment}-profile-sci-rt using erddapy.\n\n')
+            results.append({'deployment': deployment, 'error': 'Issue reading segment data'})
             continue
 
         try:
-            segment_info = segment_info.sort_values(by='t0', ignore_index=True)
-            segment_info['tbdFlag'] = segment_info['nTemp']==0
-            if args.check_sci:
-                nopro = np.logical_and(segment_info['nProfiles']==0, segment_info['nTemp']>10)
-                notenoughprodata = segment_info['nTemp'] > segment_info['nProfiles']*segment_info['maxDepth']*3
-                segment_info['sciFlag'] = np.logical_and(nopro, notenoughprodata)
-            else:
-                segment_info['sciFlag'] = False
-            bad_segments = segment_info[np.logical_and(segment_info['tLength']>1, np.logical_or(segment_info['tbdFlag'], segment_info['sciFlag']))].copy().reset_index(drop=True)
-
-            empty_gaps = pd.DataFrame({'t0': segment_info['t1'][:-1].copy().reset_index(drop=True), 't1': segment_info['t0'][1:].copy().reset_index(drop=True)})
-            empty_gaps['gap'] = (pd.to_datetime(empty_gaps['t1']) - pd.to_datetime(empty_gaps['t0']))/np.timedelta64(1,'h')
-            
-            fullgapthreshold = 6
-            gap_times = pd.DataFrame()
-            if len(bad_segments)>0 or max(empty_gaps['gap'])>fullgapthreshold:
-                if len(bad_segments)>0:
-                    gap_times['t0'] = bad_segments['t0'][np.append(0, np.where(np.diff(bad_segments['t0'])>pd.Timedelta(hours=12))[0]+1)].copy().reset_index(drop=True)
-                    gap_times['t1'] = bad_segments['t1'][np.append(np.where(np.diff(bad_segments['t0'])>pd.Timedelta(hours=12))[0], len(bad_segments)-1)].copy().reset_index(drop=True)
-                    gap_times['fullgap'] = False
-                add_empty_gaps = pd.DataFrame()
-                add_empty_gaps['t0'] = empty_gaps['t0'][empty_gaps['gap']>fullgapthreshold].copy().reset_index(drop=True)
-                add_empty_gaps['t1'] = empty_gaps['t1'][empty_gaps['gap']>fullgapthreshold].copy().reset_index(drop=True)
-                add_empty_gaps['fullgap'] = True
-                gap_times = pd.concat((gap_times, add_empty_gaps), ignore_index=True)
-                gap_times = gap_times.sort_values(by='t0', ignore_index=True)
-
-            t_lag = (pd.to_datetime(datetime.now(timezone.utc)).replace(tzinfo=None)-segment_info['t1'][len(segment_info)-1]).total_seconds()/60/60
-
-            print(f'*****  {deployment} data status:\n')
-
-            if t_lag < args.max_lag and len(gap_times)==0:
-                print('No data gap issues found.\n\n')
-                continue
-                        
-            if t_lag > args.max_lag:
-                print(f"Latest data {segment_info['t1'][len(segment_info)-1].strftime('%Y-%m-%dT%H:%M')} ({round(t_lag,1)} hours)\n")
-            
-            for i in range(len(gap_times)):
-                print(f"Gap from {gap_times['t0'][i].strftime('%Y-%m-%dT%H:%M')} to {gap_times['t1'][i].strftime('%Y-%m-%dT%H:%M')}")
-                if gap_times['fullgap'][i]:
-                    print('No data in this range.\n')
-                    continue
-                print('Includes segments')
-                for sf in segment_info['source_file'][np.logical_and(segment_info['t0']>=gap_times['t0'][i], segment_info['t0']<gap_times['t1'][i])]:
-                    k = segment_info[segment_info['source_file']==sf].index[0]
-                    scitxt = ''
-                    tbdtxt = ''
-                    if segment_info['sciFlag'][k]:
-                        scitxt = 'possibly missing data in sci-profile'
-                    if segment_info['tbdFlag'][k]:
-                        tbdtxt = 'possibly unprocessed tbd'
-                        if args.check_tbds:
-                            tbd = glob.glob(os.path.join(deployment_directory, 'data', 'in', 'binary', 'tbd', '-'.join(sf.split('-')[:5])+'.*'))
-                            if len(tbd)==0:
-                                tbd = glob.glob(os.path.join(deployment_directory, 'data', 'in', 'binary', 'tbd', sf.split('(')[-1][:-1]+'.*'))
-                            if len(tbd)>0:
-                                tbdtxt += ' (FOUND)'
-                            else:
-                                tbdtxt += ' (not found)'
-                    if tbdtxt and scitxt:
-                        problem_info = ', '.join([tbdtxt, scitxt])
-                    elif tbdtxt:
-                        problem_info = tbdtxt
-                    elif scitxt:
-                        problem_info = scitxt
-                    else:
-                        problem_info = ''
-                    print(f'{sf} {problem_info}')
-                print('\n')
+            with stage('compute gaps'):
+                segment_info = flag_segments(segment_info, args.check_sci)
+                gap_times = find_gaps(segment_info)
+                gap_segment_index = gap_segments(segment_info, gap_times)
+                tbd_names = None
+                if args.check_tbds:
+                    tbd_names = binary_names(os.path.join(deployment_directory, 'data', 'in', 'binary', 'tbd'))
+                gaps = gap_report(segment_info, gap_times, gap_segment_index, tbd_names)
+
+            t_last = segment_info['t1'][len(segment_info)-1]
+            t_lag = (pd.to_datetime(datetime.now(timezone.utc)).replace(tzinfo=None)-t_last).total_seconds()/60/60
+            status = {'deployment': deployment,
+                      'latest_data': t_last.strftime('%Y-%m-%dT%H:%M:%S'),
+                      'lag_hours': t_lag,
+                      'nSegments': len(segment_info),
+                      'gaps': gaps}
+            results.append(status)
+            print_status(status, args.max_lag)
         except:
             print(f'Issue getting data gap information for {deployment}.\n\n')
+            results.append({'deployment': deployment, 'error': 'Issue getting data gap information'})
             continue
-    
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'generated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                       'max_lag_hours': args.max_lag,
+                       'deployments': results}, f, indent=2)
+
+    print(erddap_cache.report(), file=sys.stderr)
+
     return
 
 
-if __name__ == '__main__':
+def build_parser():
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
@@ -172,7 +325,8 @@ if __name__ == '__main__':
     
     arg_parser.add_argument('-l', '--max_lag',
                             help='longest data lag (hours since latest data) to allow before triggering email',
-                            default=6)
+                            default=6,
+                            type=float)
     
     arg_parser.add_argument('-d', '--slocum_dir',
                             help='base directory containing slocum data (only used if checking to see if tbds are available)',
@@ -186,6 +340,30 @@ if __name__ == '__main__':
                             help='whether to check profile-sci dataset to make sure there is data where it is also seen in raw-trajectory',
                             default=True)
     
-    parsed_args = arg_parser.parse_args()
+    arg_parser.add_argument('-s', '--source',
+                            help='where to read segment data: erddap (RU ERDDAP raw trajectory) or local (NetCDF output under SLOCUM_DIR/deployments/yyyy/deployment/data/out/nc)',
+                            choices=['erddap', 'local'],
+                            default='erddap')
+
+    arg_parser.add_argument('-nc', '--nc_files',
+                            help='local source only: NetCDF files to read, as a glob pattern relative to data/out/nc',
+                            default=os.path.join('trajectory', 'rt', '*.nc'))
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='local source only: number of processes reading files; default one per cpu',
+                            default=None,
+                            type=int)
+
+    arg_parser.add_argument('-j', '--json',
+                            help='also write the results to this json file',
+                            default=None)
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-    sys.exit(main(parsed_args))
+    sys.exit(glider_metrics.run(main, parsed_args))
@@ -0,0 +1,114 @@
+"""
+Local copy of the glider API deployment list, shared by the scripts.
+The list is downloaded once and stored as a typed DataFrame (pickle) in the cache
+directory, then reused until it is older than max_age. Filtering by project, glider,
+deployment and time is done on whole columns instead of looping over dicts.
+
+Cache directory: $GLIDER_CACHE_DIR (default ~/.cache/glider-bonus-content)
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from glider_http import glider_api, cache_dir, get_json
+
+catalog_file = os.path.join(cache_dir, 'deployments.pkl')
+
+ru_gliders = frozenset(['maracoos_02', 'maracoos_04', 'maracoos_05', 'ru25d', 'ru26d'] +
+                       ['ru'+str(ru).zfill(2) for ru in range(100)])
+
+
+def build_catalog(deployment_list):
+    """
+    Typed DataFrame from the 'data' list returned by the deployments/ API
+    """
+    catalog = pd.DataFrame(deployment_list)
+    catalog['start_date_epoch'] = pd.to_numeric(catalog['start_date_epoch'])
+    catalog['end_date_epoch'] = pd.to_numeric(catalog['end_date_epoch'])
+    catalog['start_time'] = pd.to_datetime(catalog['start_date_epoch'], unit='s')
+    catalog['end_time'] = pd.to_datetime(catalog['end_date_epoch'], unit='s')
+    catalog['ongoing'] = catalog['end_date_epoch'].isna() | (catalog['end_date_epoch'] == 0)
+    catalog['nDays'] = np.where(catalog['ongoing'], np.nan,
+                                (catalog['end_date_epoch']-catalog['start_date_epoch'])/60/60/24)
+    catalog['ru_glider'] = catalog['glider_name'].isin(ru_gliders)
+    catalog['glider_name'] = catalog['glider_name'].astype('category')
+    catalog['project_name'] = catalog['project_name'].astype('category')
+    return catalog
+
+
+def load_catalog(max_age=3600, refresh=False):
+    """
+    Deployment catalog from the local cache, downloaded again if the cached copy
+    is older than max_age seconds (None: never expires) or refresh is True.
+    """
+    if not refresh and os.path.isfile(catalog_file):
+        age = time.time() - os.path.getmtime(catalog_file)
+        if max_age is None or age < max_age:
+            try:
+                return pd.read_pickle(catalog_file)
+            except Exception:
+                pass
+
+    catalog = build_catalog(get_json(f'{glider_api}deployments/')['data'])
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f'{catalog_file}.{os.getpid()}.tmp'
+        catalog.to_pickle(tmp_file)
+        os.replace(tmp_file, catalog_file)
+    except OSError as e:
+        print(f'Unable to cache deployment catalog in {cache_dir}: {e}')
+    return catalog
+
+
+def filter_deployments(catalog, projects=None, gliders=None, deployments=None, t0=None, t1=None,
+                       logical_operator='and', overlap=False):
+    """
+    Select deployments from the catalog.
+    projects, gliders and deployments are lists of names; with logical_operator 'and'
+    a deployment has to match every list provided, with 'or' any of them.
+    t0/t1 limit deployment START time to the window, or with overlap=True keep any
+    deployment that was in the water at some point during the window.
+    """
+    name_matches = []
+    if projects:
+        name_matches.append(catalog['project_name'].isin(projects).to_numpy())
+    if gliders:
+        name_matches.append(catalog['glider_name'].isin(gliders).to_numpy())
+    if deployments:
+        name_matches.append(catalog['deployment_name'].isin(deployments).to_numpy())
+
+    if not name_matches:
+        keep = np.ones(len(catalog), dtype=bool)
+    elif logical_operator.lower() == 'or':
+        keep = np.logical_or.reduce(name_matches)
+    else:
+        keep = np.logical_and.reduce(name_matches)
+
+    if t0 is not None and t0 != '':
+        t0 = pd.to_datetime(t0)
+        if overlap:
+            keep &= ~(catalog['end_time'] < t0).to_numpy()
+        else:
+            keep &= (catalog['start_time'] >= t0).to_numpy()
+    if t1 is not None and t1 != '':
+        t1 = pd.to_datetime(t1)
+        keep &= (catalog['start_time'] <= t1).to_numpy()
+
+    return catalog[keep].reset_index(drop=True)
+
+
+def deployment_summary(catalog, distance=False):
+    """
+    The per-deployment columns written by the stats and sensor scripts, with nDays
+    'ongoing' for deployments that have not been recovered.
+    """
+    summary = pd.DataFrame({'deployment_name': catalog['deployment_name'].to_numpy(),
+                            'year': catalog['start_year'].to_numpy(),
+                            'glider': catalog['glider_name'].astype(str).to_numpy(),
+                            'ru_glider': catalog['ru_glider'].to_numpy(),
+                            'project': catalog['project_name'].astype(str).to_numpy(),
+                            'nDays': catalog['nDays'].astype(object).where(~catalog['ongoing'], 'ongoing').to_numpy()})
+    if distance:
+        summary['distance_km'] = catalog['distance_flown_km'].to_numpy()
+    return summary
@@ -0,0 +1,208 @@
+"""
+On-disk cache for ERDDAP tabledap, info and search responses, keyed by the full
+query url. How long a response is kept depends on the dataset it comes from:
+- delayed-mode datasets (*-delayed, *-profile-sci-delayed) never change once
+  published, so their responses are kept permanently
+- real-time (*-rt) and other datasets are kept for rt_max_age seconds
+- catalog searches and dataset lists (allDatasets) are revalidated with the server
+  (ETag/Last-Modified) every time
+
+Cache directory: $GLIDER_CACHE_DIR/erddap. Set GLIDER_ERDDAP_CACHE=0 to disable.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+import pandas as pd
+from glider_http import cache_dir, get, iter_body, dataset_list_url
+
+erddap_cache_dir = os.path.join(cache_dir, 'erddap')
+enabled = os.environ.get('GLIDER_ERDDAP_CACHE', '1').lower() not in ['0', 'false', 'no']
+
+# seconds to keep responses from real-time and other non delayed-mode datasets
+rt_max_age = 15*60
+
+stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'bytes_cached': 0, 'bytes_downloaded': 0}
+_stats_lock = threading.Lock()
+
+
+def count(**kwargs):
+    with _stats_lock:
+        for k, v in kwargs.items():
+            stats[k] += v
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in stats:
+            stats[k] = 0
+
+
+def cache_policy(url):
+    """
+    ('permanent', None), ('max_age', seconds) or ('revalidate', None) for an ERDDAP url
+    """
+    path = urlparse(url).path
+    if '/search/' in path or path.endswith('/categorize/index.csv') or '/tabledap/allDatasets.' in path:
+        return 'revalidate', None
+    match = re.search(r'/(?:tabledap|griddap)/([^/]+?)\.[^./]+$', path) or re.search(r'/info/([^/]+)/', path)
+    if match and match.group(1).endswith('-delayed'):
+        return 'permanent', None
+    return 'max_age', rt_max_age
+
+
+def cache_paths(url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    base = os.path.join(erddap_cache_dir, key[:2], key)
+    return base, f'{base}.json'
+
+
+def _write(path, data, mode='wb'):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, mode) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _load_meta(body_file, meta_file):
+    if not (os.path.isfile(body_file) and os.path.isfile(meta_file)):
+        return None
+    try:
+        with open(meta_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _fresh(meta, policy, max_age):
+    return policy == 'permanent' or (policy == 'max_age' and time.time() - meta['time'] < max_age)
+
+
+def _meta(url, response, policy):
+    return {'url': url,
+            'time': time.time(),
+            'policy': policy,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')}
+
+
+def _store(url, response, policy):
+    body_file, meta_file = cache_paths(url)
+    meta = _meta(url, response, policy)
+    try:
+        os.makedirs(os.path.dirname(body_file), exist_ok=True)
+        _write(body_file, response.content)
+        _write(meta_file, json.dumps(meta), mode='w')
+    except OSError as e:
+        print(f'Unable to write ERDDAP cache in {erddap_cache_dir}: {e}')
+
+
+def fetch(url):
+    """
+    Response body for an ERDDAP url, from the cache when it is still valid.
+    """
+    if not enabled:
+        content = get(url).content
+        count(misses=1, bytes_downloaded=len(content))
+        return content
+
+    policy, max_age = cache_policy(url)
+    body_file, meta_file = cache_paths(url)
+    meta = _load_meta(body_file, meta_file)
+
+    if meta:
+        if _fresh(meta, policy, max_age):
+            with open(body_file, 'rb') as f:
+                content = f.read()
+            count(hits=1, bytes_cached=len(content))
+            return content
+        if policy == 'revalidate' and (meta.get('etag') or meta.get('last_modified')):
+            headers = {}
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+            response = get(url, headers=headers)
+            if response.status_code == 304:
+                meta['time'] = time.time()
+                _write(meta_file, json.dumps(meta), mode='w')
+                with open(body_file, 'rb') as f:
+                    content = f.read()
+                count(revalidated=1, bytes_cached=len(content))
+                return content
+            _store(url, response, policy)
+            count(misses=1, bytes_downloaded=len(response.content))
+            return response.content
+
+    response = get(url)
+    _store(url, response, policy)
+    count(misses=1, bytes_downloaded=len(response.content))
+    return response.content
+
+
+def cached_file(url, chunk_size=1 << 20):
+    """
+    Path to the cached response body for an ERDDAP url, downloading it to the cache
+    in chunks (never holding the whole response in memory) when missing or stale.
+    None when the cache is disabled.
+    """
+    if not enabled:
+        return None
+    policy, max_age = cache_policy(url)
+    body_file, meta_file = cache_paths(url)
+    meta = _load_meta(body_file, meta_file)
+    if meta and _fresh(meta, policy, max_age):
+        count(hits=1, bytes_cached=os.path.getsize(body_file))
+        return body_file
+
+    response = get(url, stream=True)
+    os.makedirs(os.path.dirname(body_file), exist_ok=True)
+    tmp = f'{body_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    size = 0
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in iter_body(response, chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp, body_file)
+    finally:
+        response.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _write(meta_file, json.dumps(_meta(url, response, policy)), mode='w')
+    count(misses=1, bytes_downloaded=size)
+    return body_file
+
+
+def read_csv(url, **kwargs):
+    """
+    pd.read_csv on an ERDDAP url, through the cache
+    """
+    return pd.read_csv(io.BytesIO(fetch(url)), **kwargs)
+
+
+def read_erddap(e, distinct=False):
+    """
+    Same as glider_http.read_erddap, through the cache
+    """
+    url = e.get_download_url(response='csv', distinct=distinct)
+    return read_csv(url, skiprows=[1])
+
+
+def dataset_ids(server):
+    """
+    List of dataset ids on an ERDDAP server
+    """
+    ids = read_csv(dataset_list_url(server), skiprows=[1])['datasetID']
+    return list(ids[ids != 'allDatasets'])
+
+
+def report():
+    total = stats['hits'] + stats['misses'] + stats['revalidated']
+    return (f"ERDDAP cache: {stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} misses "
+            f"of {total} requests ({stats['bytes_cached']/1e6:.1f} MB from disk, {stats['bytes_downloaded']/1e6:.1f} MB downloaded)")
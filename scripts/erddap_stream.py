@@ -0,0 +1,156 @@
+"""
+Bounded-memory reads of large ERDDAP tabledap responses.
+The csv response is streamed (through the on-disk ERDDAP cache when it is enabled)
+and decoded chunk by chunk into typed columns: times as datetime64, everything else
+as float64 unless given a dtype. Aggregators are fed one chunk at a time, so e.g.
+per-segment statistics for a raw trajectory of any length take the memory of one
+chunk plus one row per segment:
+
+    stats = GroupAggregator('source_file', {'t0': ('time', 'min'), 'nDepth': ('depth', 'nonzero')})
+    for chunk in stream_erddap(e):
+        stats.update(chunk)
+    stats.result()
+"""
+
+import csv
+import io
+import pandas as pd
+from glider_http import get, iter_body
+import erddap_cache
+
+# rows per chunk
+chunk_rows = 200000
+
+
+class ResponseReader(io.RawIOBase):
+    """
+    Read-only file object over a streamed response body, for pd.read_csv
+    """
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = iter_body(response)
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            try:
+                self.buffer = next(self.chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        self.response.close()
+        super().close()
+
+
+def open_url(url):
+    """
+    Binary file object for an ERDDAP response body, from the cache when it is enabled
+    (downloaded to it in chunks if needed), otherwise streamed from the server
+    """
+    fname = erddap_cache.cached_file(url)
+    if fname:
+        return open(fname, 'rb')
+    return io.BufferedReader(ResponseReader(get(url, stream=True)))
+
+
+def stream_csv(url, time_columns=('time',), dtype=None, chunksize=None):
+    """
+    Iterate over an ERDDAP csv response as DataFrames of at most chunksize rows. The
+    units row is skipped, time_columns are parsed to (timezone naive, UTC)
+    datetime64 and other columns are float64 unless listed in dtype.
+    """
+    f = open_url(url)
+    try:
+        header = next(csv.reader([f.readline().decode('utf-8')]))
+        f.readline()  # units
+        dtypes = {c: 'float64' for c in header if c not in time_columns}
+        dtypes.update({c: str for c in time_columns if c in header})
+        dtypes.update(dtype or {})
+        for chunk in pd.read_csv(f, names=header, header=None, dtype=dtypes, chunksize=chunksize or chunk_rows):
+            for c in time_columns:
+                if c in chunk:
+                    chunk[c] = pd.to_datetime(chunk[c], utc=True).dt.tz_localize(None)
+            yield chunk
+    finally:
+        f.close()
+
+
+def stream_erddap(e, distinct=False, **kwargs):
+    """
+    stream_csv for the tabledap request set up on an erddapy ERDDAP instance
+    """
+    url = e.get_download_url(response='csv', distinct=distinct)
+    return stream_csv(url, **kwargs)
+
+
+class GroupAggregator:
+    """
+    Running per-group statistics over chunks of rows. ops maps each output column to
+    (input column, op), op one of
+    min, max     ignoring NaN
+    count        number of non-NaN values
+    nonzero      number of non-NaN, non-zero values
+    """
+
+    combine = {'min': 'min', 'max': 'max', 'count': 'sum', 'nonzero': 'sum'}
+
+    def __init__(self, by, ops):
+        self.by = by
+        self.ops = ops
+        self.partials = []
+        self.rows = 0
+
+    def update(self, chunk):
+        groups = chunk.groupby(self.by, sort=False)
+        part = {}
+        for name, (column, op) in self.ops.items():
+            if op == 'nonzero':
+                values = chunk[column]
+                part[name] = (values.notna() & (values != 0)).groupby(chunk[self.by], sort=False).sum()
+            else:
+                part[name] = groups[column].agg(op)
+        self.partials.append(pd.DataFrame(part))
+        self.rows += len(chunk)
+        # fold partial results together now and then so memory stays at one row per group
+        if len(self.partials) >= 16:
+            self.partials = [self._combine()]
+
+    def merge(self, result):
+        """
+        Add a result() computed elsewhere, e.g. by another process on part of the data
+        """
+        self.partials.append(result.set_index(self.by)[list(self.ops)])
+
+    def _combine(self):
+        if not self.partials:
+            return pd.DataFrame(columns=list(self.ops))
+        combined = pd.concat(self.partials)
+        return combined.groupby(level=0, sort=False).agg({name: self.combine[op] for name, (_, op) in self.ops.items()})
+
+    def result(self):
+        """
+        DataFrame with one row per group, the group key as a column
+        """
+        result = self._combine()
+        result.index.name = self.by
+        return result.reset_index()
+
+
+def aggregate_erddap(e, by, ops, distinct=False, **kwargs):
+    """
+    Stream a tabledap request and return the per-group statistics (see GroupAggregator)
+    """
+    aggregator = GroupAggregator(by, ops)
+    kwargs.setdefault('dtype', {by: str})
+    for chunk in stream_erddap(e, distinct=distinct, **kwargs):
+        aggregator.update(chunk)
+    return aggregator.result()
@@ -6,12 +6,146 @@ Last modified: lnazzaro 8/22/2024
 Check binary files for relevance to a specific deployment
 """
 
-import requests
 import pandas as pd
 import numpy as np
 import os
 import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from deployment_catalog import load_catalog
+import glider_metrics
+from glider_metrics import stage
+
+sci_types = ['EBD', 'TBD', 'ebd', 'tbd']
+
+
+def read_binary_list(binary_list_file):
+    with open(binary_list_file, errors='replace') as f:
+        return [line for line in f.read().splitlines() if line.strip()]
+
+
+def parse_binary_list(lines, cwd=None):
+    """
+    DataFrame of time, filetype, directory and filename from lines of
+    grep -r -a 'fileopen_time' output (path:fileopen_time:    Mon_Jan__1_00:00:00_2024)
+    """
+    if cwd is None:
+        cwd = os.getcwd()
+    lines = pd.Series(lines, dtype=str).str.replace(' ', '', regex=False)
+    parts = lines.str.split(':fileopen_time:', n=1, expand=True)
+    fullfile = parts[0]
+    binary_list = pd.DataFrame({'line': lines})
+    binary_list['time'] = pd.to_datetime(parts[1].str.replace('__', '_0', regex=False), format='%a_%b_%d_%H:%M:%S_%Y')
+    split = fullfile.str.rpartition('/')
+    datadir = split[0]
+    datadir = datadir.where(~datadir.isin(['', '.']), cwd)
+    datadir = datadir.where(~datadir.str.startswith('./'), cwd+datadir.str[1:])
+    binary_list['directory'] = datadir
+    binary_list['filename'] = split[2]
+    binary_list['filetype'] = split[2].str.rpartition('.')[2]
+    return binary_list
+
+
+def analyze_filetype(files, ftype, t0, t1, t0_warn, t1_warn, tgap_warn, all_directories):
+    """
+    Check the files of one filetype against the deployment start (t0) and end (t1) times.
+    Returns the report lines and a summary dict.
+    """
+    files = files.sort_values(by='time', ignore_index=True)
+    dir_counts = files['directory'].value_counts().sort_index()
+    longest_dir = dir_counts.idxmax()
+    longest_list = set(files['filename'][files['directory']==longest_dir])
+    in_deployment = np.logical_and(files['time']>=t0, files['time']<=t1)
+    full_list = set(files['filename'][in_deployment])
+
+    if full_list.issubset(longest_list):
+        files = files[files['directory']==longest_dir].reset_index(drop=True)
+
+    times = files['time'].to_numpy('datetime64[s]').astype('int64')
+    tgaps = np.diff(times)/60/60
+    dt0 = (times - t0.value//10**9)/60/60
+    dt1 = (t1.value//10**9 - times)/60/60
+
+    lines = [f'\nfiletype: {ftype}']
+    nfiles = files['filename'].nunique()
+    directories = np.unique(files['directory'])
+    if len(directories)==1:
+        lines.append(f'{nfiles} files in: {directories[0]}')
+    else:
+        lines.append(f'{nfiles} files split between: {", ".join(np.unique(all_directories))}')
+
+    summary = {'filetype': ftype, 'nFiles': nfiles, 'directories': ';'.join(directories),
+               'hoursBeforeStart': 0, 'noFilesNearStart': False, 'hoursAfterEnd': 0,
+               'noFilesNearEnd': False, 'nGaps': int(np.sum(tgaps>tgap_warn))}
+    if (dt0<-t0_warn).any():
+        summary['hoursBeforeStart'] = np.round(-np.min(dt0),2)
+        lines.append(f'Warning: these files include times {summary["hoursBeforeStart"]} hours before deployment start time.')
+    if not np.logical_and(dt0>0, dt0<tgap_warn).any():
+        summary['noFilesNearStart'] = True
+        lines.append(f'Warning: no files found within {tgap_warn} hours of deployment start time.')
+    if (dt1<-t1_warn).any():
+        summary['hoursAfterEnd'] = np.round(-np.min(dt1),2)
+        lines.append(f'Warning: these files include times {summary["hoursAfterEnd"]} hours after deployment end time.')
+    if not np.logical_and(dt1>0, dt1<tgap_warn).any():
+        summary['noFilesNearEnd'] = True
+        lines.append(f'Warning: no files found within {tgap_warn} hours of deployment end time.')
+    if summary['nGaps']:
+        lines.append(f'Warning: these files include {summary["nGaps"]} gaps over {tgap_warn} hours.')
+    return lines, summary
+
+
+def audit_deployment(deployment, binary_list_file, t0, t1, osversion, t0_warn, t1_warn, tgap_warn):
+    """
+    Check one deployment's binary file listing. Returns the report lines and a list of
+    summary dicts, one per filetype (runs in a worker process in batch mode).
+    """
+    lines = []
+    summaries = []
+    if not os.path.isfile(binary_list_file):
+        lines.append(f'{binary_list_file} not found, skipping deployment.\n')
+        summaries.append({'deployment': deployment, 'note': 'binary listing not found'})
+        return lines, summaries
+
+    # one bad listing only loses this deployment, not the rest of the batch
+    try:
+        lines.append(f"deployed {t0.strftime('%Y-%m-%d %H:%M')}")
+        if pd.isna(t1):
+            lines.append('not recovered')
+            t1 = pd.Timestamp.now(tz='UTC').tz_localize(None)
+        else:
+            lines.append(f"recovered {t1.strftime('%Y-%m-%d %H:%M')}")
+
+        binary_list = parse_binary_list(read_binary_list(binary_list_file))
+
+        filetypes = np.unique(binary_list['filetype'])
+        note = ''
+        if not any(x in sci_types for x in filetypes) and osversion>=7:
+            note = f'os version={osversion} but no dbds or tbds found'
+            lines.append(f'Warning: os version={osversion} but no dbds or tbds found. Science data logging updated in v7.0.')
+
+        for ftype, files in binary_list.groupby('filetype'):
+            ftype_lines, summary = analyze_filetype(files, ftype, t0, t1, t0_warn, t1_warn, tgap_warn, binary_list['directory'])
+            lines.extend(ftype_lines)
+            summaries.append(dict(deployment=deployment, **summary, note=note))
+    except Exception as e:
+        error = (str(e).splitlines() or [type(e).__name__])[0]
+        lines.append(f'Issue checking {binary_list_file} ({error}), skipping deployment.\n')
+        return lines, [{'deployment': deployment, 'note': f'unable to check binary listing: {error}'}]
+
+    lines.append('\n')
+    return lines, summaries
+
+
+def write_report(summaries, fname):
+    """
+    Combined per-deployment, per-filetype summary as csv, or json if fname ends in .json
+    """
+    report = pd.DataFrame(summaries)
+    if fname.lower().endswith('.json'):
+        report.to_json(fname, orient='records', indent=2, date_format='iso')
+    else:
+        report.to_csv(fname, index=False)
+
 
 def main(args):
     #deployment = 'ru01-20120617T1449'
@@ -20,100 +154,90 @@ def main(args):
     t1_warn = args.end_time_warning
     tgap_warn = args.gap_warning
     slocumdir = args.slocum_dir
-    binary_list_file = args.binary_info_file
-
-    glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
 
-    sci_types = ['EBD', 'TBD', 'ebd', 'tbd']
+    if not slocumdir and not args.binary_info_file:
+        build_parser().error('either -d/--slocum_dir or -f/--binary_info_file is required')
 
-    for deployment in args.deployments:
-        print(f'\nchecking files for deployment: {deployment}')
+    # every deployment's metadata from one (cached) catalog request
+    with stage('fetch catalog'):
+        catalog = load_catalog()
+    deployments = list(args.deployments)
+    if args.deployment_list:
+        deployments += read_binary_list(args.deployment_list)
+    if args.years:
+        in_years = catalog['start_time'].dt.year.isin(args.years).to_numpy()
+        deployments += sorted(catalog['deployment_name'][in_years])
+    deployments = list(dict.fromkeys(d.strip() for d in deployments))
+    if len(deployments)==0:
+        print('No deployments to check.')
+        return 1
+    if args.binary_info_file and len(deployments)>1:
+        build_parser().error('a single binary info file (-f) can only be used with one deployment')
 
+    catalog = catalog.set_index('deployment_name')
+    jobs = []
+    summaries = []
+    for deployment in deployments:
+        if deployment not in catalog.index:
+            print(f'\nchecking files for deployment: {deployment}')
+            print(f'{deployment} not found in deployment list, skipping deployment.\n')
+            summaries.append({'deployment': deployment, 'note': 'not in deployment list'})
+            continue
         deployment_time = deployment.split('-')[-1]
+        binary_list_file = args.binary_info_file
         if not binary_list_file:
             binary_list_file = os.path.join(slocumdir, deployment_time[:4], deployment, 'data', 'in', 'binary', f'{deployment}_binary_open_times.txt')
+        info = catalog.loc[deployment]
+        jobs.append((deployment, binary_list_file, info['start_time'], info['end_time'], info['os'], t0_warn, t1_warn, tgap_warn))
 
-        if not os.path.isfile(binary_list_file):
-            print(f'{binary_list_file} not found, skipping deployment.\n')
-            continue
-
-        deployment_info = requests.get(f'{glider_api}deployments/?deployment={deployment}').json()['data'][0]
-
-        t0 = pd.to_datetime(deployment_info['start_date_epoch'], unit='s')
-        t1 = pd.to_datetime(deployment_info['end_date_epoch'], unit='s')
-        osversion = deployment_info['os']
-
-        print(f"deployed {t0.strftime('%Y-%m-%d %H:%M')}")
-        print(f"recovered {t1.strftime('%Y-%m-%d %H:%M')}")
-
-        binary_list = pd.read_csv(binary_list_file, header=None)
-        binary_list.columns = ['line']
-        binary_list['time'] = None
-        binary_list['filetype'] = None
-        binary_list['directory'] = None
-        binary_list['filename'] = None
-        cwd = os.getcwd()
-
-        for i in binary_list.index:
-            fullfile, t = binary_list['line'][i].replace(' ','').split(':fileopen_time:')
-            binary_list.loc[i,'time'] = pd.to_datetime(t.replace('__','_0'), format='%a_%b_%d_%H:%M:%S_%Y')
-            datadir, file = os.path.split(fullfile)
-            if datadir=='' or datadir=='.':
-                datadir = cwd
-            elif datadir[:2]=='./':
-                datadir = cwd+datadir[1:]
-            binary_list.loc[i,'directory'] = datadir
-            binary_list.loc[i,'filename'] = file
-            binary_list.loc[i,'filetype'] = file.split('.')[-1]
+    with stage('audit'):
+        if args.workers > 1 and len(jobs) > 1:
+            pool = ProcessPoolExecutor(max_workers=args.workers)
+            results = pool.map(audit_deployment, *zip(*jobs))
+        else:
+            pool = None
+            results = (audit_deployment(*job) for job in jobs)
+        for job, (lines, deployment_summaries) in zip(jobs, results):
+            print(f'\nchecking files for deployment: {job[0]}')
+            print('\n'.join(lines))
+            summaries.extend(deployment_summaries)
+        if pool:
+            pool.shutdown()
 
-        filetypes = np.unique(binary_list['filetype'])
-        if not any(x in sci_types for x in filetypes) and osversion>=7:
-            print(f'Warning: os version={osversion} but no dbds or tbds found. Science data logging updated in v7.0.')
-
-        for ftype in filetypes:
-            files = binary_list[binary_list['filetype']==ftype].sort_values(by='time', ignore_index=True)
-            dirs = pd.DataFrame({'directory': np.unique(files['directory']), 'count': np.nan})
-            for i in dirs.index:
-                dirs.loc[i,'count'] = sum(files['directory']==dirs['directory'][i])
-            longest_list = list(files['filename'][files['directory']==dirs['directory'][np.where(dirs['count']==np.max(dirs['count']))[0][0]]])
-            full_list = list(np.unique(files['filename'][np.logical_and(pd.to_datetime(files['time'])>=pd.to_datetime(t0), pd.to_datetime(files['time'])<=pd.to_datetime(t1))]))
-
-            if set(full_list).issubset(longest_list):
-                files = files[files['directory']==dirs['directory'][np.where(dirs['count']==np.max(dirs['count']))[0][0]]].sort_values(by='time', ignore_index=True)
-
-            tgaps = np.diff(pd.to_datetime(files['time']).astype('int64')//1e9)/60/60
-            dt0 = (pd.to_datetime(files['time']).astype('int64')//1e9 - pd.to_datetime(t0).value//1e9)/60/60
-            dt1 = (pd.to_datetime(t1).value//1e9 - pd.to_datetime(files['time']).astype('int64')//1e9)/60/60
-
-            print(f'\nfiletype: {ftype}')
-
-            if len(np.unique(files['directory']))==1:
-                print(f'{len(np.unique(files["filename"]))} files in: {files["directory"][0]}')
-            else:
-                print(f'{len(np.unique(files["filename"]))} files split between: {", ".join(np.unique(binary_list["directory"]))}')
-
-            if (dt0<-t0_warn).any():
-                print(f'Warning: these files include times {np.round(-np.min(dt0),2)} hours before deployment start time.')
-            if not np.logical_and(dt0>0, dt0<tgap_warn).any():
-                print(f'Warning: no files found within {tgap_warn} hours of deployment start time.')
-            if (dt1<-t1_warn).any():
-                print(f'Warning: these files include times {np.round(-np.min(dt1),2)} hours after deployment end time.')
-            if not np.logical_and(dt1>0, dt1<tgap_warn).any():
-                print(f'Warning: no files found within {tgap_warn} hours of deployment end time.')
-            if (tgaps>tgap_warn).any():
-                print(f'Warning: these files include {np.sum(tgaps>tgap_warn)} gaps over {tgap_warn} hours.')
-
-        print('\n')
+    if args.report:
+        with stage('write'):
+            write_report(summaries, args.report)
+        print(f'Report written to {args.report}')
 
     return
 
-if __name__ == '__main__':
+
+def build_parser():
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
     arg_parser.add_argument('deployments',
-                            nargs='+',
+                            nargs='*',
                             help='Glider deployment name(s) formatted as glider-YYYYmmddTHHMM')
+
+    arg_parser.add_argument('-y', '--years',
+                            help='check every deployment that started in these year(s)',
+                            nargs='+',
+                            default=None,
+                            type=int)
+
+    arg_parser.add_argument('-l', '--deployment_list',
+                            help='file listing deployments to check, one per line',
+                            default=None)
+
+    arg_parser.add_argument('-o', '--report',
+                            help='write a combined per-deployment, per-filetype summary to this file (.csv or .json)',
+                            default=None)
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='number of processes checking deployments',
+                            default=os.cpu_count() or 1,
+                            type=int)
     
     arg_parser.add_argument('-d', '--slocum_dir',
                             help='base directory containing slocum data',
@@ -125,16 +249,25 @@ if __name__ == '__main__':
 
     arg_parser.add_argument('-gw', '--gap_warning',
                             help='warn if gap between binary file times greater than this (hours)',
-                            default=12)
+                            default=12,
+                            type=float)
     
     arg_parser.add_argument('-sw', '--start_time_warning',
                             help='warn if files exist earlier than start time of deployment minus this number (hours)',
-                            default=2)
+                            default=2,
+                            type=float)
     
     arg_parser.add_argument('-ew', '--end_time_warning',
                             help='warn if files exist later than end time of deployment plus this number (hours)',
-                            default=2)
+                            default=2,
+                            type=float)
     
-    parsed_args = arg_parser.parse_args()
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-    sys.exit(main(parsed_args))
\ No newline at end of file
+    sys.exit(glider_metrics.run(main, parsed_args))
@@ -6,64 +6,49 @@ Last modified: lnazzaro 5/6/2025
 Get sensors included in deployments from RU ERDDAP
 """
 
-import requests
 from erddapy import ERDDAP
 import pandas as pd
 import numpy as np
 import argparse
 import os
 import sys
+from glider_http import ru_erddap_server
+from erddap_cache import read_csv, dataset_ids
+import erddap_cache
+import glider_metrics
+from glider_metrics import stage
+from deployment_catalog import load_catalog, deployment_summary
 
-def main(args):
+def main(args, artifacts=None):
+    artifacts = artifacts or {}
     cfile = args.categories
     fname = args.output_file
 
-    ru_gliders = ['maracoos_02', 'maracoos_04', 'maracoos_05', 'ru25d', 'ru26d']
-    for ru in range(100):
-        ru_gliders.append('ru'+str(ru).zfill(2))
-
-    glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
-    deployment_list = requests.get(f'{glider_api}deployments/').json()['data']
-    glider_deployments_api = []
-    deployment_year =[]
-    project = []
-    length = []
-    glider = []
-    internal = []
-    for ad in deployment_list:
-        glider_deployments_api.append(ad['deployment_name'])
-        deployment_year.append(ad['start_year'])
-        project.append(ad['project_name'])
-        glider.append(ad['glider_name'])
-        if ad['glider_name'] in ru_gliders:
-            internal.append(True)
-        else:
-            internal.append(False)
-        if not ad['end_date_epoch']:
-            length.append('ongoing')
-        else:
-            length.append((ad['end_date_epoch']-ad['start_date_epoch'])/60/60/24)
-
-    deployment_info = pd.DataFrame({'deployment_name': glider_deployments_api, 'year': deployment_year, 
-                                    'glider': glider, 'ru_glider': internal, 'project': project, 'nDays': length})
-    
+    with stage('fetch catalog'):
+        catalog = artifacts['catalog'] if 'catalog' in artifacts else load_catalog()
+        deployment_info = deployment_summary(catalog)
+
     sensor_categories = pd.read_csv(cfile)
-    for c in np.unique(sensor_categories['category']):
+    categories = list(np.unique(sensor_categories['category']))
+    for c in categories:
         deployment_info[c] = 0
 
-    ru_erddap = ERDDAP(server='http://slocum-data.marine.rutgers.edu/erddap', protocol='tabledap')
+    ru_erddap = ERDDAP(server=ru_erddap_server, protocol='tabledap')
 
-    ru_dataset_list = list(pd.read_csv(ru_erddap.get_search_url(response='csv'))['Dataset ID'])
+    with stage('fetch dataset list'):
+        ru_dataset_list = artifacts['ru_datasets'] if 'ru_datasets' in artifacts else dataset_ids(ru_erddap_server)
 
     for n in range(len(deployment_info)):
         dep = deployment_info['deployment_name'][n]
         print(f'{dep} ({n+1}/{len(deployment_info)})')
         try:
-            dep_datasets = list(pd.read_csv(ru_erddap.get_search_url(search_for=dep, response='csv'))['Dataset ID'])
+            with stage('search datasets'):
+                dep_datasets = list(read_csv(ru_erddap.get_search_url(search_for=dep, response='csv'))['Dataset ID'])
         except:
             continue
         ru_erddap.dataset_id = dep_datasets[0]
-        all_info = pd.read_csv(ru_erddap.get_info_url(response='csv'))
+        with stage('fetch dataset info'):
+            all_info = read_csv(ru_erddap.get_info_url(response='csv'))
         all_vars = list(np.unique(all_info['Variable Name']))
         all_sensors = [i for i in all_vars if i.startswith('instrument_')]
         for s in all_sensors:
@@ -71,13 +56,25 @@ def main(args):
             deployment_info.loc[deployment_info['deployment_name']==dep, c]+=1
 
     if os.path.isdir(os.path.split(fname)[0]):
-        deployment_info.to_csv(fname, index=False)
+        with stage('write'):
+            deployment_info.to_csv(fname, index=False)
+            if args.inventory or args.xlsx:
+                # pyarrow/openpyxl are only needed for these outputs
+                from sensor_inventory import build_inventory, write_inventory, write_xlsx, read_not_on_erddap
+                inventory = build_inventory(deployment_info, catalog, categories)
+                if args.inventory:
+                    write_inventory(inventory, args.inventory)
+                if args.xlsx:
+                    write_xlsx(inventory, args.xlsx, read_not_on_erddap(args.xlsx))
     else:
         print(f'Unable to write detailed info to {fname}, directory does not exist.')
 
+    print(erddap_cache.report(), file=sys.stderr)
+
     return
 
-if __name__ == '__main__':
+
+def build_parser():
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
@@ -88,7 +85,21 @@ if __name__ == '__main__':
     arg_parser.add_argument('-o', '--output_file',
                             help='output file.',
                             default=os.path.join(os.getcwd(),'files','ru_glider_sensors.csv'))
+
+    arg_parser.add_argument('-i', '--inventory',
+                            help='also write the typed inventory (see sensor_inventory.py) to this file, e.g. files/ru_glider_sensors.feather',
+                            default=None)
+
+    arg_parser.add_argument('-x', '--xlsx',
+                            help='also write the xlsx summary to this file (the not_on_erddap sheet of an existing file is kept)',
+                            default=None)
     
-    parsed_args = arg_parser.parse_args()
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-    sys.exit(main(parsed_args))
\ No newline at end of file
+    sys.exit(glider_metrics.run(main, parsed_args))
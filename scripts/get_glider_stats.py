@@ -6,65 +6,40 @@ Last modified: lnazzaro 7/24/2024
 Check deployments in RU ERDDAP and DAC
 """
 
-import requests
-from erddapy import ERDDAP
 import pandas as pd
 import numpy as np
 import argparse
 import os
 import sys
-
-def main(args):
+from glider_http import ru_erddap_server, dac_erddap_server
+from erddap_cache import dataset_ids
+import erddap_cache
+import glider_metrics
+from glider_metrics import stage
+from deployment_catalog import load_catalog, deployment_summary
+
+def main(args, artifacts=None):
+    artifacts = artifacts or {}
     fname = args.status_file
 
-    ru_gliders = ['maracoos_02', 'maracoos_04', 'maracoos_05', 'ru25d', 'ru26d']
-    for ru in range(100):
-        ru_gliders.append('ru'+str(ru).zfill(2))
-
-    glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
-    deployment_list = requests.get(f'{glider_api}deployments/').json()['data']
-    glider_deployments_api = []
-    deployment_year =[]
-    project = []
-    length = []
-    glider = []
-    internal = []
-    for ad in deployment_list:
-        glider_deployments_api.append(ad['deployment_name'])
-        deployment_year.append(ad['start_year'])
-        project.append(ad['project_name'])
-        glider.append(ad['glider_name'])
-        if ad['glider_name'] in ru_gliders:
-            internal.append(True)
-        else:
-            internal.append(False)
-        if not ad['end_date_epoch']:
-            length.append('ongoing')
-        else:
-            length.append((ad['end_date_epoch']-ad['start_date_epoch'])/60/60/24)
-
-    deployment_status = pd.DataFrame({'deployment_name': glider_deployments_api, 'year': deployment_year, 
-                                    'glider': glider, 'ru_glider': internal, 'project': project, 'nDays': length,
-                                    'ru_rt': False, 'ru_delayed': False, 'dac_rt': False, 'dac_delayed': False,
-                                    'dac_alternate_name': '', 'notes': ''})
-
-    ru_erddap = ERDDAP(server='http://slocum-data.marine.rutgers.edu/erddap', protocol='tabledap')
-    dac_erddap = ERDDAP(server='https://gliders.ioos.us/erddap', protocol='tabledap')
-
-    ru_dataset_list = list(pd.read_csv(ru_erddap.get_search_url(response='csv'))['Dataset ID'])
-    dac_dataset_list = list(pd.read_csv(dac_erddap.get_search_url(response='csv'))['Dataset ID'])
-
-    for n in range(len(deployment_status)):
-        dep = deployment_status['deployment_name'][n]
-        #print(f'{dep} ({n+1}/{len(deployment_status)})')
-        if f'{dep}-profile-sci-rt' in ru_dataset_list:
-            deployment_status.loc[n,'ru_rt'] = True
-        if f'{dep}-profile-sci-delayed' in ru_dataset_list:
-            deployment_status.loc[n,'ru_delayed'] = True
-        if f'{dep}-delayed' in dac_dataset_list:
-            deployment_status.loc[n,'dac_delayed'] = True
-        if dep in dac_dataset_list:
-            deployment_status.loc[n,'dac_rt'] = True
+    with stage('fetch catalog'):
+        deployment_status = deployment_summary(artifacts['catalog'] if 'catalog' in artifacts else load_catalog())
+    for c in ['ru_rt', 'ru_delayed', 'dac_rt', 'dac_delayed']:
+        deployment_status[c] = False
+    deployment_status['dac_alternate_name'] = ''
+    deployment_status['notes'] = ''
+
+    with stage('fetch dataset lists'):
+        ru_dataset_list = artifacts['ru_datasets'] if 'ru_datasets' in artifacts else dataset_ids(ru_erddap_server)
+        dac_dataset_list = artifacts['dac_datasets'] if 'dac_datasets' in artifacts else dataset_ids(dac_erddap_server)
+
+    compute_timer = glider_metrics.start_stage('compute')
+
+    deps = deployment_status['deployment_name']
+    deployment_status['ru_rt'] = (deps+'-profile-sci-rt').isin(ru_dataset_list)
+    deployment_status['ru_delayed'] = (deps+'-profile-sci-delayed').isin(ru_dataset_list)
+    deployment_status['dac_delayed'] = (deps+'-delayed').isin(dac_dataset_list)
+    deployment_status['dac_rt'] = deps.isin(dac_dataset_list)
 
     deployment_status['ru_either'] = deployment_status[['ru_rt', 'ru_delayed']].max(axis=1)
     deployment_status['dac_either'] = deployment_status[['dac_rt', 'dac_delayed']].max(axis=1)
@@ -106,6 +81,8 @@ def main(args):
         for c in ['ru_rt','ru_delayed','ru_either','dac_rt','dac_delayed','dac_either']:
             new_deployments.loc[new_deployments[c]<0, c]=0
 
+    compute_timer.stop()
+
     print(f"{sum(deployment_status['dac_either'])}/{len(deployment_status)} datasets on the DAC ({sum(deployment_status['dac_delayed'])} delayed-mode)\n")
 
     print(f"{sum(deployment_status['dac_either'][deployment_status['ru_glider']])}/{sum(deployment_status['ru_glider'])} Rutgers datasets on the DAC ({sum(deployment_status['dac_delayed'][deployment_status['ru_glider']])} delayed-mode)\n")
@@ -155,14 +132,18 @@ def main(args):
     print(f"Note these statistics include {sum(deployment_status['notes']=='failed deployment')} failed deployments.")
 
     if os.path.isdir(os.path.split(fname)[0]):
-        deployment_status.to_csv(fname, index=False)
+        with stage('write'):
+            deployment_status.to_csv(fname, index=False)
         print(f'More detailed info available in {fname}.')
     else:
         print(f'Unable to write detailed info to {fname}, directory does not exist.')
 
+    print(erddap_cache.report(), file=sys.stderr)
+
     return
 
-if __name__ == '__main__':
+
+def build_parser():
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
@@ -170,6 +151,12 @@ if __name__ == '__main__':
                             help='file containing detailed status information. overwritten by this script.',
                             default=os.path.join(os.getcwd(),'files','glider_deployment_data_status.csv'))
     
-    parsed_args = arg_parser.parse_args()
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-    sys.exit(main(parsed_args))
\ No newline at end of file
+    sys.exit(glider_metrics.run(main, parsed_args))
@@ -0,0 +1,194 @@
+"""
+Shared HTTP client for the glider API and the RU and DAC ERDDAP servers.
+One requests session is kept per process so connections are reused, responses
+are gzip compressed, failed requests are retried with backoff, and the number of
+simultaneous requests (and the time between them) is limited per host so
+parallel jobs don't overload the ERDDAP servers.
+
+For benchmarking (see benchmarks/):
+GLIDER_HTTP_RECORD=DIR saves every response to DIR as a replayable fixture
+GLIDER_HTTP_REPLAY=http://HOST:PORT sends every request to a replay server instead
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import requote_uri
+from urllib3.util.retry import Retry
+import pandas as pd
+import glider_metrics
+
+glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
+ru_erddap_server = 'http://slocum-data.marine.rutgers.edu/erddap'
+dac_erddap_server = 'https://gliders.ioos.us/erddap'
+
+# local cache for downloaded responses, shared by the scripts
+cache_dir = os.environ.get('GLIDER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'glider-bonus-content'))
+
+# (max simultaneous requests, min seconds between starting requests) per host
+host_limits = {
+    'marine.rutgers.edu': (4, 0),
+    'slocum-data.marine.rutgers.edu': (4, 0.05),
+    'gliders.ioos.us': (2, 0.2),
+}
+default_host_limit = (4, 0)
+
+# (connect, read) timeout in seconds, ERDDAP can take a while to build large responses
+timeout = (10, 600)
+
+retries = Retry(total=4, connect=4, read=2, backoff_factor=1,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['GET', 'HEAD'],
+                respect_retry_after_header=True)
+
+record_dir = os.environ.get('GLIDER_HTTP_RECORD')
+replay_server = os.environ.get('GLIDER_HTTP_REPLAY')
+
+_session = None
+_session_lock = threading.Lock()
+_limiters = {}
+
+
+class HostLimiter:
+    """
+    Limit concurrent requests to one host and space out when they start
+    """
+
+    def __init__(self, max_concurrent, min_interval):
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_start = 0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        if self.min_interval:
+            with self.lock:
+                wait = self.next_start - time.monotonic()
+                self.next_start = max(self.next_start, time.monotonic()) + self.min_interval
+            if wait > 0:
+                time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+
+
+def limiter(host):
+    with _session_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(*host_limits.get(host, default_host_limit))
+        return _limiters[host]
+
+
+def session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(host_limits)+1, pool_maxsize=16, max_retries=retries)
+            s.mount('http://', adapter)
+            s.mount('https://', adapter)
+            s.headers.update({'Accept-Encoding': 'gzip, deflate'})
+            _session = s
+        return _session
+
+
+def fixture_name(url):
+    """
+    Fixture file name for a url, the same whether or not the url is already
+    percent-encoded (requests encodes e.g. the quotes in ERDDAP constraints on the wire)
+    """
+    return hashlib.sha256(requote_uri(url).encode('utf-8')).hexdigest()
+
+
+def replay_url(url):
+    """
+    Url on the replay server for an original url: http://HOST:PORT/scheme/host/path?query
+    """
+    u = urlparse(url)
+    query = f'?{u.query}' if u.query else ''
+    return f"{replay_server.rstrip('/')}/{u.scheme}/{u.netloc}{u.path}{query}"
+
+
+def record(url, response):
+    name = fixture_name(url)
+    meta = {'url': url,
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'application/octet-stream')}
+    os.makedirs(record_dir, exist_ok=True)
+    with open(os.path.join(record_dir, f'{name}.body'), 'wb') as f:
+        f.write(response.content)
+    with open(os.path.join(record_dir, f'{name}.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def get(url, params=None, stream=False, **kwargs):
+    """
+    GET a url through the shared session. Raises requests.HTTPError on a bad status.
+    """
+    kwargs.setdefault('timeout', timeout)
+    if record_dir:
+        # fixtures need the whole body, read streamed responses with iter_content
+        stream = False
+    if params:
+        url = requests.Request('GET', url, params=params).prepare().url
+    host = urlparse(url).hostname
+    request_url = replay_url(url) if replay_server else url
+    with limiter(host):
+        response = session().get(request_url, stream=stream, **kwargs)
+    glider_metrics.count('http_requests')
+    if not stream:
+        glider_metrics.count('http_bytes', len(response.content))
+    if record_dir and not stream:
+        record(url, response)
+    response.raise_for_status()
+    return response
+
+
+def iter_body(response, chunk_size=1 << 20):
+    """
+    Response body in chunks, for responses from get(url, stream=True). Streamed bytes
+    are counted as they are read.
+    """
+    # requests leaves _content False until the body has been read
+    counted = response._content is not False
+    for chunk in response.iter_content(chunk_size):
+        if not counted:
+            glider_metrics.count('http_bytes', len(chunk))
+        yield chunk
+
+
+def get_json(url, params=None, **kwargs):
+    return get(url, params=params, **kwargs).json()
+
+
+def read_csv(url, **kwargs):
+    """
+    pd.read_csv on a url, downloaded through the shared session
+    """
+    return pd.read_csv(io.BytesIO(get(url).content), **kwargs)
+
+
+def read_erddap(e, distinct=False):
+    """
+    Read the tabledap request set up on an erddapy ERDDAP instance into a DataFrame,
+    like e.to_pandas() but through the shared session. Columns are named by variable
+    only (the units row is dropped), e.g. 'time' rather than 'time (UTC)'.
+    """
+    url = e.get_download_url(response='csv', distinct=distinct)
+    return read_csv(url, skiprows=[1])
+
+
+def dataset_list_url(server):
+    """
+    tabledap url listing every dataset id on an ERDDAP server (same ids as an empty
+    search, without needing erddapy)
+    """
+    return f"{server.rstrip('/')}/tabledap/allDatasets.csv?datasetID"
@@ -6,21 +6,144 @@ Last modified: lnazzaro 10/28/2025
 Create deployments map and summary statistics, limited by project and/or glider name if interested
 """
 
-import requests
-from erddapy import ERDDAP
 import pandas as pd
 import numpy as np
 import argparse
 import os
 import sys
-import cool_maps.plot as cplt
-from cool_maps.download import get_bathymetry
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-import matplotlib.pyplot as plt
-import cmocean as cmo
-
-def main(args):
+from glider_http import ru_erddap_server
+from erddap_cache import dataset_ids, read_erddap
+import erddap_cache
+import glider_metrics
+from glider_metrics import stage
+from deployment_catalog import load_catalog, filter_deployments, deployment_summary
+
+def whole_world(extent):
+    return extent[0] <= -180 and extent[1] >= 180 and extent[2] <= -90 and extent[3] >= 90
+
+
+def index_window(coord, lo, hi, max_points):
+    """
+    Slice of a monotonic 1-D coordinate covering lo to hi (plus one cell on each side),
+    strided so it has at most max_points points
+    """
+    ascending = coord[-1] >= coord[0]
+    c = coord if ascending else coord[::-1]
+    i0 = max(int(np.searchsorted(c, lo, side='left'))-1, 0)
+    i1 = min(int(np.searchsorted(c, hi, side='right'))+1, len(c))
+    if not ascending:
+        i0, i1 = len(c)-i1, len(c)-i0
+    step = max(1, int(np.ceil((i1-i0)/max_points)))
+    return slice(i0, i1, step)
+
+
+def read_bathymetry(extent, fname=None, max_points=2000):
+    """
+    1-D longitude and latitude and 2-D elevation (float32, lat by lon) for an extent.
+    Grids in a local file (e.g. from GMRT) are opened lazily and only the window
+    covering the extent is read, every nth point when the grid is finer than
+    max_points along an axis. Without a file the grid is downloaded by cool_maps.
+    """
+    if fname:
+        import xarray as xr
+        with xr.open_dataset(fname) as ds:
+            lon_name = next((n for n in ['lon', 'longitude', 'x'] if n in ds.variables), None)
+            lat_name = next((n for n in ['lat', 'latitude', 'y'] if n in ds.variables), None)
+            z_name = next((n for n in ['z', 'elevation', 'altitude', 'Band1'] if n in ds.data_vars), None)
+            if lon_name is None or lat_name is None:
+                raise ValueError(f'no longitude/latitude coordinates in {fname}')
+            if z_name is None:
+                raise ValueError(f'no elevation variable in {fname}')
+            lon = ds[lon_name].values
+            lat = ds[lat_name].values
+            if lon.min() > extent[0] or lon.max() < extent[1] or lat.min() > extent[2] or lat.max() < extent[3]:
+                raise ValueError(f'{fname} does not cover {extent}')
+            lon_dim = ds[lon_name].dims[0]
+            lat_dim = ds[lat_name].dims[0]
+            xs = index_window(lon, extent[0], extent[1], max_points)
+            ys = index_window(lat, extent[2], extent[3], max_points)
+            z = ds[z_name].isel({lon_dim: xs, lat_dim: ys}).transpose(lat_dim, lon_dim).values
+        return lon[xs], lat[ys], z.astype(np.float32, copy=False)
+
+    from cool_maps.download import get_bathymetry
+    bathy = get_bathymetry(extent)
+    lon = bathy['longitude'].values
+    lat = bathy['latitude'].values
+    xs = slice(None, None, max(1, int(np.ceil(len(lon)/max_points))))
+    ys = slice(None, None, max(1, int(np.ceil(len(lat)/max_points))))
+    return lon[xs], lat[ys], bathy['z'].values[ys, xs].astype(np.float32)
+
+
+def bathymetry_source(fname):
+    return fname if fname else 'cool_maps download'
+
+
+def read_first_bathymetry(extent, sources, max_points, label='map'):
+    """
+    read_bathymetry from the first of sources (file names, None to download) that
+    works, saying which one was used when it isn't the first; None if none do
+    """
+    for i, source in enumerate(sources):
+        try:
+            bathy = read_bathymetry(extent, source, max_points)
+        except Exception as e:
+            fallback = f', trying {bathymetry_source(sources[i+1])}' if i+1 < len(sources) else ''
+            print(f'Unable to read bathymetry for {label} from {bathymetry_source(source)} ({e}){fallback}')
+            continue
+        if i > 0:
+            print(f'Using bathymetry from {bathymetry_source(source)} for {label}')
+        return bathy
+    print(f'Plotting {label} without bathymetry')
+    return None
+
+
+def log_elevation(z):
+    """
+    Signed log10 of elevation, in place: 0 where |z|<1, log10(z) above sea level and
+    -log10(-z) below
+    """
+    below = z < 0
+    np.abs(z, out=z)
+    np.maximum(z, 1, out=z)
+    np.log10(z, out=z)
+    np.negative(z, out=z, where=below)
+    return z
+
+
+def resample_track(xy, spacing):
+    """
+    Points every spacing (same units as xy) along a track
+    """
+    distance = np.append(0, np.cumsum(np.hypot(*np.diff(xy, axis=0).T)))
+    if len(xy) < 2 or distance[-1] == 0:
+        return xy[:1]
+    along = np.arange(0, distance[-1], spacing)
+    return np.column_stack([np.interp(along, distance, xy[:,0]), np.interp(along, distance, xy[:,1])])
+
+
+def track_density(tracks, proj, xlim, ylim, grid_size=500, spacing=None):
+    """
+    2-D histogram of track points in map projection coordinates over xlim, ylim, with
+    grid_size cells along x (and square cells). With spacing (projected km) tracks are
+    resampled to evenly spaced points first, so counts don't depend on how often
+    positions were reported. Returns x edges, y edges and counts (y by x, 0 masked).
+    """
+    nx = grid_size
+    ny = max(1, int(round(grid_size*(ylim[1]-ylim[0])/(xlim[1]-xlim[0]))))
+    points = [np.empty((0, 2))]
+    for track in tracks:
+        xy = proj['map'].transform_points(proj['data'], track[:,0], track[:,1])[:,:2]
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        if spacing and len(xy) > 0:
+            xy = resample_track(xy, spacing*1000)
+        points.append(xy)
+    points = np.concatenate(points)
+    counts, xedges, yedges = np.histogram2d(points[:,0], points[:,1], bins=[nx, ny], range=[xlim, ylim])
+    return xedges, yedges, np.ma.masked_equal(counts.T, 0)
+
+
+def main(args, artifacts=None):
+    artifacts = artifacts or {}
     projects = args.projects
     gliders = args.gliders
     if projects:
@@ -44,78 +167,99 @@ def main(args):
     bathy_file_inset = args.inset_bathymetry_file
     bathy_type = args.bathymetry_type
     projection = args.projection
-    if projection:
-        try:
-            projclass = getattr(ccrs, projection)
-            proj = {'map': projclass(), 'data': ccrs.PlateCarree()}
-            proj_inset = proj.copy()
-        except:
-            print(f'Projection {projection} not recognized. Using default.')
-            projection = None
-    if not projection:
-        if extent[1]-extent[0]<90 and extent[3]-extent[2]<90:
-            proj = {'map': ccrs.Mercator(), 'data': ccrs.PlateCarree()}
-        else:
-            proj = {'map': ccrs.Robinson(), 'data': ccrs.PlateCarree()}
-        if all(extent_inset) and extent_inset[1]-extent_inset[0]<90 and extent_inset[3]-extent_inset[2]<90:
-            proj_inset = {'map': ccrs.Mercator(), 'data': ccrs.PlateCarree()}
-        else:
-            proj_inset = {'map': ccrs.Robinson(), 'data': ccrs.PlateCarree()}
-
-    ru_gliders = ['maracoos_02', 'maracoos_04', 'maracoos_05', 'ru25d', 'ru26d']
-    for ru in range(100):
-        ru_gliders.append('ru'+str(ru).zfill(2))
-
-    glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
-    deployment_list = requests.get(f'{glider_api}deployments/').json()['data']
-    glider_deployments_api = []
-    deployment_year =[]
-    project = []
-    length = []
-    distance = []
-    glider = []
-    internal = []
-    for ad in deployment_list:
-        if projects and gliders and lo=='or':
-            if ad['project_name'] not in projects and ad['glider_name'] not in gliders:
-                continue
-        else:
-            if projects and ad['project_name'] not in projects:
-                continue
-            if gliders and ad['glider_name'] not in gliders:
-                continue
-        if ask:
-            confirm = input(f'Include deployment {ad["deployment_name"]}? ')
+    density = args.track_type=='density'
+    if map_file:
+        # mapping libraries take a few seconds to import, only load them for a map
+        import cartopy.crs as ccrs
+        import cartopy.feature as cfeature
+        import matplotlib.pyplot as plt
+        import cmocean as cmo
+        from matplotlib.colors import LogNorm
+        import cool_maps.plot as cplt
+        if projection:
+            try:
+                projclass = getattr(ccrs, projection)
+                proj = {'map': projclass(), 'data': ccrs.PlateCarree()}
+                proj_inset = proj.copy()
+            except:
+                print(f'Projection {projection} not recognized. Using default.')
+                projection = None
+        if not projection:
+            if extent[1]-extent[0]<90 and extent[3]-extent[2]<90:
+                proj = {'map': ccrs.Mercator(), 'data': ccrs.PlateCarree()}
+            else:
+                proj = {'map': ccrs.Robinson(), 'data': ccrs.PlateCarree()}
+            if all(extent_inset) and extent_inset[1]-extent_inset[0]<90 and extent_inset[3]-extent_inset[2]<90:
+                proj_inset = {'map': ccrs.Mercator(), 'data': ccrs.PlateCarree()}
+            else:
+                proj_inset = {'map': ccrs.Robinson(), 'data': ccrs.PlateCarree()}
+
+    with stage('fetch catalog'):
+        catalog = artifacts['catalog'] if 'catalog' in artifacts else load_catalog()
+    selected = filter_deployments(catalog, projects=projects, gliders=gliders, t0=t0, t1=t1, logical_operator=lo)
+    tracks = {}
+    if not whole_world(extent):
+        # skip deployments whose tracks never enter the map
+        from track_index import deployments_in_region, extent_geometry
+        with stage('fetch tracks'):
+            inside, tracks = deployments_in_region(selected, extent_geometry(extent))
+        print(f'{len(inside)}/{len(selected)} deployments enter the map extent')
+        selected = selected[selected['deployment_name'].isin(inside)].reset_index(drop=True)
+    ongoing = dict(zip(selected['deployment_name'], selected['ongoing']))
+    if ask:
+        include = np.ones(len(selected), dtype=bool)
+        for n, dep in enumerate(selected['deployment_name']):
+            confirm = input(f'Include deployment {dep}? ')
             if confirm and confirm[0].lower()=='n':
-                continue
-        if pd.to_datetime(ad['start_date_epoch'], unit='s')<t0 or pd.to_datetime(ad['start_date_epoch'], unit='s')>t1:
-            continue
-        print(f'Including deployment {ad["deployment_name"]}')
-        glider_deployments_api.append(ad['deployment_name'])
-        deployment_year.append(ad['start_year'])
-        project.append(ad['project_name'])
-        glider.append(ad['glider_name'])
-        distance.append(ad['distance_flown_km'])
-        if ad['glider_name'] in ru_gliders:
-            internal.append(True)
-        else:
-            internal.append(False)
-        if not ad['end_date_epoch']:
-            length.append('ongoing')
-        else:
-            length.append((ad['end_date_epoch']-ad['start_date_epoch'])/60/60/24)
-
-    deployment_info = pd.DataFrame({'deployment_name': glider_deployments_api, 'year': deployment_year, 
-                                    'glider': glider, 'ru_glider': internal, 'project': project, 'nDays': length,
-                                    'distance_km': distance, 'nProfiles': np.nan, 'mode': ''})
-
-    ru_erddap = ERDDAP(server='http://slocum-data.marine.rutgers.edu/erddap', protocol='tabledap')
-
-    ru_dataset_list = list(pd.read_csv(ru_erddap.get_search_url(response='csv'))['Dataset ID'])
-
-    ru_erddap.constraints = {}
-    ru_erddap.variables = ['profile_time']
+                include[n] = False
+        selected = selected[include].reset_index(drop=True)
+    for dep in selected['deployment_name']:
+        print(f'Including deployment {dep}')
 
+    deployment_info = deployment_summary(selected, distance=True)
+    if csv_file:
+        from track_index import load_tracks, track_metrics
+        missing = ~selected['deployment_name'].isin(list(tracks))
+        with stage('fetch tracks'):
+            tracks.update(load_tracks(selected[missing]))
+        with stage('track metrics'):
+            now = pd.Timestamp.now('UTC').tz_localize(None)
+            end = selected['end_time'].where(~selected['ongoing'], now)
+            durations = pd.Series((end-selected['start_time']).dt.total_seconds().to_numpy(), index=selected['deployment_name'])
+            metrics = track_metrics({dep: tracks[dep] for dep in selected['deployment_name'] if dep in tracks}, durations)
+            deployment_info = deployment_info.merge(metrics, on='deployment_name', how='left')
+    deployment_info['nProfiles'] = np.nan
+    deployment_info['mode'] = ''
+
+    if csv_file:
+        from erddapy import ERDDAP
+        ru_erddap = ERDDAP(server=ru_erddap_server, protocol='tabledap')
+
+        with stage('fetch dataset list'):
+            ru_dataset_list = artifacts['ru_datasets'] if 'ru_datasets' in artifacts else dataset_ids(ru_erddap_server)
+
+        ru_erddap.constraints = {}
+        ru_erddap.variables = ['profile_time']
+
+        deps = deployment_info['deployment_name']
+        delayed = (deps+'-profile-sci-delayed').isin(ru_dataset_list).to_numpy()
+        rt = (deps+'-profile-sci-rt').isin(ru_dataset_list).to_numpy()
+        deployment_info['mode'] = np.where(delayed, 'delayed', np.where(rt, 'rt', ''))
+        count_profiles = deployment_info['mode'].to_numpy()!=''
+        if os.path.isfile(csv_file) and not args.recompute_stats:
+            # profile counts can only change for ongoing deployments and datasets that
+            # are new or were promoted from rt to delayed since the last run
+            baseline = pd.read_csv(csv_file, dtype={'mode': str}).drop_duplicates('deployment_name').set_index('deployment_name')
+            baseline_mode = deps.map(baseline['mode'].fillna(''))
+            # counts are final only once the deployment was already recovered when they were made
+            reuse = (deps.isin(baseline.index) & (baseline_mode==deployment_info['mode']) &
+                     (deployment_info['nDays']!='ongoing') & (deps.map(baseline['nDays']).astype(str)!='ongoing') &
+                     deps.map(baseline['nProfiles']).notna()).to_numpy()
+            deployment_info.loc[reuse, 'nProfiles'] = deps[reuse].map(baseline['nProfiles'])
+            count_profiles &= ~reuse
+            print(f'Reusing profile counts for {reuse.sum()} deployments from {csv_file}, counting {count_profiles.sum()}')
+
+    render_timer = glider_metrics.start_stage('render')
     if map_file:
         state_lines = cfeature.NaturalEarthFeature(
             category='cultural',
@@ -139,48 +283,36 @@ def main(args):
             print('All bounds (east, west, north, south) for inset must be provided for one to be generated. Skipping inset.')
 
         if plot_bathy:
-            if all(extent_inset):
+            # reading is its own stage, keep it out of the render time
+            render_timer.stop()
+            with stage('read bathymetry'):
+                sources = ([bathy_file] if bathy_file and os.path.isfile(bathy_file) else []) + [None]
+                bathy = read_first_bathymetry(extent, sources, args.bathymetry_points)
+                if bathy is None:
+                    plot_bathy = False
                 bathy_inset = None
-                if bathy_file_inset and os.path.isfile(bathy_file_inset):
-                    bathy_inset = get_bathymetry(extent_inset, file=bathy_file_inset)
-                else:
-                    try:
-                        bathy_inset = get_bathymetry(extent_inset)
-                    except:
-                        print('Unable to read bathymetry for inset, trying full domain bathy')
-                        if not os.path.isfile(bathy_file):
-                            plot_bathy_inset = False
-            if bathy_file and os.path.isfile(bathy_file):
-                bathy = get_bathymetry(extent, file=bathy_file)
-                if all(extent_inset) and not bathy_inset:
-                    try:
-                        bathy_inset = get_bathymetry(extent_inset, file=bathy_file)
-                    except:
+                if all(extent_inset):
+                    if bathy_file_inset and os.path.isfile(bathy_file_inset):
+                        sources = [bathy_file_inset, None]
+                    else:
+                        sources = [None] + ([bathy_file] if bathy_file and os.path.isfile(bathy_file) else [])
+                    bathy_inset = read_first_bathymetry(extent_inset, sources, args.bathymetry_points, 'inset')
+                    if bathy_inset is None:
                         plot_bathy_inset = False
-            else:
-                try:
-                    bathy = get_bathymetry(extent)
-                except:
-                    print('Unable to read bathymetry')
-                    plot_bathy = False
+            render_timer = glider_metrics.start_stage('render')
             vlim = None
-            lons, lats = np.meshgrid(bathy['longitude'].data.copy(), bathy['latitude'].data.copy())
-            elevation = bathy['z'].data.copy()
-            elevation[np.abs(elevation)<1] = 0
-            elevation[elevation>0] = np.log10(elevation[elevation>0])
-            elevation[elevation<0] = -np.log10(np.abs(elevation[elevation<0]))
-            vlim = np.nanquantile(np.abs(elevation), 0.975)
-            if bathy_type=='blues':
-                elevation[elevation>0] = np.nan
-                h = ax.pcolormesh(lons, lats, elevation, cmap=plt.cm.Blues_r, vmin=-vlim, vmax=0, transform=proj['data'], zorder=5)
-            elif bathy_type=='topo':
-                h = ax.pcolormesh(lons, lats, elevation, cmap=cmo.cm.topo, vmin=-vlim, vmax=vlim, transform=proj['data'], zorder=5)
-            if all(extent_inset):
-                lons, lats = np.meshgrid(bathy_inset['longitude'].data.copy(), bathy_inset['latitude'].data.copy())
-                elevation = bathy_inset['z'].data.copy()
-                elevation[np.abs(elevation)<1] = 0
-                elevation[elevation>0] = np.log10(elevation[elevation>0])
-                elevation[elevation<0] = -np.log10(np.abs(elevation[elevation<0]))
+            if bathy is not None:
+                lons, lats, elevation = bathy
+                log_elevation(elevation)
+                vlim = np.nanquantile(np.abs(elevation), 0.975)
+                if bathy_type=='blues':
+                    elevation[elevation>0] = np.nan
+                    h = ax.pcolormesh(lons, lats, elevation, cmap=plt.cm.Blues_r, vmin=-vlim, vmax=0, transform=proj['data'], zorder=5)
+                elif bathy_type=='topo':
+                    h = ax.pcolormesh(lons, lats, elevation, cmap=cmo.cm.topo, vmin=-vlim, vmax=vlim, transform=proj['data'], zorder=5)
+            if bathy_inset is not None:
+                lons, lats, elevation = bathy_inset
+                log_elevation(elevation)
                 if not vlim:
                     vlim = np.nanquantile(np.abs(elevation), 0.975)
                 if bathy_type=='blues':
@@ -224,41 +356,63 @@ def main(args):
             except:
                 print('skipping inset ticks and gridlines')
 
+    render_timer.stop()
+
+    density_tracks = []
     for n in range(len(deployment_info)):
         dep = deployment_info['deployment_name'][n]
         print(f'Plotting and counting profiles for {dep}')
-        if csv_file:
-            datasetid = None
-            if f'{dep}-profile-sci-delayed' in ru_dataset_list:
-                datasetid = f'{dep}-profile-sci-delayed'
-                deployment_info['mode'][n] = 'delayed'
-            elif f'{dep}-profile-sci-rt' in ru_dataset_list:
-                datasetid = f'{dep}-profile-sci-rt'
-                deployment_info['mode'][n] = 'rt'
-            if datasetid:
-                ru_erddap.dataset_id = datasetid
-                protimes = ru_erddap.to_pandas(distinct=True)
-                protimes['time'] = pd.to_datetime(protimes['profile_time (UTC)'])
-                deployment_info['nProfiles'][n] = len(np.unique(protimes['time']))
+        if csv_file and count_profiles[n]:
+            ru_erddap.dataset_id = f"{dep}-profile-sci-{deployment_info['mode'][n]}"
+            with stage('fetch profiles'):
+                protimes = read_erddap(ru_erddap, distinct=True)
+            protimes['time'] = pd.to_datetime(protimes['profile_time'])
+            deployment_info.loc[n, 'nProfiles'] = len(np.unique(protimes['time']))
         if map_file:
-            deployment_track = np.vstack(requests.get(f'{glider_api}tracks/?deployment={dep}').json()['features'][0]['geometry']['coordinates'])
-            ax.plot(deployment_track[:,0], deployment_track[:,1], c='red', lw=2, transform=proj['data'], zorder=50)
+            from track_index import load_track
+            with stage('fetch tracks'):
+                deployment_track = tracks[dep] if dep in tracks else load_track(dep, ongoing[dep])
+            if density:
+                density_tracks.append(deployment_track)
+                continue
+            with stage('render'):
+                ax.plot(deployment_track[:,0], deployment_track[:,1], c='red', lw=2, transform=proj['data'], zorder=50)
+                if all(extent_inset):
+                    ax_inset.plot(deployment_track[:,0], deployment_track[:,1], c='red', lw=2, transform=proj_inset['data'], zorder=50)
+
+    if map_file and density:
+        # one layer of track point counts instead of a line per deployment
+        with stage('render'):
+            axes = [(ax, proj)]
             if all(extent_inset):
-                ax_inset.plot(deployment_track[:,0], deployment_track[:,1], c='red', lw=2, transform=proj_inset['data'], zorder=50)
+                axes.append((ax_inset, proj_inset))
+            for a, p in axes:
+                xedges, yedges, counts = track_density(density_tracks, p, a.get_xlim(), a.get_ylim(),
+                                                       args.grid_size, args.resample_km)
+                if counts.count() == 0:
+                    continue
+                hdensity = a.pcolormesh(xedges, yedges, counts, cmap=cmo.cm.thermal, norm=LogNorm(),
+                                        transform=p['map'], zorder=50)
+                a.figure.colorbar(hdensity, ax=a, shrink=0.6, pad=0.02,
+                                  label='track points per cell' if not args.resample_km else f'track points (every {args.resample_km:g} km) per cell')
 
     if csv_file:
         deployment_info.to_csv(csv_file, index=False)
     if map_file:
-        fig.savefig(map_file, dpi=300, bbox_inches='tight')
-        if extent_inset:
-            mapdir, mapfile = os.path.split(map_file)
-            mapfilename, mapfileext = os.path.splitext(mapfile)
-            fig_inset.savefig(os.path.join(mapdir, f'{mapfilename}_inset{mapfileext}'), dpi=300, bbox_inches='tight')
+        with stage('savefig'):
+            fig.savefig(map_file, dpi=300, bbox_inches='tight')
+            if all(extent_inset):
+                mapdir, mapfile = os.path.split(map_file)
+                mapfilename, mapfileext = os.path.splitext(mapfile)
+                fig_inset.savefig(os.path.join(mapdir, f'{mapfilename}_inset{mapfileext}'), dpi=300, bbox_inches='tight')
         plt.close('all')
 
+    print(erddap_cache.report(), file=sys.stderr)
+
     return
 
-if __name__ == '__main__':
+
+def build_parser():
     arg_parser = argparse.ArgumentParser(description=main.__doc__,
                                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
@@ -284,10 +438,14 @@ if __name__ == '__main__':
                             type=bool)
     
     arg_parser.add_argument('-csv', '--stats',
-                            help='file to write stats info (deployment length, number profiles, etc); default None (do not write any file)',
+                            help='file to write stats info (deployment length, number profiles, track distance, mean speed and largest gap between positions, etc); default None (do not write any file)',
                             default=None,
                             type=str)
     
+    arg_parser.add_argument('-rs', '--recompute_stats',
+                            help='count profiles for every deployment instead of reusing counts from the existing stats file for finished deployments whose dataset has not changed',
+                            action='store_true')
+    
     arg_parser.add_argument('-m', '--map',
                             help='file to write map; default None (do not print map)',
                             default=None,
@@ -364,11 +522,38 @@ if __name__ == '__main__':
                             default='blues',
                             type=str)
     
+    arg_parser.add_argument('-bp', '--bathymetry_points',
+                            help='most bathymetry grid points to read along each axis; finer grids are read every nth point',
+                            default=2000,
+                            type=int)
+    
     arg_parser.add_argument('-b', '--plot_bathymetry',
                             help='whether to plot bathymetry; default True',
                             default=True,
                             type=bool)
     
-    parsed_args = arg_parser.parse_args()
+    arg_parser.add_argument('-tt', '--track_type',
+                            help='draw each track as a line, or all tracks as one layer of track point density (faster and easier to read with many deployments)',
+                            choices=['lines', 'density'],
+                            default='lines',
+                            type=str)
+
+    arg_parser.add_argument('-gs', '--grid_size',
+                            help='density only: number of grid cells across the map',
+                            default=400,
+                            type=int)
+
+    arg_parser.add_argument('-rk', '--resample_km',
+                            help='density only: count points every this many (projected) km along each track instead of reported positions; default None (reported positions)',
+                            default=None,
+                            type=float)
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-    sys.exit(main(parsed_args))
\ No newline at end of file
+    sys.exit(glider_metrics.run(main, parsed_args))
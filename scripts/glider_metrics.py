@@ -0,0 +1,156 @@
+"""
+Timing and request accounting shared by the scripts.
+Wrap work in named stages (with stage('fetch catalog'): ...) and count events with
+count('http_requests'). Scripts add --profile and --metrics_json with add_arguments()
+and run main() through run(), which writes:
+--profile PREFIX      PREFIX.prof (cProfile stats), PREFIX.txt (top functions by
+                      cumulative time) and PREFIX_memory.txt (tracemalloc peak and
+                      top allocations)
+--metrics_json FILE   wall time, stage timings and counters as json (FILE.jsonl: one
+                      line appended per run, to follow trends from cron jobs)
+"""
+
+import cProfile
+import contextlib
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+stages = {}
+counters = {}
+_lock = threading.Lock()
+
+
+class StageTimer:
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+
+    def stop(self):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            total, n = stages.get(self.name, (0, 0))
+            stages[self.name] = (total + elapsed, n + 1)
+        return elapsed
+
+
+def start_stage(name):
+    """
+    Start timing a stage, call .stop() on the result when it is done. Time from
+    repeated stages with the same name adds up.
+    """
+    return StageTimer(name)
+
+
+@contextlib.contextmanager
+def stage(name):
+    timer = StageTimer(name)
+    try:
+        yield timer
+    finally:
+        timer.stop()
+
+
+def reset():
+    with _lock:
+        stages.clear()
+        counters.clear()
+    # response cache stats too, so each command run in one process reports its own
+    if 'erddap_cache' in sys.modules:
+        sys.modules['erddap_cache'].reset_stats()
+
+
+def count(name, n=1):
+    with _lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+def metrics():
+    result = {'stages': {k: {'seconds': round(v[0], 6), 'count': v[1]} for k, v in stages.items()},
+              'counters': dict(counters)}
+    # response cache stats, if the script used it
+    if 'erddap_cache' in sys.modules:
+        result['erddap_cache'] = dict(sys.modules['erddap_cache'].stats)
+    return result
+
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return maxrss/1024/1024 if sys.platform == 'darwin' else maxrss/1024
+
+
+def add_arguments(arg_parser):
+    arg_parser.add_argument('--profile',
+                            help='write cProfile and tracemalloc reports to PROFILE.prof, PROFILE.txt and PROFILE_memory.txt',
+                            nargs='?',
+                            const=os.path.splitext(os.path.basename(sys.argv[0]))[0] + '_profile',
+                            default=None)
+
+    arg_parser.add_argument('--metrics_json', '--metrics-json',
+                            help='write stage timings and request counts to this json file',
+                            default=None)
+    return arg_parser
+
+
+def write_profile(prefix, profiler):
+    profiler.dump_stats(f'{prefix}.prof')
+    with open(f'{prefix}.txt', 'w') as f:
+        pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    with open(f'{prefix}_memory.txt', 'w') as f:
+        f.write(f'peak traced memory: {peak/1e6:.1f} MB\n')
+        f.write(f'traced memory at exit: {current/1e6:.1f} MB\n\n')
+        f.write('top allocations still held at exit:\n')
+        for s in snapshot.statistics('lineno')[:25]:
+            f.write(f'{s}\n')
+    tracemalloc.stop()
+    return peak
+
+
+def run(main, args, name=None):
+    """
+    Call main(args) with profiling and metrics output as requested on the command line
+    """
+    profile = getattr(args, 'profile', None)
+    metrics_json = getattr(args, 'metrics_json', None)
+    started = datetime.now(timezone.utc)
+    profiler = None
+    if profile:
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    t0 = time.perf_counter()
+    try:
+        return main(args)
+    finally:
+        wall_time = time.perf_counter() - t0
+        traced_peak = None
+        if profiler:
+            profiler.disable()
+            traced_peak = write_profile(profile, profiler)
+            print(f'Profile written to {profile}.prof, {profile}.txt and {profile}_memory.txt', file=sys.stderr)
+        if metrics_json:
+            result = {'script': name or os.path.basename(sys.argv[0]),
+                      'started': started.isoformat(),
+                      'wall_time_s': round(wall_time, 6),
+                      'peak_memory_mb': peak_memory_mb()}
+            if traced_peak is not None:
+                result['traced_peak_memory_mb'] = traced_peak/1e6
+            result.update(metrics())
+            if metrics_json.endswith('.jsonl'):
+                with open(metrics_json, 'a') as f:
+                    f.write(json.dumps(result) + '\n')
+            else:
+                with open(metrics_json, 'w') as f:
+                    json.dump(result, f, indent=4)
@@ -6,115 +6,329 @@ Last modified: lnazzaro 7/27/2024
 Search glider deployment notes
 
 There are 8 deployments that the notes reader/API fails on for some reason:
-ru24-20120118T1748, ru07-20111214T1711, ru10-20111210T1200, ru06-20110920T1646, 
+ru24-20120118T1748, ru07-20111214T1711, ru10-20111210T1200, ru06-20110920T1646,
 silbo-20110623T1215, ru23-20101104T1440, ru10-20101010T1730, ru23-20101001T1850
+
+Run with search terms on the command line, with -i to be prompted for everything,
+or with --serve PORT to keep the deployment list and notes in memory and answer
+repeated searches over http, e.g.
+curl 'http://localhost:PORT/search?terms=ballast&method=any&gliders=ru33,ru34'
 """
 
-import requests
-from erddapy import ERDDAP
-import pandas as pd
-import numpy as np
 import re
 import sys
+import argparse
+import threading
+import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from glider_http import glider_api, get_json
+from deployment_catalog import load_catalog, filter_deployments
+import glider_metrics
+from glider_metrics import stage
 import warnings
 warnings.simplefilter("ignore")
 
+note_categories = ['Informational', 'Alert', 'Action Needed', 'Action Taken', 'Operations']
+
+
+def split_list(text):
+    if not text:
+        return []
+    if type(text) is list:
+        text = ' '.join(text)
+    return [x for x in re.split(',| |, ', text) if x]
+
+
+def split_categories(text):
+    """
+    Note category names separated by comma (names can contain spaces)
+    """
+    if not text:
+        return []
+    return [c.strip() for c in text.split(',') if c.strip()]
+
+
+def category_list(text):
+    """
+    argparse type for --categories, rejects unknown category names
+    """
+    categories = split_categories(text)
+    unknown = [c for c in categories if c not in note_categories]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown note categories: {', '.join(unknown)} (choose from {', '.join(note_categories)})")
+    return categories
+
+
+@functools.lru_cache(maxsize=256)
+def compile_matcher(search_terms, search_method):
+    """
+    Build a function that tells whether a note matches the search terms.
+    search_terms is a string, search_method one of 'exact', 'any', 'all'.
+    """
+    if not search_terms:
+        return lambda text: True
+    if search_method == 'exact':
+        pattern = re.compile(re.escape(search_terms), re.IGNORECASE)
+        return lambda text: bool(pattern.search(text))
+    words = split_list(search_terms)
+    if search_method == 'all':
+        patterns = [re.compile(re.escape(w), re.IGNORECASE) for w in words]
+        return lambda text: all(p.search(text) for p in patterns)
+    pattern = re.compile('|'.join(re.escape(w) for w in words), re.IGNORECASE)
+    return lambda text: bool(pattern.search(text))
+
+
+class NotesStore:
+    """
+    Deployment list and notes for each deployment, fetched from the glider API
+    once and kept in memory. Entries older than max_age seconds are refetched.
+    """
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._deployments = None
+        self._deployments_time = 0
+        self._notes = {}
+
+    def _expired(self, t):
+        return self.max_age is not None and time.time() - t > self.max_age
+
+    def deployments(self):
+        with self._lock:
+            if self._deployments is None or self._expired(self._deployments_time):
+                with stage('fetch catalog'):
+                    self._deployments = load_catalog() if self.max_age is None else load_catalog(max_age=self.max_age)
+                self._deployments_time = time.time()
+            return self._deployments
+
+    def notes(self, deployment):
+        cached = self._notes.get(deployment)
+        if cached is not None and not self._expired(cached[0]):
+            return cached[1]
+        with stage('fetch notes'):
+            notes = get_json(f'{glider_api}notes/?deployment={deployment}')['data']
+        self._notes[deployment] = (time.time(), notes)
+        return notes
+
+
+def search_deployments(store, deployments, matcher, categories=None, authors=None, workers=4):
+    """
+    Generator yielding (deployment, matching notes) as each deployment is searched,
+    in deployment order. Notes are None if they could not be read.
+    """
+    def search_one(deployment):
+        try:
+            notes = store.notes(deployment)
+        except Exception:
+            return deployment, None
+        found = []
+        for note in notes:
+            if categories and note['category_name'] not in categories:
+                continue
+            if authors and note['added_by'] not in authors:
+                continue
+            if matcher(note['pilot_notes'] or ''):
+                found.append(note)
+        return deployment, found
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for deployment, found in executor.map(search_one, deployments):
+            yield deployment, found
+
+
+def format_results(deployment, notes):
+    if notes is None:
+        return f'\n******* Unable to access deployment notes for {deployment} *******\n\n'
+    if not notes:
+        return ''
+    text = f'\n******* Search Results for Deployment {deployment} *******\n\n'
+    for note in notes:
+        text += f"** {note['category_name']} note from {note['added_by']} on {note['date_added']}:\n\n"
+        text += f"{note['pilot_notes']}\n\n"
+    return text
+
+
+def run_search(store, search, write, workers=4):
+    """
+    search is a dict with the same keys as the command line arguments.
+    Results are passed to write() as soon as each deployment has been searched.
+    """
+    matcher = compile_matcher(search.get('search_terms') or '', search.get('search_method') or 'exact')
+    # a deployment is searched if it matches any of the deployments, gliders or projects listed
+    # and was in the water during the time window
+    deployments = filter_deployments(store.deployments(),
+                                     deployments=split_list(search.get('deployments')),
+                                     gliders=split_list(search.get('gliders')),
+                                     projects=split_list(search.get('projects')),
+                                     t0=search.get('t0'), t1=search.get('t1'),
+                                     logical_operator='or', overlap=True)['deployment_name']
+    categories = [c for c in note_categories if c in (search.get('categories') or note_categories)]
+    authors = split_list(search.get('authors'))
+    for deployment, notes in search_deployments(store, deployments, matcher, categories, authors, workers):
+        text = format_results(deployment, notes)
+        if text:
+            write(text)
+
+
+def prompt_args(args):
+    args.search_terms = input('Hey there! What are we looking for?\n')
+    search_method = input('How do you want to search? (any words/all words/exact phrase, default: exact phrase): ')
+    args.search_method = 'exact'
+    if 'word' in search_method.lower():
+        args.search_method = 'all' if 'all' in search_method.lower() else 'any'
+    args.deployments = input('List specific deployments to search, separated by spaces (default: all): ')
+    args.gliders = input('List specific gliders to search, separated by spaces (default: all): ')
+    args.t0 = input('List earliest time to search (YYYY-mm-dd HH:MM, default: beginning of time): ')
+    args.t1 = input('List latest time to search (YYYY-mm-dd HH:MM, default: present): ')
+    args.projects = input('List projects to search, separated by spaces (default: all): ')
+    args.categories = list(note_categories)
+    category = input('Search all notes categories? (y/n, default: y): ')
+    if category.lower() in ['n', 'no', 'false']:
+        for c in note_categories:
+            csearch = input(f'Search {c} notes? (y/n, default: y): ')
+            if csearch.lower() in ['n', 'no', 'false']:
+                args.categories.remove(c)
+    args.authors = input('List usernames of note authors to search, separated by spaces (default: all): ')
+    return args
+
+
+def make_handler(store, workers):
+    class SearchHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.0'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.rstrip('/') != '/search':
+                self.send_error(404, 'use /search?terms=...')
+                return
+            query = {k: ','.join(v) for k, v in parse_qs(url.query).items()}
+            search = {'search_terms': query.get('terms', ''),
+                      'search_method': query.get('method', 'exact'),
+                      'deployments': query.get('deployments'),
+                      'gliders': query.get('gliders'),
+                      'projects': query.get('projects'),
+                      't0': query.get('t0'),
+                      't1': query.get('t1'),
+                      'categories': [c for c in note_categories if c in split_categories(query.get('categories'))] or None,
+                      'authors': query.get('authors')}
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.end_headers()
+
+            def write(text):
+                self.wfile.write(text.encode('utf-8'))
+                self.wfile.flush()
+
+            try:
+                run_search(store, search, write, workers)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            return
+
+    return SearchHandler
+
+
+def main(args):
+    if args.interactive:
+        args = prompt_args(args)
+    else:
+        args.search_terms = ' '.join(args.search_terms)
+        args.categories = args.categories or None
+
+    if args.serve:
+        store = NotesStore(max_age=args.cache_age*60)
+        store.deployments()
+        server = ThreadingHTTPServer((args.host, args.serve), make_handler(store, args.workers))
+        print(f'Serving notes search on http://{args.host}:{args.serve}/search', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    print('\n\nSearch Results:\n\n', flush=True)
+    run_search(NotesStore(), vars(args), lambda text: print(text, end='', flush=True), args.workers)
+
+    return
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('search_terms',
+                            nargs='*',
+                            help='text to search for in pilot notes (default: match all notes)')
+
+    arg_parser.add_argument('-m', '--search_method',
+                            help='exact: match the search terms as one phrase; any/all: match any/all of the words',
+                            choices=['exact', 'any', 'all'],
+                            default='exact')
+
+    arg_parser.add_argument('-d', '--deployments',
+                            help='deployments to search, separated by comma no space (default: all)',
+                            default=None)
+
+    arg_parser.add_argument('-g', '--gliders',
+                            help='gliders to search, separated by comma no space (default: all)',
+                            default=None)
+
+    arg_parser.add_argument('-p', '--projects',
+                            help='projects to search, separated by comma no space (default: all)',
+                            default=None)
+
+    arg_parser.add_argument('-t0', '--t0',
+                            help='earliest time to search, YYYY-mm-ddTHH:MM (default: beginning of time)',
+                            default=None)
+
+    arg_parser.add_argument('-t1', '--t1',
+                            help='latest time to search, YYYY-mm-ddTHH:MM (default: present)',
+                            default=None)
+
+    arg_parser.add_argument('-c', '--categories',
+                            help=f'note categories to search, separated by comma ({",".join(note_categories)}; default: all)',
+                            default=None,
+                            type=category_list)
+
+    arg_parser.add_argument('-u', '--authors',
+                            help='usernames of note authors to search, separated by comma no space (default: all)',
+                            default=None)
+
+    arg_parser.add_argument('-i', '--interactive',
+                            help='prompt for all search options instead of reading them from the command line',
+                            action='store_true')
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='number of deployments to fetch notes for at the same time',
+                            default=4,
+                            type=int)
+
+    arg_parser.add_argument('--serve',
+                            help='run as a server on this port, keeping deployments and notes in memory between searches',
+                            default=None,
+                            type=int)
+
+    arg_parser.add_argument('--host',
+                            help='address to listen on in server mode',
+                            default='127.0.0.1')
+
+    arg_parser.add_argument('--cache_age',
+                            help='minutes to keep deployments and notes in memory before refetching (server mode)',
+                            default=60,
+                            type=float)
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-search_terms = input('Hey there! What are we looking for?\n')
-search_method = input('How do you want to search? (any words/all words/exact phrase, default: exact phrase): ')
-if 'word' in search_method.lower():
-    search_terms = re.split(',| |, ', search_terms)
-
-# limit deployments by:
-# deployment_name
-deployments = input('List specific deployments to search, separated by spaces (default: all): ')
-deployments = re.split(',| |, ', deployments)
-# glider_name
-gliders = input('List specific gliders to search, separated by spaces (default: all): ')
-gliders = re.split(',| |, ', gliders)
-# start_date_epoch
-t0 = input('List earliest time to search (YYYY-mm-dd HH:MM, default: beginning of time): ')
-# end_date_epoch
-t1 = input('List latest time to search (YYYY-mm-dd HH:MM, default: present): ')
-# project_name
-projects = input('List projects to search, separated by spaces (default: all): ')
-projects = re.split(',| |, ', projects)
-
-# limit notes by:
-# category_name
-categories = ['Informational', 'Alert', 'Action Needed', 'Action Taken', 'Operations']
-category = input('Search all notes categories? (y/n, default: y): ')
-if category.lower() in ['n', 'no', 'false']:
-    for c in categories:
-        csearch = input('Search {c} notes? (y/n, default: y): ')
-        if csearch.lower() in ['n', 'no', 'false']:
-            categories.remove(c)
-# added_by
-authors = input('List usernames of note authors to search, separated by spaces (default: all): ')
-authors = re.split(',| |, ', authors)
-
-
-glider_api = 'https://marine.rutgers.edu/cool/data/gliders/api/'
-deployment_list = pd.DataFrame(requests.get(f'{glider_api}deployments/').json()['data'])
-
-deployment_list['search'] = False
-
-if deployments[0]:
-    deployment_list['search'][deployment_list['deployment_name'].isin(deployments)] = True
-if gliders[0]:
-    deployment_list['search'][deployment_list['glider_name'].isin(gliders)] = True
-if projects[0]:
-    deployment_list['search'][deployment_list['project_name'].isin(projects)] = True
-if not deployment_list['search'].any():
-    deployment_list['search'] = True
-if t0:
-    deployment_list['search'][deployment_list['end_date_epoch']<pd.Timestamp(t0).timestamp()] = False
-if t1:
-    deployment_list['search'][deployment_list['start_date_epoch']>pd.Timestamp(t1).timestamp()] = False
-
-
-print('\n\nSearch Results:\n\n')
-
-for deployment in deployment_list['deployment_name'][deployment_list['search']]:
-    try:
-        deployment_notes = pd.DataFrame(requests.get(f'{glider_api}notes/?deployment={deployment}').json()['data'])
-    except:
-        print(f'\n******* Unable to access deployment notes for {deployment} *******\n')
-        continue
-    if len(deployment_notes)==0:
-        continue
-    deployment_notes['search'] = False
-
-    if authors[0]:
-        deployment_notes['search'][deployment_notes['added_by'].isin(authors)] = True
-    if categories[0]:
-        deployment_notes['search'][deployment_notes['category_name'].isin(categories)] = True
-    
-    if not deployment_notes['search'].any():
-        continue
-
-    deployment_notes = deployment_notes[deployment_notes['search']]
-    s=False
-
-    # search in: pilot_notes
-    for n in range(len(deployment_notes)):
-        printnote = True
-        if search_terms:
-            if type(search_terms) is not list:
-                search_terms = [search_terms]
-            printnote = False
-            for w in search_terms:
-                if w.lower() in deployment_notes['pilot_notes'][n].lower():
-                    printnote = True
-                elif 'all' in search_method.lower():
-                    printnote = False
-                    break
-        if printnote:
-            if not s:
-                print(f'\n******* Search Results for Deployment {deployment} *******\n')
-                s=True
-            print(f"** {deployment_notes['category_name'][n]} note from {deployment_notes['added_by'][n]} on {deployment_notes['date_added'][n]}:\n")
-            print(f"{deployment_notes['pilot_notes'][n]}\n")
-
-
-sys.exit()
\ No newline at end of file
+    sys.exit(glider_metrics.run(main, parsed_args))
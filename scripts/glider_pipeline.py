@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+"""
+Run the fleet report scripts (stats, sensors, map) as one pipeline. The deployment
+catalog and the RU and DAC ERDDAP dataset lists are fetched once and handed to every
+job that uses them, jobs run at the same time in separate processes (their output is
+printed in one piece when each finishes), and a job is skipped when its arguments,
+the shared data it uses and its input files are the same as the last time it ran and
+its output files are still there. The map/stats job also counts profiles and loads
+tracks of ongoing deployments, which change without the shared data changing, so it
+runs every time while the catalog has ongoing deployments (or every max_age seconds
+if the job sets one).
+
+Jobs are listed in a json file:
+{
+    "stats": {"command": "stats", "args": ["-f", "/data/glider_status.csv"],
+              "outputs": ["/data/glider_status.csv"]},
+    "sensors": {"command": "sensors", "args": ["-c", "sensor_categories.csv", "-o", "/data/sensors.csv"],
+                "inputs": ["sensor_categories.csv"], "outputs": ["/data/sensors.csv"]},
+    "map": {"command": "map", "args": ["-csv", "/data/fleet.csv", "-m", "/data/fleet.png"],
+            "outputs": ["/data/fleet.png"], "after": ["stats"], "max_age": 86400}
+}
+command     glider_tools subcommand (or script name)
+args        its command line arguments
+inputs      files the job reads (a change to one reruns the job)
+outputs     files the job writes (the job reruns if one is missing)
+after       jobs that have to finish first
+max_age     rerun after this many seconds even if nothing changed, for jobs that also
+            read data that isn't shared (e.g. profile counts of ongoing deployments).
+            Set on a map job, it replaces rerunning every time
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from glider_http import cache_dir, ru_erddap_server, dac_erddap_server
+from glider_tools import subcommands
+import glider_metrics
+from glider_metrics import stage
+
+state_file = os.path.join(cache_dir, 'pipeline_state.json')
+
+# shared data each script can take instead of fetching it
+job_artifacts = {
+    'get_glider_stats': ['catalog', 'ru_datasets', 'dac_datasets'],
+    'get_glider_sensors': ['catalog', 'ru_datasets'],
+    'glider_map_and_info': ['catalog', 'ru_datasets'],
+}
+
+# scripts that also read data of ongoing deployments that isn't shared (profile counts, tracks)
+live_data = {'glider_map_and_info'}
+
+
+def module_name(command):
+    return subcommands.get(command, command)
+
+
+def fetch_artifacts(names):
+    """
+    Fetch the shared data concurrently, returns a dict by name
+    """
+    from deployment_catalog import load_catalog
+    from erddap_cache import dataset_ids
+    fetchers = {'catalog': load_catalog,
+                'ru_datasets': lambda: dataset_ids(ru_erddap_server),
+                'dac_datasets': lambda: dataset_ids(dac_erddap_server)}
+    with ThreadPoolExecutor(max_workers=len(fetchers)) as pool:
+        futures = {name: pool.submit(fetchers[name]) for name in names}
+    return {name: f.result() for name, f in futures.items()}
+
+
+def artifact_hash(value):
+    if hasattr(value, 'to_csv'):
+        data = value.to_csv(index=False)
+    else:
+        data = '\n'.join(sorted(value))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def file_state(fname):
+    if not os.path.exists(fname):
+        return None
+    st = os.stat(fname)
+    return [st.st_size, st.st_mtime]
+
+
+def fingerprint(job, hashes):
+    """
+    Hash of everything a job's result depends on that the pipeline knows about
+    """
+    uses = job_artifacts.get(module_name(job['command']), [])
+    key = {'command': job['command'],
+           'args': job.get('args', []),
+           'artifacts': {a: hashes[a] for a in uses},
+           'inputs': {f: file_state(f) for f in job.get('inputs', [])}}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def reads_live_data(job, artifacts):
+    """
+    True if the job's result depends on data of ongoing deployments in the catalog
+    that the fingerprint doesn't cover
+    """
+    catalog = artifacts.get('catalog')
+    return module_name(job['command']) in live_data and catalog is not None and bool(catalog['ongoing'].any())
+
+
+def up_to_date(job, key, previous, live=False):
+    if not previous or previous.get('fingerprint') != key:
+        return False
+    if not job.get('outputs') or not all(os.path.exists(f) for f in job['outputs']):
+        return False
+    max_age = job.get('max_age')
+    if max_age is None:
+        return not live
+    return time.time() - previous['time'] < max_age
+
+
+def run_job(command, argv, artifacts):
+    """
+    Run one script's main() with the shared data, in a worker process. Returns the exit
+    status and everything it printed.
+    """
+    output = io.StringIO()
+    glider_metrics.reset()
+    with contextlib.redirect_stdout(output):
+        try:
+            module = importlib.import_module(module_name(command))
+            args = module.build_parser().parse_args(argv)
+            if module.__name__ in job_artifacts:
+                status = module.main(args, artifacts=artifacts)
+            else:
+                status = module.main(args)
+        except SystemExit as e:
+            status = e.code
+        except Exception:
+            traceback.print_exc(file=output)
+            status = 1
+    if status and not isinstance(status, int):
+        output.write(f'{status}\n')
+        status = 1
+    return status or 0, output.getvalue()
+
+
+def load_state():
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f'{state_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_file, state_file)
+    except OSError as e:
+        print(f'Unable to save pipeline state in {cache_dir}: {e}')
+
+
+def main(args):
+    with open(args.pipeline) as f:
+        jobs = json.load(f)
+    if args.only:
+        jobs = {k: v for k, v in jobs.items() if k in args.only.split(',')}
+    for name, job in jobs.items():
+        unknown = [a for a in job.get('after', []) if a not in jobs]
+        if unknown:
+            print(f"{name}: unknown or excluded jobs in after: {', '.join(unknown)}")
+            return 1
+
+    needed = sorted({a for job in jobs.values() for a in job_artifacts.get(module_name(job['command']), [])})
+    with stage('fetch shared data'):
+        artifacts = fetch_artifacts(needed)
+    hashes = {name: artifact_hash(value) for name, value in artifacts.items()}
+
+    state = load_state()
+    keys = {name: fingerprint(job, hashes) for name, job in jobs.items()}
+    done = set()
+    failed = set()
+    pending = dict(jobs)
+    running = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        while pending or running:
+            progress = False
+            for name, job in list(pending.items()):
+                after = job.get('after', [])
+                if any(a in failed for a in after):
+                    print(f'==> {name}: skipped, {", ".join(a for a in after if a in failed)} failed\n')
+                    failed.add(name)
+                    del pending[name]
+                    progress = True
+                    continue
+                if not all(a in done for a in after):
+                    continue
+                del pending[name]
+                progress = True
+                # jobs after one that just ran have new inputs
+                rerun_after = any(state.get(a, {}).get('ran') for a in after)
+                live = reads_live_data(job, artifacts)
+                if not args.force and not rerun_after and up_to_date(job, keys[name], state.get(name), live):
+                    print(f'==> {name}: up to date\n')
+                    state[name]['ran'] = False
+                    done.add(name)
+                    continue
+                uses = job_artifacts.get(module_name(job['command']), [])
+                running[pool.submit(run_job, job['command'], job.get('args', []), {a: artifacts[a] for a in uses})] = name
+            if not running:
+                if pending and not progress:
+                    print(f"Jobs waiting on each other: {', '.join(pending)}")
+                    failed.update(pending)
+                    break
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                status, output = future.result()
+                print(f'==> {name} (exit {status})')
+                print(output, flush=True)
+                if status:
+                    failed.add(name)
+                else:
+                    done.add(name)
+                    state[name] = {'fingerprint': keys[name], 'time': time.time(), 'ran': True}
+
+    save_state(state)
+    if failed:
+        print(f"Failed: {', '.join(sorted(failed))}", file=sys.stderr)
+        return 1
+
+    return
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('pipeline',
+                            help='json file of jobs')
+
+    arg_parser.add_argument('--only',
+                            help='run only these jobs, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('--force',
+                            help='run every job even if it is up to date',
+                            action='store_true')
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='number of jobs to run at the same time',
+                            default=3,
+                            type=int)
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
+
+    sys.exit(glider_metrics.run(main, parsed_args))
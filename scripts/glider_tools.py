@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+"""
+Single entry point for the glider scripts:
+
+    glider_tools.py SUBCOMMAND [ARGS]
+
+Scripts are only imported when their subcommand runs, so e.g. stats never loads the
+mapping libraries. Several subcommands can run in one process, sharing interpreter
+startup, imports, the http session and the deployment catalog, by separating them
+with '+' or listing one per line in a file:
+
+    glider_tools.py stats -f status.csv + sensors -o sensors.csv
+    glider_tools.py --commands nightly.txt
+
+Every command runs even if an earlier one fails; the exit status is 1 if any failed.
+"""
+
+import argparse
+import importlib
+import shlex
+import sys
+import traceback
+import glider_metrics
+
+subcommands = {
+    'gaps': 'check_tbd_gaps',
+    'binary-info': 'get_binary_info',
+    'sensors': 'get_glider_sensors',
+    'stats': 'get_glider_stats',
+    'map': 'glider_map_and_info',
+    'notes': 'glider_notes_search',
+    'reformat': 'reformat_folder_structure',
+    'tracks': 'track_index',
+    'reconcile': 'reconcile_binaries',
+    'inventory': 'sensor_inventory',
+    'pipeline': 'glider_pipeline',
+}
+
+
+def split_commands(argv):
+    """
+    Split an argument list on '+' into one argument list per command
+    """
+    commands = [[]]
+    for a in argv:
+        if a == '+':
+            commands.append([])
+        else:
+            commands[-1].append(a)
+    return [c for c in commands if c]
+
+
+def read_commands(fname):
+    """
+    One command per line, shell quoting; blank lines and # comments are skipped
+    """
+    commands = []
+    with open(fname) as f:
+        for line in f:
+            command = shlex.split(line, comments=True)
+            if command:
+                commands.append(command)
+    return commands
+
+
+def run_command(command):
+    """
+    Parse and run one command, returns its exit status
+    """
+    name, argv = command[0], command[1:]
+    module_name = subcommands.get(name, name if name in subcommands.values() else None)
+    if not module_name:
+        print(f"Unknown command {name}, choose from {', '.join(subcommands)}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(module_name)
+    arg_parser = module.build_parser()
+    arg_parser.prog = f'{arg_parser.prog} {name}'
+    glider_metrics.reset()
+    try:
+        args = arg_parser.parse_args(argv)
+        status = glider_metrics.run(module.main, args, name=module_name)
+    except SystemExit as e:
+        status = e.code
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    if status is None:
+        return 0
+    if not isinstance(status, int):
+        print(status, file=sys.stderr)
+        return 1
+    return status
+
+
+def main(args):
+    commands = split_commands(args.command)
+    if args.commands:
+        commands += read_commands(args.commands)
+    if not commands:
+        print(f"No command given, choose from {', '.join(subcommands)}", file=sys.stderr)
+        return 2
+
+    failed = []
+    for command in commands:
+        if len(commands) > 1:
+            print(f"==> {' '.join(command)}", flush=True)
+        status = run_command(command)
+        if status:
+            failed.append(f"{' '.join(command)} (exit {status})")
+    if len(commands) > 1 and failed:
+        print('Failed: ' + '; '.join(failed), file=sys.stderr)
+    if failed:
+        return 1
+
+    return
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('--commands',
+                            help='file of commands to run, one per line',
+                            default=None)
+
+    arg_parser.add_argument('command',
+                            help=f"subcommand ({', '.join(subcommands)}) and its arguments; separate commands with +",
+                            nargs=argparse.REMAINDER)
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
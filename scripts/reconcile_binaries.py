@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+"""
+Reconcile the binary files on disk for a deployment against the source files in its
+raw trajectory dataset on the RU ERDDAP. Both sides are reduced to segment keys (the
+long name, e.g. ru40-2024-123-0-12, and the 8.3 name, e.g. 01230012) plus file type
+and joined on them, listing, per file type, segments on disk that never made it to
+ERDDAP and segments in ERDDAP with no file on disk. When the dataset only lists the
+flight file of each segment (sbd/dbd), science files (tbd/ebd) are checked against
+the flight source file of the same segment.
+
+Binaries are read from SLOCUM_DIR/deployments/yyyy/deployment/data/in/binary and its
+subdirectories.
+"""
+
+import argparse
+import os
+import sys
+import pandas as pd
+from erddapy import ERDDAP
+from glider_http import ru_erddap_server
+from erddap_cache import read_erddap
+import erddap_cache
+import glider_metrics
+from glider_metrics import stage
+
+# file types in each raw trajectory dataset (flight and science, uncompressed and compressed)
+mode_filetypes = {'rt': ['sbd', 'tbd', 'scd', 'tcd'],
+                  'delayed': ['dbd', 'ebd', 'dcd', 'ecd']}
+
+# flight file type each science file type is merged into, for datasets that only list
+# the flight file of a segment as its source_file
+flight_filetypes = {'tbd': 'sbd', 'tcd': 'scd', 'ebd': 'dbd', 'ecd': 'dcd'}
+
+
+def segment_keys(source_file):
+    """
+    Long name and 8.3 name of an ERDDAP source_file, e.g. ru40-2024-123-0-12-sbd(01230012)
+    """
+    keys = ['-'.join(source_file.split('-')[:5]).lower()]
+    if '(' in source_file:
+        keys.append(source_file.split('(')[-1][:-1].lower())
+    return keys
+
+
+def source_filetype(source_file):
+    """
+    File type of an ERDDAP source_file, e.g. sbd for ru40-2024-123-0-12-sbd(01230012)
+    """
+    return source_file.split('(')[0].split('-')[-1].lower()
+
+
+def disk_binaries(binary_dir, filetypes):
+    """
+    Names of the binary files of each type under binary_dir, as a dict of sets by
+    file type. Copies of a file in several directories count once.
+    """
+    names = {ftype: set() for ftype in filetypes}
+    for dirpath, dirnames, filenames in os.walk(binary_dir):
+        for f in filenames:
+            stem, _, ext = f.rpartition('.')
+            ext = ext.lower()
+            if stem and ext in names:
+                names[ext].add(stem)
+    return names
+
+
+def erddap_source_files(deployment, mode='rt'):
+    """
+    Distinct source_file values of the deployment's raw trajectory dataset
+    """
+    ru_erddap = ERDDAP(server=ru_erddap_server, protocol='tabledap')
+    ru_erddap.dataset_id = f'{deployment}-trajectory-raw-{mode}'
+    ru_erddap.variables = ['source_file']
+    return list(read_erddap(ru_erddap, distinct=True)['source_file'].dropna().astype(str))
+
+
+def reconcile(source_files, disk_names):
+    """
+    Join source files against the binary names on disk (dict of collections by file
+    type) on (segment, file type). Files of a type with no source files of their own
+    are joined against the source files of the flight type they are merged into (see
+    flight_filetypes), e.g. tbds against sbd source files. Returns a dict by file type of
+    source_type   file type of the source files it was joined against
+    matched       number of those source files with a file on disk
+    disk_only     files on disk matching no source file
+    erddap_only   source files of source_type with no file on disk
+    """
+    key_index = {}
+    for sf in source_files:
+        ftype = source_filetype(sf)
+        for key in segment_keys(sf):
+            key_index[(key, ftype)] = sf
+    source_types = {source_filetype(sf) for sf in source_files}
+
+    results = {}
+    for ftype, names in disk_names.items():
+        source_type = ftype
+        if ftype not in source_types and flight_filetypes.get(ftype) in source_types:
+            source_type = flight_filetypes[ftype]
+        found = set()
+        disk_only = []
+        for name in names:
+            sf = key_index.get((name.lower(), source_type))
+            if sf is None:
+                disk_only.append(f'{name}.{ftype}')
+            else:
+                found.add(sf)
+        results[ftype] = {'source_type': source_type,
+                          'matched': len(found),
+                          'disk_only': sorted(disk_only),
+                          'erddap_only': [sf for sf in source_files
+                                          if sf not in found and source_filetype(sf) == source_type]}
+    return results
+
+
+def main(args):
+    filetypes = args.filetypes.split(',') if args.filetypes else mode_filetypes[args.mode]
+    rows = []
+    for deployment in args.deployments:
+        print(f'*****  {deployment}:\n')
+        binary_dir = os.path.join(args.slocum_dir, 'deployments', deployment.split('-')[-1][:4], deployment, 'data', 'in', 'binary')
+        if not os.path.isdir(binary_dir):
+            print(f'Binary directory {binary_dir} not found, skipping deployment.\n\n')
+            rows.append({'deployment': deployment, 'note': 'binary directory not found'})
+            continue
+        with stage('list binaries'):
+            disk_names = disk_binaries(binary_dir, filetypes)
+        try:
+            with stage('fetch source files'):
+                source_files = sorted(set(erddap_source_files(deployment, args.mode)))
+        except:
+            print(f'Issue reading source files from dataset {deployment}-trajectory-raw-{args.mode}.\n\n')
+            rows.append({'deployment': deployment, 'note': 'unable to read source files'})
+            continue
+        with stage('join'):
+            results = reconcile(source_files, {ftype: names for ftype, names in disk_names.items() if names})
+
+        print(f'{len(source_files)} source files in {deployment}-trajectory-raw-{args.mode}')
+        if not results:
+            print(f"No {', '.join(filetypes)} files on disk.")
+        for ftype, result in results.items():
+            against = '' if result['source_type'] == ftype else f" (against {result['source_type']} source files)"
+            print(f"\n{ftype}{against}: {len(disk_names[ftype])} on disk, {result['matched']} matched, "
+                  f"{len(result['disk_only'])} on disk but not in ERDDAP, {len(result['erddap_only'])} in ERDDAP but not on disk")
+            for name in result['disk_only']:
+                print(f'  not in ERDDAP: {name}')
+                rows.append({'deployment': deployment, 'filetype': ftype, 'missing_from': 'erddap', 'name': name})
+            for name in result['erddap_only']:
+                print(f'  not on disk: {name}')
+                rows.append({'deployment': deployment, 'filetype': ftype, 'missing_from': 'disk', 'name': name})
+        print('\n')
+
+    if args.report:
+        report = pd.DataFrame(rows, columns=['deployment', 'filetype', 'missing_from', 'name', 'note'])
+        if args.report.lower().endswith('.json'):
+            report.to_json(args.report, orient='records', indent=2)
+        else:
+            report.to_csv(args.report, index=False)
+        print(f'Report written to {args.report}')
+
+    print(erddap_cache.report(), file=sys.stderr)
+
+    return
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('deployments',
+                            nargs='+',
+                            help='Glider deployment name(s) formatted as glider-YYYYmmddTHHMM')
+
+    arg_parser.add_argument('-d', '--slocum_dir',
+                            help='base directory containing slocum data',
+                            required=True)
+
+    arg_parser.add_argument('-m', '--mode',
+                            help='raw trajectory dataset to compare against (DEPLOYMENT-trajectory-raw-MODE)',
+                            choices=['rt', 'delayed'],
+                            default='rt')
+
+    arg_parser.add_argument('-t', '--filetypes',
+                            help='binary file types to check, separated by comma; default sbd,tbd,scd,tcd for rt and dbd,ebd,dcd,ecd for delayed',
+                            default=None)
+
+    arg_parser.add_argument('-o', '--report',
+                            help='write every unmatched file to this file (.csv or .json)',
+                            default=None)
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
+
+    sys.exit(glider_metrics.run(main, parsed_args))
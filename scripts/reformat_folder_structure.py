@@ -8,55 +8,240 @@ Reformat the older $HOME/deployments/ directory structure with current structure
 2. copy the correct sensor_defs.json files to ../config/ngdac-profile, ../config/raw-trajectory and ../config/sci-profile
 3. make ngdac-profile data directory (if not already there)
 4. make sure the rt and delayed mode sci-profile and ngdac-profile data directories have a qc_queue directory
+
+The deployment directories are scanned first to build a list of the changes needed,
+which is printed with --dry_run or applied with a pool of threads. sensor_defs.json
+files that already match the template (size and hash) are left alone, so re-running
+on a directory that has already been reformatted does nothing.
 """
 
 import os
 import shutil
+import hashlib
+import argparse
+import sys
+import errno
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import glider_metrics
+from glider_metrics import stage
+
+config_dirs = ['ngdac-profile', 'sci-profile', 'raw-trajectory']
+qc_dirs = ['ngdac-profile', 'sci-profile']
+modes = ['rt', 'delayed']
+
+# ioctl request to clone a file on filesystems that support reflinks (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+@functools.lru_cache(maxsize=None)
+def _file_hash(path, size, mtime_ns):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_hash(path, st=None):
+    """
+    sha256 of a file, cached until the file's size or modification time changes
+    """
+    st = st or os.stat(path)
+    return _file_hash(path, st.st_size, st.st_mtime_ns)
+
+
+def same_file(source, target):
+    """
+    True if target exists and matches source by size and content hash
+    """
+    try:
+        source_stat = os.stat(source)
+        target_stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+    if source_stat.st_size != target_stat.st_size:
+        return False
+    if os.path.samefile(source, target):
+        return True
+    return file_hash(source, source_stat) == file_hash(target, target_stat)
+
+
+def clone_file(source, target, link='reflink'):
+    """
+    Copy source to target as a reflink (copy-on-write clone) or hardlink where the
+    filesystem allows it, otherwise fall back to a regular copy.
+    """
+    # never write through an existing target, it may be a hardlink to the template
+    if os.path.lexists(target):
+        os.remove(target)
+    if link == 'reflink':
+        try:
+            import fcntl
+            with open(source, 'rb') as fsrc, open(target, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(source, target)
+            return target
+        except (ImportError, OSError):
+            pass
+    elif link == 'hardlink':
+        try:
+            os.link(source, target)
+            return target
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    return shutil.copy2(source, target)
+
+
+def scan_deployments(ddir, years):
+    """
+    Yield the deployment directories for the requested years, using os.scandir so
+    each year directory is listed only once.
+    """
+    for year in years:
+        year_dir = os.path.join(ddir, str(year))
+        if not os.path.isdir(year_dir):
+            print(f'{year_dir} does not exist, skipping.')
+            continue
+        with os.scandir(year_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir():
+                    yield entry.path
+
+
+def plan_deployment(deployment_dir, template_dir):
+    """
+    List the actions needed to bring one deployment directory up to date, as tuples of
+    ('mkdir', path), ('copy', source, target) or ('copytree', source, target).
+    """
+    plan = []
+    with os.scandir(deployment_dir) as entries:
+        subdirs = {e.name for e in entries if e.is_dir()}
+
+    # add to the config directory
+    if 'config' in subdirs:
+        configdir = os.path.join(deployment_dir, 'config')
+        # add ngdac-profile directory if not already there
+        ngdac_configdir = os.path.join(configdir, 'ngdac-profile')
+        if not os.path.isdir(ngdac_configdir):
+            plan.append(('mkdir', ngdac_configdir))
+
+        # copy correct sensor_defs.json files to the appropriate config directory
+        config_templates = os.path.join(template_dir, 'config')
+        for cdir in config_dirs:
+            source = os.path.join(config_templates, cdir, 'sensor_defs.json')
+            target = os.path.join(configdir, cdir, 'sensor_defs.json')
+            if not same_file(source, target):
+                plan.append(('copy', source, target))
+
+    # make sure data directories are formatted correctly
+    datadir = os.path.join(deployment_dir, 'data', 'out', 'nc')
+    if os.path.isdir(datadir):
+        # add ngdac-profile directory if not already there
+        dest = os.path.join(datadir, 'ngdac-profile')
+        if not os.path.isdir(dest):
+            plan.append(('copytree', os.path.join(template_dir, 'data', 'out', 'nc', 'ngdac-profile'), dest))
+
+        # add qc_queue directories if not already there
+        for cdir in qc_dirs:
+            for mode in modes:
+                qcdir = os.path.join(datadir, cdir, mode, 'qc_queue')
+                if not os.path.isdir(qcdir):
+                    plan.append(('mkdir', qcdir))
+    return plan
+
+
+def build_plan(parent_dir, years, workers=8):
+    ddir = os.path.join(parent_dir, 'deployments')
+    template_dir = os.path.join(parent_dir, 'deployment-template')
+    deployment_dirs = list(scan_deployments(ddir, years))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        plans = list(executor.map(lambda d: (d, plan_deployment(d, template_dir)), deployment_dirs))
+    return [(d, p) for d, p in plans if p]
+
+
+def apply_actions(actions, link='reflink'):
+    # actions for one deployment run in order, since copies and qc_queue
+    # directories can depend on directories created earlier in the list
+    for action in actions:
+        if action[0] == 'mkdir':
+            os.makedirs(action[1], exist_ok=True)
+        elif action[0] == 'copy':
+            os.makedirs(os.path.dirname(action[2]), exist_ok=True)
+            clone_file(action[1], action[2], link)
+        elif action[0] == 'copytree':
+            shutil.copytree(action[1], action[2], dirs_exist_ok=True,
+                            copy_function=functools.partial(clone_file, link=link))
+    return len(actions)
+
+
+def main(args):
+    with stage('plan'):
+        plan = build_plan(args.parent_dir, args.years, args.workers)
+    nactions = sum(len(p) for d, p in plan)
+
+    if args.dry_run:
+        for deployment_dir, actions in plan:
+            print(deployment_dir)
+            for action in actions:
+                print(f"  {action[0]} {' -> '.join(action[1:])}")
+        print(f'{nactions} changes needed in {len(plan)} deployment directories.')
+        return
+
+    if not plan:
+        print('All deployment directories already up to date.')
+        return
+
+    failed = 0
+    apply_timer = glider_metrics.start_stage('apply')
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(apply_actions, actions, args.link): d for d, actions in plan}
+        for future, deployment_dir in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f'Issue reformatting {deployment_dir}: {e}')
+    apply_timer.stop()
+    print(f'{nactions} changes applied to {len(plan)-failed}/{len(plan)} deployment directories.')
+
+    return
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    arg_parser.add_argument('years',
+                            nargs='+',
+                            help='deployment year(s) to reformat',
+                            type=int)
+
+    arg_parser.add_argument('-d', '--parent_dir',
+                            help='base slocum directory containing deployments and deployment-template',
+                            default='/directory_structure/slocum')
+
+    arg_parser.add_argument('-n', '--dry_run',
+                            help='print the changes that would be made without making them',
+                            action='store_true')
+
+    arg_parser.add_argument('-w', '--workers',
+                            help='number of threads used to scan and update deployment directories',
+                            default=8,
+                            type=int)
+
+    arg_parser.add_argument('-l', '--link',
+                            help='how to copy template files: reflink (copy-on-write clone), hardlink (shared with the template, edits affect both), or copy; falls back to copy when the filesystem does not support links',
+                            choices=['reflink', 'hardlink', 'copy'],
+                            default='reflink')
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
 
-# modify these ****************************
-years = [2022]
-parent_dir = '/directory_structure/slocum'
-# end modify ******************************
-
-ddir = os.path.join(parent_dir, 'deployments')
-template_dir = os.path.join(parent_dir, 'deployment-template')
-for year in years:
-    year_dir = os.path.join(ddir, str(year))
-    if os.path.isdir(year_dir):
-        deployment_list = os.listdir(year_dir)
-        for deployment in deployment_list:
-            deployment_dir = os.path.join(year_dir, deployment)
-            if os.path.isdir(deployment_dir):
-                # add to the config directory
-                configdir = os.path.join(deployment_dir, 'config')
-                if os.path.isdir(configdir):
-                    # add ngdac-profile directory if not already there
-                    ngdac_configdir = os.path.join(configdir, 'ngdac-profile')
-                    if not os.path.isdir(ngdac_configdir):
-                        os.makedirs(ngdac_configdir)
-
-                    # copy correct sensor_defs.json files to the appropriate config directory
-                    config_templates = os.path.join(template_dir, 'config')
-                    cdirs = ['ngdac-profile', 'sci-profile', 'raw-trajectory']
-                    for cdir in cdirs:
-                        source = os.path.join(config_templates, cdir, 'sensor_defs.json')
-                        target = os.path.join(configdir, cdir, 'sensor_defs.json')
-                        shutil.copyfile(source, target)
-
-                # make sure data directories are formatted correctly
-                datadir = os.path.join(deployment_dir, 'data', 'out', 'nc')
-                if os.path.isdir(datadir):
-                    # add ngdac-profile directory if not already there
-                    dest = os.path.join(datadir, 'ngdac-profile')
-                    if not os.path.isdir(dest):
-                        ngdac_templatedir = os.path.join(template_dir, 'data/out/nc/ngdac-profile')
-                        shutil.copytree(ngdac_templatedir, dest)
-
-                    # add qc_queue directories if not already there
-                    cdirs = ['ngdac-profile', 'sci-profile']
-                    modes = ['rt', 'delayed']
-                    for cdir in cdirs:
-                        for mode in modes:
-                            qcdir = os.path.join(datadir, cdir, mode, 'qc_queue')
-                            if not os.path.isdir(qcdir):
-                                os.makedirs(qcdir)
+    sys.exit(glider_metrics.run(main, parsed_args))
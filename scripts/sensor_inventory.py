@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+"""
+Typed columnar copy of the sensor inventory written by get_glider_sensors.py -i. The csv
+has nDays as days or 'ongoing' and is read back with object columns. The inventory is
+an uncompressed Arrow (feather) file instead:
+    deployment_name     string
+    year                uint16
+    glider, project     categorical
+    ru_glider           bool
+    start_time          datetime64
+    end_time            datetime64, null for deployments that have not been recovered
+    nDays               float32, null for deployments that have not been recovered
+    <category>          uint8, number of sensors in each sensor category
+It is memory-mapped when read, so a lookup only touches the columns and rows it uses:
+    query_inventory('files/ru_glider_sensors.feather', categories=['pam'], projects=['MARACOOS'])
+
+Query from the command line, (re)build the inventory from an existing csv, or write
+the xlsx summary (deployments, per-year sensor days) from it:
+    sensor_inventory.py -s pam,ph --ongoing
+    sensor_inventory.py --from_csv files/ru_glider_sensors.csv
+    sensor_inventory.py -x files/ru_glider_sensors.xlsx
+"""
+
+import argparse
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import glider_metrics
+from glider_metrics import stage
+
+base_columns = ['deployment_name', 'year', 'glider', 'ru_glider', 'project', 'start_time', 'end_time', 'nDays']
+
+
+def build_inventory(deployment_info, catalog, categories):
+    """
+    Typed inventory from the per-deployment sensor counts (columns of the sensor csv)
+    and the deployment catalog, for the start and end times
+    """
+    times = catalog.drop_duplicates('deployment_name').set_index('deployment_name')
+    names = deployment_info['deployment_name'].astype(str)
+    ongoing = names.map(times['ongoing']).fillna(False).to_numpy(dtype=bool)
+    inventory = pd.DataFrame({'deployment_name': names,
+                              'year': pd.to_numeric(deployment_info['year']).astype('UInt16'),
+                              'glider': deployment_info['glider'].astype(str).astype('category'),
+                              'ru_glider': deployment_info['ru_glider'].astype(bool),
+                              'project': deployment_info['project'].astype(str).astype('category'),
+                              'start_time': names.map(times['start_time']),
+                              'end_time': names.map(times['end_time']).where(~ongoing),
+                              'nDays': pd.to_numeric(deployment_info['nDays'], errors='coerce').astype('float32')})
+    for c in categories:
+        inventory[c] = deployment_info[c].clip(0, 255).astype('uint8')
+    return inventory.reset_index(drop=True)
+
+
+def write_inventory(inventory, fname):
+    tmp_file = f'{fname}.{os.getpid()}.tmp'
+    feather.write_feather(inventory, tmp_file, compression='uncompressed')
+    os.replace(tmp_file, fname)
+
+
+def query_inventory(fname, deployments=None, gliders=None, projects=None, categories=None, ongoing=None,
+                    columns=None):
+    """
+    Deployments from the inventory as a DataFrame. deployments, gliders and projects are
+    lists of names to keep, categories keeps deployments with at least one sensor in
+    every category listed, ongoing True/False keeps deployments that are/aren't
+    recovered. Rows are filtered on the memory-mapped file before conversion.
+    """
+    table = feather.read_table(fname, memory_map=True)
+    keep = []
+    for column, values in [('deployment_name', deployments), ('glider', gliders), ('project', projects)]:
+        if values:
+            keep.append(pc.is_in(table[column].cast(pa.string()), value_set=pa.array(values, pa.string())))
+    for c in categories or []:
+        keep.append(pc.greater(table[c], 0))
+    if ongoing is not None:
+        recovered = pc.is_valid(table['end_time'])
+        keep.append(pc.invert(recovered) if ongoing else recovered)
+    if keep:
+        mask = keep[0]
+        for k in keep[1:]:
+            mask = pc.and_(mask, k)
+        table = table.filter(mask)
+    if columns:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+def sensor_categories(inventory):
+    return [c for c in inventory.columns if c not in base_columns]
+
+
+def days_so_far(inventory, now=None):
+    """
+    nDays with days since deployment for deployments that are still out
+    """
+    now = now or pd.Timestamp.now(tz='UTC').tz_localize(None)
+    return inventory['nDays'].astype(float).fillna((now - inventory['start_time']).dt.total_seconds()/60/60/24)
+
+
+def sensor_days(deployments, categories):
+    """
+    Days of data with each sensor category per year (days x number of sensors)
+    """
+    days = deployments[categories].astype(float).mul(deployments['nDays'].astype(float), axis=0)
+    days['year'] = deployments['year']
+    summary = days.groupby('year').sum()
+    summary.columns = [f'{c} days' for c in categories]
+    return summary.reset_index()
+
+
+def write_xlsx(inventory, fname, not_on_erddap=None):
+    """
+    Workbook with the inventory (csv columns, nDays counted to now for deployments still
+    out), deployments not on ERDDAP (kept by hand) and per-year sensor days for all
+    deployments and for Rutgers gliders only
+    """
+    categories = sensor_categories(inventory)
+    sheet = inventory[['deployment_name', 'year', 'glider', 'ru_glider', 'project'] + categories].copy()
+    sheet.insert(5, 'nDays', days_so_far(inventory))
+    sheet['glider'] = sheet['glider'].astype(str)
+    sheet['project'] = sheet['project'].astype(str)
+    sheet['year'] = sheet['year'].astype('Int64')
+    everything = sheet if not_on_erddap is None else pd.concat([sheet, not_on_erddap], ignore_index=True)
+
+    root, ext = os.path.splitext(fname)
+    tmp_file = f'{root}.{os.getpid()}.tmp{ext}'
+    with pd.ExcelWriter(tmp_file, engine='openpyxl') as writer:
+        sheet.to_excel(writer, sheet_name='ru_glider_sensors', index=False)
+        if not_on_erddap is not None:
+            not_on_erddap.to_excel(writer, sheet_name='not_on_erddap', index=False)
+        sensor_days(everything, categories).to_excel(writer, sheet_name='summary', index=False)
+        rutgers = everything[everything['ru_glider'].fillna(False).astype(bool)]
+        sensor_days(rutgers, categories).to_excel(writer, sheet_name='summary_rutgers', index=False)
+    os.replace(tmp_file, fname)
+
+
+def read_not_on_erddap(fname):
+    """
+    The hand-kept not_on_erddap sheet of an existing workbook, if there is one
+    """
+    if not os.path.isfile(fname):
+        return None
+    try:
+        return pd.read_excel(fname, sheet_name='not_on_erddap', engine='openpyxl')
+    except ValueError:
+        return None
+
+
+def main(args):
+    if args.from_csv:
+        from deployment_catalog import load_catalog
+        with stage('fetch catalog'):
+            catalog = load_catalog()
+        deployment_info = pd.read_csv(args.from_csv)
+        categories = [c for c in deployment_info.columns if c not in base_columns]
+        with stage('write inventory'):
+            write_inventory(build_inventory(deployment_info, catalog, categories), args.inventory)
+        print(f'Inventory written to {args.inventory}')
+
+    if args.xlsx:
+        not_on_erddap = read_not_on_erddap(args.xlsx)
+        with stage('write xlsx'):
+            write_xlsx(query_inventory(args.inventory), args.xlsx, not_on_erddap)
+        print(f'Summary written to {args.xlsx}')
+
+    filters = [args.deployments, args.gliders, args.projects, args.sensors, args.ongoing]
+    if any(filters) or not (args.from_csv or args.xlsx):
+        with stage('query'):
+            result = query_inventory(args.inventory,
+                                     deployments=args.deployments.split(',') if args.deployments else None,
+                                     gliders=args.gliders.split(',') if args.gliders else None,
+                                     projects=args.projects.split(',') if args.projects else None,
+                                     categories=args.sensors.split(',') if args.sensors else None,
+                                     ongoing=True if args.ongoing else None)
+        print(result.to_string(index=False))
+        print(f'{len(result)} deployments')
+
+    return
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('-i', '--inventory',
+                            help='inventory file',
+                            default=os.path.join(os.getcwd(), 'files', 'ru_glider_sensors.feather'))
+
+    arg_parser.add_argument('-d', '--deployments',
+                            help='deployments to include, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('-g', '--gliders',
+                            help='gliders to include, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('-p', '--projects',
+                            help='projects to include, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('-s', '--sensors',
+                            help='only deployments with sensors in all of these categories, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('--ongoing',
+                            help='only deployments that have not been recovered',
+                            action='store_true')
+
+    arg_parser.add_argument('--from_csv',
+                            help='build the inventory from a sensor csv written by get_glider_sensors.py',
+                            default=None)
+
+    arg_parser.add_argument('-x', '--xlsx',
+                            help='write the xlsx summary to this file (the not_on_erddap sheet of an existing file is kept)',
+                            default=None)
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
+
+    sys.exit(glider_metrics.run(main, parsed_args))
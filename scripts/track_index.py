@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""
+Local copy of deployment tracks with a spatial index (shapely STRtree) over them, so
+"which deployments crossed this region" is answered from disk instead of the API.
+Tracks of recovered deployments never change and are kept permanently, tracks of
+ongoing deployments are downloaded again once they are older than ongoing_max_age.
+
+Cache directory: $GLIDER_CACHE_DIR/tracks
+
+List deployments whose tracks enter a box (west east south north), or a WKT polygon,
+in a time window:
+    track_index.py -w -76 -e -72 -s 38 -n 41 -t0 2024-01-01 -t1 2024-12-31
+    track_index.py -r "POLYGON ((-75 38, -72 38, -72 41, -75 38))"
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import requests
+import shapely
+from glider_http import glider_api, cache_dir, get_json
+from deployment_catalog import load_catalog, filter_deployments
+import glider_metrics
+from glider_metrics import stage
+
+track_dir = os.path.join(cache_dir, 'tracks')
+
+# seconds to keep tracks of deployments that are still in the water
+ongoing_max_age = 60*60
+
+
+def fetch_track(deployment):
+    """
+    (n, 2) array of track lon, lat from the glider API
+    """
+    features = get_json(f'{glider_api}tracks/?deployment={deployment}')['features']
+    return np.vstack(features[0]['geometry']['coordinates'])[:, :2].astype(float)
+
+
+def load_track(deployment, ongoing=False, refresh=False):
+    """
+    Track for a deployment from the local cache, downloaded if missing (or stale, for
+    ongoing deployments)
+    """
+    fname = os.path.join(track_dir, f'{deployment}.npy')
+    if not refresh and os.path.isfile(fname):
+        if not ongoing or time.time() - os.path.getmtime(fname) < ongoing_max_age:
+            return np.load(fname)
+    track = fetch_track(deployment)
+    try:
+        os.makedirs(track_dir, exist_ok=True)
+        tmp_file = f'{fname[:-4]}.{os.getpid()}.tmp.npy'
+        np.save(tmp_file, track)
+        os.replace(tmp_file, fname)
+    except OSError as e:
+        print(f'Unable to cache track in {track_dir}: {e}')
+    return track
+
+
+def load_tracks(catalog, workers=8, refresh=False):
+    """
+    Tracks for the deployments in a catalog DataFrame, as a dict by deployment name.
+    Deployments without a track, or whose track can't be downloaded or read, are left
+    out and listed on stderr.
+    """
+    def load(deployment, ongoing):
+        try:
+            return deployment, load_track(deployment, ongoing, refresh), None
+        except (requests.RequestException, OSError, ValueError, KeyError, IndexError) as e:
+            return deployment, None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(load, catalog['deployment_name'], catalog['ongoing']))
+    tracks = {}
+    skipped = [f'{deployment} ({error!r})' for deployment, track, error in results if error is not None]
+    if skipped:
+        print(f"Unable to load tracks for {len(skipped)} deployments: {', '.join(skipped)}", file=sys.stderr)
+    for deployment, track, error in results:
+        if track is None:
+            continue
+        track = track[~np.isnan(track).any(axis=1)]
+        if len(track) > 0:
+            tracks[deployment] = track
+    return tracks
+
+
+def track_metrics(tracks, durations=None):
+    """
+    Along-track distance and largest gap between consecutive positions (km) for a
+    dict of tracks, and mean speed over ground (m/s) given durations (seconds, a
+    Series by deployment name). All tracks are measured in one pass over their
+    concatenated positions.
+    """
+    import gsw
+    names = list(tracks)
+    if not names:
+        return pd.DataFrame(columns=['deployment_name', 'track_distance_km', 'max_gap_km', 'mean_speed_m_s'])
+    lengths = np.array([len(tracks[name]) for name in names])
+    starts = np.append(0, np.cumsum(lengths)[:-1])
+    points = np.concatenate([tracks[name] for name in names])
+    # steps[i]: distance from position i to i+1, none from the end of one track to the start of the next
+    steps = np.zeros(len(points))
+    steps[:-1] = gsw.distance(points[:,0], points[:,1])
+    steps[starts[1:]-1] = 0
+    metrics = pd.DataFrame({'deployment_name': names,
+                            'track_distance_km': np.add.reduceat(steps, starts)/1000,
+                            'max_gap_km': np.maximum.reduceat(steps, starts)/1000})
+    if durations is not None:
+        seconds = metrics['deployment_name'].map(durations).to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics['mean_speed_m_s'] = np.where(seconds > 0, metrics['track_distance_km'].to_numpy()*1000/seconds, np.nan)
+    return metrics
+
+
+class TrackIndex:
+    """
+    STRtree over track geometries, queried with any shapely geometry
+    """
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.names = np.array(list(tracks), dtype=object)
+        self.geometries = [shapely.LineString(t) if len(t) > 1 else shapely.Point(t[0]) for t in tracks.values()]
+        self.tree = shapely.STRtree(self.geometries)
+
+    def query(self, geometry):
+        """
+        Names of the deployments whose tracks intersect geometry
+        """
+        index = self.tree.query(geometry, predicate='intersects')
+        return list(self.names[np.sort(index)])
+
+
+def extent_geometry(extent):
+    """
+    Polygon for a map extent [west, east, south, north], split at the antimeridian
+    when west > east
+    """
+    west, east, south, north = extent
+    if west > east:
+        return shapely.MultiPolygon([shapely.box(west, south, 180, north), shapely.box(-180, south, east, north)])
+    return shapely.box(west, south, east, north)
+
+
+def deployments_in_region(catalog, geometry, workers=8):
+    """
+    Deployments in the catalog whose tracks enter geometry, and the tracks (dict by
+    deployment name) that were loaded to check
+    """
+    tracks = load_tracks(catalog, workers)
+    return TrackIndex(tracks).query(geometry), tracks
+
+
+def main(args):
+    with stage('fetch catalog'):
+        catalog = load_catalog()
+    projects = args.projects.split(',') if args.projects else None
+    gliders = args.gliders.split(',') if args.gliders else None
+    # any deployment in the water during the window
+    selected = filter_deployments(catalog, projects=projects, gliders=gliders, t0=args.min_time, t1=args.max_time,
+                                  overlap=True)
+
+    if args.region:
+        geometry = shapely.from_wkt(args.region)
+    else:
+        geometry = extent_geometry([args.west_bound, args.east_bound, args.south_bound, args.north_bound])
+
+    with stage('load tracks'):
+        tracks = load_tracks(selected, args.workers, args.refresh)
+    with stage('query'):
+        inside = TrackIndex(tracks).query(geometry)
+
+    print(f'{len(inside)}/{len(selected)} deployments enter the region')
+    for deployment in inside:
+        print(deployment)
+
+    return
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=__doc__,
+                                         formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    arg_parser.add_argument('-w', '--west_bound',
+                            help='western boundary of the region',
+                            default=-180,
+                            type=float)
+
+    arg_parser.add_argument('-e', '--east_bound',
+                            help='eastern boundary of the region',
+                            default=180,
+                            type=float)
+
+    arg_parser.add_argument('-s', '--south_bound',
+                            help='southern boundary of the region',
+                            default=-90,
+                            type=float)
+
+    arg_parser.add_argument('-n', '--north_bound',
+                            help='northern boundary of the region',
+                            default=90,
+                            type=float)
+
+    arg_parser.add_argument('-r', '--region',
+                            help='region as WKT (lon lat), instead of the bounds',
+                            default=None)
+
+    arg_parser.add_argument('-t0', '--min_time',
+                            help='start of the time window, yyyy-mm-ddTHH:MM',
+                            default=None)
+
+    arg_parser.add_argument('-t1', '--max_time',
+                            help='end of the time window, yyyy-mm-ddTHH:MM',
+                            default=None)
+
+    arg_parser.add_argument('-p', '--projects',
+                            help='projects to include, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('-g', '--gliders',
+                            help='gliders to include, separated by comma',
+                            default=None)
+
+    arg_parser.add_argument('--workers',
+                            help='simultaneous track downloads',
+                            default=8,
+                            type=int)
+
+    arg_parser.add_argument('--refresh',
+                            help='download every track again',
+                            action='store_true')
+
+    glider_metrics.add_arguments(arg_parser)
+
+    return arg_parser
+
+
+if __name__ == '__main__':
+    parsed_args = build_parser().parse_args()
+
+    sys.exit(glider_metrics.run(main, parsed_args))
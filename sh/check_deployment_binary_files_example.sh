@@ -65,6 +65,7 @@ conda activate $conda_env;
 
 [ "$?" -ne 0 ] && exit 1;
 
+checked=();
 for deployment in $deployments
 do
     ts="$(echo $deployment | awk -F- '{print $2}')";
@@ -90,9 +91,15 @@ do
 
     grep -r -a 'fileopen_time' $DATA_DIR > ${BIN_FILE_DIR}/${deployment}_binary_open_times.txt
     chmod 664 ${BIN_FILE_DIR}/${deployment}_binary_open_times.txt
-    python ${REPO_DIR}/scripts/get_binary_info.py -d $deployment_root $deployment
+    checked+=("$deployment");
 
 done
 
+# check all deployments in one run (one catalog request, one process per cpu)
+if [ ${#checked[@]} -gt 0 ]
+then
+    python ${REPO_DIR}/scripts/get_binary_info.py -d $deployment_root "${checked[@]}"
+fi
+
 conda deactivate;
 
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+from check_tbd_gaps import flag_segments, find_gaps, gap_report, gap_segments, local_segment_info, nc_segment_info
+
+base = pd.Timestamp('2024-01-01')
+
+
+def segments(starts, nTemp):
+    info = pd.DataFrame({'source_file': [f'ru40-2024-001-0-{i}-sbd(0001{i:04d})' for i in range(len(starts))],
+                         't0': [base + pd.Timedelta(hours=h) for h in starts],
+                         't1': [base + pd.Timedelta(hours=h+2) for h in starts],
+                         'nTemp': nTemp,
+                         'nProfiles': 2,
+                         'maxDepth': 20.0})
+    info['tLength'] = 2.0
+    return flag_segments(info.iloc[::-1].reset_index(drop=True))
+
+
+def test_find_gaps_runs_and_full_gaps():
+    info = segments([0, 3, 6, 30, 33], [100, 0, 0, 0, 100])
+    assert list(info['tbdFlag']) == [False, True, True, True, False]
+    gaps = find_gaps(info)
+    assert list(gaps['fullgap']) == [False, True, False]
+    assert list(gaps['t0']) == [base + pd.Timedelta(hours=h) for h in [3, 8, 30]]
+    assert list(gaps['t1']) == [base + pd.Timedelta(hours=h) for h in [8, 30, 32]]
+
+
+def test_find_gaps_no_flagged_segments():
+    info = segments([0, 3, 6], [100, 100, 100])
+    assert find_gaps(info).empty
+
+
+
+def test_find_gaps_run_break():
+    info = segments([0, 3, 6, 30, 33], [100, 0, 0, 0, 100])
+    gaps = find_gaps(info, run_break=48)
+    assert list(gaps['fullgap']) == [False, True]
+    assert gaps['t1'][0] == base + pd.Timedelta(hours=32)
+
+
+def test_single_segment():
+    assert find_gaps(segments([0], [0]))['fullgap'].tolist() == [False]
+
+
+def test_gap_segments_and_report():
+    info = segments([0, 3, 6, 30, 33], [100, 0, 0, 0, 100])
+    gaps = find_gaps(info)
+    index = gap_segments(info, gaps)
+    assert [list(i) for i in index] == [[1, 2], [], [3]]
+    report = gap_report(info, gaps, index, tbd_names={'ru40-2024-001-0-1', '00010003'})
+    assert [s['tbd_found'] for s in report[0]['segments']] == [True, False]
+    assert report[1]['segments'] == []
+    assert report[2]['segments'][0]['tbd_found'] is True
+    assert report[2]['t0'] == '2024-01-02T06:00:00'
+
+
+def write_nc(fname, hours, depth, temp, source_file):
+    ds = xr.Dataset({'depth': ('time', np.array(depth, dtype=float)),
+                     'sci_water_temp': ('time', np.array(temp, dtype=float))},
+                    coords={'time': [base + pd.Timedelta(hours=h) for h in hours]})
+    if isinstance(source_file, list):
+        ds['source_file'] = ('time', source_file)
+    else:
+        ds.attrs['source_file'] = source_file
+    ds.to_netcdf(fname)
+    return str(fname)
+
+
+def test_nc_segment_info_per_point_and_per_file_source(tmp_path):
+    sf = ['ru40-2024-001-0-0-sbd(00010000)', 'ru40-2024-001-0-1-sbd(00010001)']
+    per_point = write_nc(tmp_path / 'a.nc', [0, 1, 2], [0, 10, 20], [np.nan, 12, 0], [sf[0], sf[0], sf[1]])
+    result = nc_segment_info(per_point).set_index('source_file')
+    assert list(result.index) == sf
+    assert list(result['nDepth']) == [1, 1]
+    assert list(result['nTemp']) == [1, 0]
+    assert result.loc[sf[0], 't1'] == base + pd.Timedelta(hours=1)
+    per_file = write_nc(tmp_path / 'b.nc', [3, 4], [5, 30], [11, 11], sf[1])
+    result = nc_segment_info(per_file)
+    assert list(result['source_file']) == [sf[1]]
+    assert result['maxDepth'][0] == 30
+
+
+def test_local_segment_info_merges_files(tmp_path):
+    sf = ['ru40-2024-001-0-0-sbd(00010000)', 'ru40-2024-001-0-1-sbd(00010001)']
+    files = [write_nc(tmp_path / 'a.nc', [0, 1, 2], [0, 10, 20], [np.nan, 12, 0], [sf[0], sf[0], sf[1]]),
+             write_nc(tmp_path / 'b.nc', [3, 4], [5, 30], [11, 11], sf[1])]
+    result = local_segment_info(files, workers=2).set_index('source_file').sort_index()
+    assert list(result['nTemp']) == [1, 2]
+    assert list(result['maxDepth']) == [10, 30]
+    assert result.loc[sf[1], 't0'] == base + pd.Timedelta(hours=2)
+    assert result.loc[sf[1], 't1'] == base + pd.Timedelta(hours=4)
@@ -0,0 +1,43 @@
+import numpy as np
+from deployment_catalog import build_catalog, deployment_summary, filter_deployments
+
+deployment_list = [
+    {'deployment_name': 'ru40-20240101T0000', 'glider_name': 'ru40', 'project_name': 'MARACOOS', 'start_year': 2024,
+     'start_date_epoch': 1704067200, 'end_date_epoch': 1706745600, 'distance_flown_km': 500},
+    {'deployment_name': 'sbu01-20240301T0000', 'glider_name': 'sbu01', 'project_name': 'NYDEC', 'start_year': 2024,
+     'start_date_epoch': 1709251200, 'end_date_epoch': 1710115200, 'distance_flown_km': 150},
+    {'deployment_name': 'ru39-20250101T0000', 'glider_name': 'ru39', 'project_name': 'MARACOOS', 'start_year': 2025,
+     'start_date_epoch': 1735689600, 'end_date_epoch': None, 'distance_flown_km': 80},
+]
+catalog = build_catalog(deployment_list)
+
+
+def names(selected):
+    return list(selected['deployment_name'])
+
+
+def test_build_catalog():
+    assert list(catalog['ongoing']) == [False, False, True]
+    assert list(catalog['ru_glider']) == [True, False, True]
+    assert catalog['nDays'][0] == 31
+    assert np.isnan(catalog['nDays'][2])
+
+
+def test_filter_by_name():
+    assert names(filter_deployments(catalog, projects=['MARACOOS'])) == ['ru40-20240101T0000', 'ru39-20250101T0000']
+    assert names(filter_deployments(catalog, projects=['MARACOOS'], gliders=['sbu01'])) == []
+    assert len(filter_deployments(catalog, projects=['MARACOOS'], gliders=['sbu01'], logical_operator='or')) == 3
+
+
+def test_filter_by_time():
+    assert names(filter_deployments(catalog, t0='2024-01-15')) == ['sbu01-20240301T0000', 'ru39-20250101T0000']
+    # ru40 was still in the water on Jan 15
+    assert len(filter_deployments(catalog, t0='2024-01-15', overlap=True)) == 3
+    assert names(filter_deployments(catalog, t0='2024-02-15', t1='2024-12-31', overlap=True)) == ['sbu01-20240301T0000']
+
+
+def test_deployment_summary():
+    summary = deployment_summary(catalog, distance=True)
+    assert list(summary['nDays'][:2]) == [31, 10]
+    assert summary['nDays'][2] == 'ongoing'
+    assert list(summary['distance_km']) == [500, 150, 80]
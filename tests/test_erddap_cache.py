@@ -0,0 +1,43 @@
+import erddap_cache
+from erddap_cache import cache_policy, rt_max_age
+
+server = 'https://slocum-data.marine.rutgers.edu/erddap'
+
+
+def test_delayed_datasets_are_permanent():
+    assert cache_policy(f'{server}/tabledap/ru40-20240101T0000-profile-sci-delayed.csv?time') == ('permanent', None)
+    assert cache_policy(f'{server}/info/ru40-20240101T0000-profile-sci-delayed/index.csv') == ('permanent', None)
+
+
+def test_rt_datasets_expire():
+    assert cache_policy(f'{server}/tabledap/ru40-20240101T0000-profile-sci-rt.csv?time') == ('max_age', rt_max_age)
+
+
+def test_dataset_lists_and_searches_are_revalidated():
+    assert cache_policy(f'{server}/tabledap/allDatasets.csv?datasetID') == ('revalidate', None)
+    assert cache_policy(f'{server}/search/index.csv?searchFor=ru40') == ('revalidate', None)
+
+
+def test_fetch_reads_valid_responses_from_disk(tmp_path, monkeypatch):
+    downloads = []
+
+    class Response:
+        headers = {}
+        status_code = 200
+        content = b'time\nUTC\n'
+
+    def get(url, **kwargs):
+        downloads.append(url)
+        return Response()
+    monkeypatch.setattr(erddap_cache, 'erddap_cache_dir', str(tmp_path))
+    monkeypatch.setattr(erddap_cache, 'enabled', True)
+    monkeypatch.setattr(erddap_cache, 'get', get)
+    delayed = f'{server}/tabledap/ru40-20240101T0000-profile-sci-delayed.csv?time'
+    rt = f'{server}/tabledap/ru40-20240101T0000-profile-sci-rt.csv?time'
+    for url in [delayed, delayed, rt, rt]:
+        assert erddap_cache.fetch(url) == b'time\nUTC\n'
+    assert downloads == [delayed, rt]
+    monkeypatch.setattr(erddap_cache, 'rt_max_age', -1)
+    erddap_cache.fetch(rt)
+    erddap_cache.fetch(delayed)
+    assert downloads == [delayed, rt, rt]
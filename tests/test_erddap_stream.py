@@ -0,0 +1,54 @@
+import io
+import pandas as pd
+import erddap_stream
+from erddap_stream import GroupAggregator, stream_csv
+
+ops = {'t0': ('time', 'min'), 't1': ('time', 'max'), 'nTemp': ('temp', 'nonzero'), 'nDepth': ('depth', 'count')}
+data = pd.DataFrame({'source_file': ['a', 'a', 'b', 'a', 'b', 'c'],
+                     'time': pd.to_datetime(['2024-01-01 00:00', '2024-01-01 01:00', '2024-01-01 02:00',
+                                             '2024-01-01 00:30', '2024-01-01 03:00', '2024-01-01 04:00']),
+                     'temp': [10.0, 0.0, float('nan'), 12.0, 11.0, float('nan')],
+                     'depth': [1.0, 2.0, 3.0, float('nan'), 5.0, 6.0]})
+
+
+def by_source(result):
+    return result.set_index('source_file').sort_index()
+
+
+def test_group_aggregator_chunks_match_one_pass():
+    whole = GroupAggregator('source_file', ops)
+    whole.update(data)
+    chunked = GroupAggregator('source_file', ops)
+    for start in range(0, len(data), 2):
+        chunked.update(data.iloc[start:start+2])
+    pd.testing.assert_frame_equal(by_source(chunked.result()), by_source(whole.result()))
+    result = by_source(whole.result())
+    assert result.loc['a', 't0'] == pd.Timestamp('2024-01-01 00:00')
+    assert result.loc['a', 't1'] == pd.Timestamp('2024-01-01 01:00')
+    assert list(result['nTemp']) == [2, 1, 0]
+    assert list(result['nDepth']) == [2, 2, 1]
+
+
+def test_group_aggregator_merge():
+    parts = []
+    for rows in [data.iloc[:3], data.iloc[3:]]:
+        part = GroupAggregator('source_file', ops)
+        part.update(rows)
+        parts.append(part.result())
+    merged = GroupAggregator('source_file', ops)
+    for part in parts:
+        merged.merge(part)
+    whole = GroupAggregator('source_file', ops)
+    whole.update(data)
+    pd.testing.assert_frame_equal(by_source(merged.result()), by_source(whole.result()))
+
+
+def test_stream_csv_skips_units_row(monkeypatch):
+    body = b'source_file,time,depth\n,UTC,m\na,2024-01-01T00:00:00Z,1.5\nb,2024-01-01T01:00:00Z,2.5\n'
+    monkeypatch.setattr(erddap_stream, 'open_url', lambda url: io.BytesIO(body))
+    chunks = list(stream_csv('http://example/x.csv', dtype={'source_file': str}, chunksize=1))
+    assert len(chunks) == 2
+    frame = pd.concat(chunks, ignore_index=True)
+    assert list(frame['source_file']) == ['a', 'b']
+    assert frame['time'][1] == pd.Timestamp('2024-01-01 01:00')
+    assert frame['depth'].dtype == 'float64'
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+import get_binary_info
+from get_binary_info import analyze_filetype, audit_deployment, parse_binary_list
+
+lines = ['/data/ru40/sbd/ru40-2025-57-0-0.sbd:fileopen_time:    Thu_Feb_27_14:36:00_2025',
+         '/data/ru40/sbd/ru40-2025-57-0-1.sbd:fileopen_time:    Thu_Feb_27_16:40:00_2025',
+         '/data/ru40/sbd/ru40-2025-58-0-2.sbd:fileopen_time:    Sat_Mar__1_06:00:00_2025',
+         './tbd/ru40-2025-57-0-0.tbd:fileopen_time:    Thu_Feb_27_14:36:00_2025']
+
+
+def test_parse_binary_list():
+    binary_list = parse_binary_list(lines, cwd='/work')
+    assert list(binary_list['filetype']) == ['sbd', 'sbd', 'sbd', 'tbd']
+    assert binary_list['time'][2] == pd.Timestamp('2025-03-01 06:00:00')
+    assert binary_list['directory'][0] == '/data/ru40/sbd'
+    assert binary_list['directory'][3] == '/work/tbd'
+    assert binary_list['filename'][3] == 'ru40-2025-57-0-0.tbd'
+
+
+def test_analyze_filetype_gaps_and_bounds():
+    binary_list = parse_binary_list(lines, cwd='/work')
+    sbd = binary_list[binary_list['filetype'] == 'sbd']
+    t0 = pd.Timestamp('2025-02-27 15:00')
+    t1 = pd.Timestamp('2025-03-01 07:00')
+    _, summary = analyze_filetype(sbd, 'sbd', t0, t1, 0.1, 2, 12, binary_list['directory'])
+    assert summary['nFiles'] == 3
+    assert summary['nGaps'] == 1
+    assert summary['hoursBeforeStart'] == 0.4
+    assert summary['hoursAfterEnd'] == 0
+    assert not summary['noFilesNearEnd']
+
+
+
+def test_batch_report(tmp_path, monkeypatch):
+    catalog = pd.DataFrame({'deployment_name': ['ru40-20250227T1436', 'ru39-20250301T0000'],
+                            'start_time': pd.to_datetime(['2025-02-27 14:36', '2025-03-01 00:00']),
+                            'end_time': pd.to_datetime(['2025-03-01 07:00', None]),
+                            'os': [8, 7]})
+    monkeypatch.setattr(get_binary_info, 'load_catalog', lambda: catalog)
+    listing = tmp_path / '2025' / 'ru40-20250227T1436' / 'data' / 'in' / 'binary' / 'ru40-20250227T1436_binary_open_times.txt'
+    listing.parent.mkdir(parents=True)
+    listing.write_text('\n'.join(lines) + '\n')
+    report = str(tmp_path / 'report.csv')
+    args = get_binary_info.build_parser().parse_args(['ru40-20250227T1436', 'ru39-20250301T0000', 'ru01-20030101T0000',
+                                                      '-d', str(tmp_path), '-w', '1', '-o', report])
+    get_binary_info.main(args)
+    summary = pd.read_csv(report).set_index('deployment')
+    assert list(summary.loc['ru40-20250227T1436', 'filetype']) == ['sbd', 'tbd']
+    assert list(summary.loc['ru40-20250227T1436', 'nFiles']) == [3, 1]
+    assert summary.loc['ru39-20250301T0000', 'note'] == 'binary listing not found'
+    assert summary.loc['ru01-20030101T0000', 'note'] == 'not in deployment list'
+
+
+def test_audit_deployment_bad_listing_is_a_note(tmp_path):
+    listing = tmp_path / 'listing.txt'
+    listing.write_text('/data/ru40/sbd/ru40-2025-57-0-0.sbd:fileopen_time:    not_a_time\n')
+    lines_out, summaries = audit_deployment('ru40-20250227T1436', str(listing), pd.Timestamp('2025-02-27'), pd.NaT,
+                                            7, 2, 2, 12)
+    assert [s['deployment'] for s in summaries] == ['ru40-20250227T1436']
+    assert summaries[0]['note'].startswith('unable to check binary listing')
+
+
+def test_main_needs_a_listing_source():
+    with pytest.raises(SystemExit):
+        get_binary_info.main(get_binary_info.build_parser().parse_args(['ru40-20250227T1436']))
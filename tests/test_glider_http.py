@@ -0,0 +1,125 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import glider_http
+import replay_server
+from glider_http import HostLimiter, get_json, limiter
+
+
+@pytest.fixture
+def server():
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            calls.append(self.path)
+            if self.path == '/missing':
+                status, body = 404, b'{}'
+            elif self.path == '/flaky' and len(calls) == 1:
+                status, body = 503, b'{}'
+            else:
+                status, body = 200, b'{"data": [1, 2]}'
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            return
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}', calls
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_retries_server_errors(server):
+    url, calls = server
+    assert get_json(f'{url}/flaky') == {'data': [1, 2]}
+    assert calls == ['/flaky', '/flaky']
+
+
+def test_client_errors_are_raised_without_retrying(server):
+    url, calls = server
+    with pytest.raises(requests.HTTPError):
+        get_json(f'{url}/missing')
+    assert calls == ['/missing']
+
+
+def test_limiter_is_shared_per_host():
+    assert limiter('gliders.ioos.us') is limiter('gliders.ioos.us')
+    assert limiter('gliders.ioos.us').semaphore._initial_value == glider_http.host_limits['gliders.ioos.us'][0]
+
+
+def test_host_limiter_caps_concurrent_requests():
+    host = HostLimiter(2, 0)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def request():
+        with host:
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=request) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
+
+
+def test_host_limiter_spaces_request_starts():
+    host = HostLimiter(4, 0.05)
+    starts = []
+    for i in range(3):
+        with host:
+            starts.append(time.monotonic())
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.045
+
+
+def test_record_then_replay(server, tmp_path, monkeypatch):
+    url, calls = server
+    monkeypatch.setattr(glider_http, 'record_dir', str(tmp_path))
+    assert get_json(f'{url}/deployments/', params={'active': 'true'}) == {'data': [1, 2]}
+    monkeypatch.setattr(glider_http, 'record_dir', None)
+
+    replay = replay_server.start(str(tmp_path))
+    monkeypatch.setattr(glider_http, 'replay_server', f'http://127.0.0.1:{replay.server_address[1]}')
+    try:
+        assert get_json(f'{url}/deployments/?active=true') == {'data': [1, 2]}
+        with pytest.raises(requests.HTTPError):
+            get_json(f'{url}/deployments/?active=false')
+    finally:
+        replay.shutdown()
+        replay.server_close()
+    assert calls == ['/deployments/?active=true']
+    assert replay.stats == {'requests': 2, 'bytes': 16, 'missing': 1}
+
+
+def test_replay_matches_quoted_constraints(server, tmp_path, monkeypatch):
+    url, calls = server
+    query = f'{url}/tabledap/ru40.json?time&trajectory="ru40-20240101T0000"'
+    monkeypatch.setattr(glider_http, 'record_dir', str(tmp_path))
+    get_json(query)
+    monkeypatch.setattr(glider_http, 'record_dir', None)
+
+    replay = replay_server.start(str(tmp_path))
+    monkeypatch.setattr(glider_http, 'replay_server', f'http://127.0.0.1:{replay.server_address[1]}')
+    try:
+        assert get_json(query) == {'data': [1, 2]}
+    finally:
+        replay.shutdown()
+        replay.server_close()
+    assert len(calls) == 1
+    assert replay.stats['missing'] == 0
@@ -0,0 +1,151 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+import glider_map_and_info
+import track_index
+from deployment_catalog import build_catalog
+from glider_map_and_info import index_window, log_elevation, read_bathymetry, read_first_bathymetry, resample_track, track_density
+
+
+class Identity:
+    def transform_points(self, src, x, y):
+        return np.column_stack([x, y, np.zeros(len(x))])
+
+
+proj = {'map': Identity(), 'data': Identity()}
+
+
+def test_resample_track():
+    xy = np.array([[0.0, 0.0], [3.0, 4.0], [3.0, 10.0]])
+    np.testing.assert_allclose(resample_track(xy, 5), [[0, 0], [3, 4], [3, 9]])
+    np.testing.assert_allclose(resample_track(xy, 2.5)[:3], [[0, 0], [1.5, 2], [3, 4]])
+    np.testing.assert_allclose(resample_track(np.array([[1.0, 1.0], [1.0, 1.0]]), 1), [[1, 1]])
+
+
+def test_track_density_counts_and_masks_empty_cells():
+    tracks = [np.array([[1.0, 1.0], [1.5, 1.5], [8.0, 1.0]]), np.array([[1.2, 1.2], [np.nan, 0]])]
+    xedges, yedges, counts = track_density(tracks, proj, (0, 10), (0, 5), grid_size=10)
+    assert len(xedges) == 11 and len(yedges) == 6
+    assert counts.sum() == 4
+    assert counts[1, 1] == 3
+    assert counts.count() == 2
+
+
+def test_resampled_density_ignores_reporting_rate():
+    sparse = np.array([[0.0, 0.5], [9000.0, 0.5]])
+    dense = np.column_stack([np.linspace(0, 9000, 500), np.full(500, 0.5)])
+    _, _, sparse_counts = track_density([sparse], proj, (0, 9000), (0, 1000), grid_size=9, spacing=1)
+    _, _, dense_counts = track_density([dense], proj, (0, 9000), (0, 1000), grid_size=9, spacing=1)
+    np.testing.assert_array_equal(sparse_counts, dense_counts)
+    assert sparse_counts.sum() == 9
+
+
+
+def test_index_window_ascending_and_descending():
+    coord = np.arange(0, 10.5, 0.5)
+    assert index_window(coord, 2, 4, 100) == slice(3, 10, 1)
+    assert list(coord[::-1][index_window(coord[::-1], 2, 4, 100)]) == [4.5, 4, 3.5, 3, 2.5, 2, 1.5]
+    window = index_window(coord, 0, 10, 5)
+    assert len(coord[window]) <= 5
+
+
+def test_log_elevation_in_place():
+    z = np.array([-1000, -0.5, 0, 0.5, 100], dtype=np.float32)
+    out = log_elevation(z)
+    assert out is z
+    np.testing.assert_allclose(z, [-3, 0, 0, 0, 2], rtol=1e-6)
+
+
+def test_read_bathymetry_window(tmp_path):
+    lon = np.arange(-80, -60.5, 0.5)
+    lat = np.arange(45, 29.5, -0.5)
+    z = -np.add.outer(np.arange(len(lat)), np.arange(len(lon))).astype(float)
+    fname = str(tmp_path / 'gmrt.nc')
+    xr.Dataset({'elevation': (('lat', 'lon'), z)}, coords={'lon': lon, 'lat': lat}).to_netcdf(fname)
+    blon, blat, bz = read_bathymetry([-75, -72, 38, 41], fname)
+    assert blon[0] == -75.5 and blon[-1] == -71.5
+    assert blat[0] == 41.5 and blat[-1] == 37.5
+    assert bz.dtype == np.float32
+    assert bz.shape == (len(blat), len(blon))
+    assert bz[0, 0] == z[list(lat).index(41.5), list(lon).index(-75.5)]
+    blon, blat, bz = read_bathymetry([-75, -72, 38, 41], fname, max_points=4)
+    assert len(blon) <= 4 and len(blat) <= 4
+
+
+def test_read_bathymetry_without_elevation(tmp_path):
+    fname = str(tmp_path / 'sst.nc')
+    xr.Dataset({'sst': (('lat', 'lon'), np.zeros((3, 3)))},
+               coords={'lon': [-76.0, -74.0, -72.0], 'lat': [38.0, 40.0, 42.0]}).to_netcdf(fname)
+    with pytest.raises(ValueError, match='no elevation variable'):
+        read_bathymetry([-75, -73, 39, 41], fname)
+
+
+def deployment(name, start, end):
+    return {'deployment_name': name, 'glider_name': name.split('-')[0], 'project_name': 'MARACOOS',
+            'start_year': 2024, 'start_date_epoch': pd.Timestamp(start).timestamp(),
+            'end_date_epoch': pd.Timestamp(end).timestamp() if end else None, 'distance_flown_km': 100}
+
+
+def test_stats_reuse_profile_counts(tmp_path, monkeypatch):
+    catalog = build_catalog([deployment('ru40-20240101T0000', '2024-01-01', '2024-01-31'),
+                             deployment('ru39-20240201T0000', '2024-02-01', '2024-02-28'),
+                             deployment('ru38-20240301T0000', '2024-03-01', None),
+                             deployment('ru37-20240401T0000', '2024-04-01', '2024-04-30'),
+                             deployment('ru36-20240501T0000', '2024-05-01', '2024-05-20')])
+    datasets = ['ru40-20240101T0000-profile-sci-delayed', 'ru39-20240201T0000-profile-sci-delayed',
+                'ru38-20240301T0000-profile-sci-rt', 'ru37-20240401T0000-profile-sci-rt',
+                'ru36-20240501T0000-profile-sci-rt']
+    counted = []
+
+    def read_erddap(e, distinct=False):
+        counted.append(e.dataset_id)
+        return pd.DataFrame({'profile_time': pd.date_range('2024-01-01', periods=7, freq='h').astype(str)})
+    monkeypatch.setattr(glider_map_and_info, 'load_catalog', lambda: catalog)
+    monkeypatch.setattr(glider_map_and_info, 'dataset_ids', lambda server: datasets)
+    monkeypatch.setattr(glider_map_and_info, 'read_erddap', read_erddap)
+    monkeypatch.setattr(track_index, 'load_tracks',
+                        lambda selected: {dep: np.array([[-74.0, 39.0], [-74.0, 39.5]]) for dep in selected['deployment_name']})
+
+    csv_file = tmp_path / 'stats.csv'
+    # ru39 was still rt, ru38 is ongoing, ru37 is new, ru36 was ongoing and is now recovered but still rt
+    pd.DataFrame({'deployment_name': ['ru40-20240101T0000', 'ru39-20240201T0000', 'ru38-20240301T0000',
+                                      'ru36-20240501T0000'],
+                  'nDays': [30, 27, 'ongoing', 'ongoing'],
+                  'nProfiles': [500, 300, 2, 3],
+                  'mode': ['delayed', 'rt', 'rt', 'rt']}).to_csv(csv_file, index=False)
+    glider_map_and_info.main(glider_map_and_info.build_parser().parse_args(['-csv', str(csv_file)]))
+    assert counted == ['ru39-20240201T0000-profile-sci-delayed', 'ru38-20240301T0000-profile-sci-rt',
+                       'ru37-20240401T0000-profile-sci-rt', 'ru36-20240501T0000-profile-sci-rt']
+    stats = pd.read_csv(csv_file).set_index('deployment_name')
+    assert list(stats['nProfiles']) == [500, 7, 7, 7, 7]
+    assert list(stats['mode']) == ['delayed', 'delayed', 'rt', 'rt', 'rt']
+    np.testing.assert_allclose(stats['track_distance_km'], 55.6, atol=0.1)
+    assert stats['mean_speed_m_s']['ru40-20240101T0000'] == pytest.approx(55.6e3/(30*86400), rel=1e-3)
+
+    counted.clear()
+    glider_map_and_info.main(glider_map_and_info.build_parser().parse_args(['-csv', str(csv_file), '-rs']))
+    assert len(counted) == 5
+
+
+def test_read_first_bathymetry_says_which_source_is_used(monkeypatch, capsys):
+    def fake_read(extent, source, max_points):
+        if source:
+            raise ValueError(f'{source} does not cover {extent}')
+        return 'downloaded'
+    monkeypatch.setattr(glider_map_and_info, 'read_bathymetry', fake_read)
+    assert read_first_bathymetry([0, 1, 0, 1], ['local.nc', None], 10, 'inset') == 'downloaded'
+    assert 'Using bathymetry from cool_maps download for inset' in capsys.readouterr().out
+    assert read_first_bathymetry([0, 1, 0, 1], ['local.nc'], 10, 'inset') is None
+    assert 'Plotting inset without bathymetry' in capsys.readouterr().out
+
+
+def test_track_index_is_imported_only_when_needed():
+    code = ('import sys, glider_map_and_info\n'
+            "print(sorted(m for m in ['track_index', 'shapely'] if m in sys.modules))")
+    scripts_dir = os.path.dirname(glider_map_and_info.__file__)
+    out = subprocess.run([sys.executable, '-c', code], cwd=scripts_dir, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import pytest
+import erddap_cache
+import glider_metrics
+from glider_metrics import stage
+
+
+def test_repeated_stages_add_up():
+    glider_metrics.reset()
+    for i in range(3):
+        with stage('fetch'):
+            glider_metrics.count('http_requests')
+    timer = glider_metrics.start_stage('render')
+    timer.stop()
+    result = glider_metrics.metrics()
+    assert result['stages']['fetch']['count'] == 3
+    assert result['stages']['render']['count'] == 1
+    assert result['counters'] == {'http_requests': 3}
+
+
+def test_run_appends_one_line_per_run(tmp_path):
+    fname = str(tmp_path / 'metrics.jsonl')
+
+    def main(args):
+        with stage('compute'):
+            return 'done'
+    for i in range(2):
+        glider_metrics.reset()
+        assert glider_metrics.run(main, argparse.Namespace(profile=None, metrics_json=fname), 'test') == 'done'
+    lines = [json.loads(line) for line in open(fname)]
+    assert len(lines) == 2
+    assert lines[0]['script'] == 'test'
+    assert lines[1]['stages']['compute']['count'] == 1
+
+
+def test_run_writes_metrics_when_main_fails(tmp_path):
+    fname = str(tmp_path / 'metrics.json')
+
+    def main(args):
+        glider_metrics.count('http_requests', 2)
+        raise RuntimeError('failed')
+    glider_metrics.reset()
+    with pytest.raises(RuntimeError):
+        glider_metrics.run(main, argparse.Namespace(profile=None, metrics_json=fname))
+    with open(fname) as f:
+        assert json.load(f)['counters'] == {'http_requests': 2}
+
+
+def test_profile_reports(tmp_path):
+    prefix = str(tmp_path / 'profile')
+    glider_metrics.run(lambda args: sorted(range(1000)), argparse.Namespace(profile=prefix, metrics_json=None))
+    for suffix in ['.prof', '.txt', '_memory.txt']:
+        assert os.path.getsize(prefix + suffix) > 0
+
+
+def test_reset_clears_stages_counters_and_cache_stats():
+    glider_metrics.reset()
+    with stage('fetch'):
+        glider_metrics.count('http_requests', 3)
+    erddap_cache.count(hits=2, bytes_cached=100)
+    assert glider_metrics.metrics()['erddap_cache']['hits'] == 2
+    glider_metrics.reset()
+    result = glider_metrics.metrics()
+    assert result['stages'] == {}
+    assert result['counters'] == {}
+    assert all(v == 0 for v in result['erddap_cache'].values())
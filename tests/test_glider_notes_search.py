@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+from glider_notes_search import build_parser, compile_matcher, run_search, split_categories, split_list
+
+
+class FakeStore:
+    def __init__(self, notes):
+        self._notes = notes
+
+    def deployments(self):
+        return pd.DataFrame({'deployment_name': list(self._notes),
+                             'glider_name': [d.split('-')[0] for d in self._notes],
+                             'project_name': 'MARACOOS',
+                             'start_date_epoch': 0,
+                             'end_date_epoch': 0})
+
+    def notes(self, deployment):
+        if self._notes[deployment] is None:
+            raise ValueError('notes api failed')
+        return self._notes[deployment]
+
+
+def note(text, category='Informational', author='pilot'):
+    return {'pilot_notes': text, 'category_name': category, 'added_by': author, 'date_added': '2024-01-01'}
+
+
+def test_split_list():
+    assert split_list('ru40,ru39 ru38, ru37') == ['ru40', 'ru39', 'ru38', 'ru37']
+    assert split_list(['battery', 'low']) == ['battery', 'low']
+    assert split_list(None) == []
+
+
+def test_compile_matcher():
+    assert compile_matcher('low battery', 'exact')('LOW BATTERY on ascent')
+    assert not compile_matcher('low battery', 'exact')('battery low')
+    assert compile_matcher('low battery', 'all')('battery low')
+    assert not compile_matcher('low battery', 'all')('battery fine')
+    assert compile_matcher('low battery', 'any')('battery fine')
+    assert compile_matcher('', 'exact')('anything')
+
+
+def test_run_search_filters_and_reports_unreadable_deployments():
+    store = FakeStore({'ru40-20240101T0000': [note('ballast pumped'), note('ballast alert', category='Alert')],
+                       'ru39-20240101T0000': [note('nothing here')],
+                       'ru38-20240101T0000': None})
+    out = []
+    run_search(store, {'search_terms': 'ballast', 'categories': ['Alert']}, out.append)
+    text = ''.join(out)
+    assert 'ballast alert' in text
+    assert 'ballast pumped' not in text
+    assert 'ru39-20240101T0000' not in text
+    assert 'Unable to access deployment notes for ru38-20240101T0000' in text
+
+
+def test_split_categories_keeps_spaces_in_names():
+    assert split_categories('Action Needed, Action Taken') == ['Action Needed', 'Action Taken']
+    assert split_categories('') == []
+
+
+def test_categories_argument():
+    args = build_parser().parse_args(['-c', 'Action Needed,Action Taken', 'battery'])
+    assert args.categories == ['Action Needed', 'Action Taken']
+
+
+def test_unknown_category_is_an_error():
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(['-c', 'Action,Needed'])
@@ -0,0 +1,84 @@
+import json
+import time
+import pandas as pd
+import pytest
+import glider_pipeline
+from glider_pipeline import artifact_hash, fingerprint, reads_live_data, up_to_date
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(glider_pipeline, 'state_file', str(tmp_path / 'state.json'))
+    (tmp_path / 'in.txt').write_text('a')
+    (tmp_path / 'out.txt').write_text('done')
+    reformat = {'command': 'reformat', 'args': ['2023', '-d', str(tmp_path), '-n'],
+                'inputs': [str(tmp_path / 'in.txt')], 'outputs': [str(tmp_path / 'out.txt')]}
+    jobs = {'first': reformat, 'second': dict(reformat, inputs=[], after=['first'])}
+    fname = tmp_path / 'pipeline.json'
+    fname.write_text(json.dumps(jobs))
+    return tmp_path, str(fname)
+
+
+def run(fname, capsys, *options):
+    status = glider_pipeline.main(glider_pipeline.build_parser().parse_args([fname, '-w', '2'] + list(options)))
+    out = capsys.readouterr().out
+    ran = sorted(name for name in ['first', 'second', 'broken', 'waits'] if f'==> {name} (exit' in out)
+    return status, ran
+
+
+def test_fingerprint_covers_args_shared_data_and_inputs(tmp_path):
+    fname = tmp_path / 'categories.csv'
+    fname.write_text('ctd')
+    job = {'command': 'sensors', 'args': ['-o', 'sensors.csv'], 'inputs': [str(fname)]}
+    hashes = {'catalog': artifact_hash(pd.DataFrame({'a': [1]})), 'ru_datasets': artifact_hash(['b', 'a']),
+              'dac_datasets': 'x'}
+    key = fingerprint(job, hashes)
+    assert fingerprint(job, dict(hashes, dac_datasets='y')) == key
+    assert fingerprint(job, dict(hashes, ru_datasets=artifact_hash(['a', 'b']))) == key
+    assert fingerprint(job, dict(hashes, catalog=artifact_hash(pd.DataFrame({'a': [2]})))) != key
+    assert fingerprint(dict(job, args=['-o', 'other.csv']), hashes) != key
+    fname.write_text('ctd,pam')
+    assert fingerprint(job, hashes) != key
+
+
+def test_up_to_date(tmp_path):
+    out = tmp_path / 'out.csv'
+    job = {'outputs': [str(out)]}
+    previous = {'fingerprint': 'k', 'time': time.time()}
+    assert not up_to_date(job, 'k', previous)
+    out.write_text('x')
+    assert up_to_date(job, 'k', previous)
+    assert not up_to_date(job, 'other', previous)
+    assert not up_to_date({}, 'k', previous)
+    assert not up_to_date(dict(job, max_age=60), 'k', dict(previous, time=time.time()-120))
+    assert not up_to_date(job, 'k', previous, live=True)
+    assert up_to_date(dict(job, max_age=60), 'k', previous, live=True)
+
+
+def test_map_job_reruns_while_deployments_are_ongoing():
+    ongoing = {'catalog': pd.DataFrame({'deployment_name': ['ru40', 'ru39'], 'ongoing': [False, True]})}
+    recovered = {'catalog': pd.DataFrame({'deployment_name': ['ru40'], 'ongoing': [False]})}
+    assert reads_live_data({'command': 'map'}, ongoing)
+    assert not reads_live_data({'command': 'map'}, recovered)
+    assert not reads_live_data({'command': 'stats'}, ongoing)
+    assert not reads_live_data({'command': 'reformat'}, {})
+
+
+def test_jobs_are_skipped_until_something_changes(pipeline, capsys):
+    tmp_path, fname = pipeline
+    assert run(fname, capsys) == (None, ['first', 'second'])
+    assert run(fname, capsys) == (None, [])
+    (tmp_path / 'in.txt').write_text('changed')
+    # second runs again because first did
+    assert run(fname, capsys) == (None, ['first', 'second'])
+    assert run(fname, capsys, '--only', 'second') == (1, [])
+    assert run(fname, capsys, '--force') == (None, ['first', 'second'])
+
+
+def test_jobs_after_a_failed_job_are_skipped(pipeline, capsys):
+    tmp_path, fname = pipeline
+    jobs = {'broken': {'command': 'reformat', 'args': ['not_a_year']},
+            'waits': {'command': 'reformat', 'args': ['2023', '-d', str(tmp_path), '-n'], 'after': ['broken']}}
+    with open(fname, 'w') as f:
+        json.dump(jobs, f)
+    assert run(fname, capsys) == (1, ['broken'])
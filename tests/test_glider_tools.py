@@ -0,0 +1,48 @@
+import argparse
+import os
+import subprocess
+import sys
+import glider_tools
+from glider_tools import read_commands, split_commands
+
+scripts_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+
+
+def run(command=(), commands=None):
+    return glider_tools.main(argparse.Namespace(command=list(command), commands=commands))
+
+
+def test_split_commands():
+    assert split_commands(['stats', '-f', 'a.csv', '+', 'sensors', '+']) == [['stats', '-f', 'a.csv'], ['sensors']]
+    assert split_commands([]) == []
+
+
+def test_read_commands(tmp_path):
+    fname = tmp_path / 'nightly.txt'
+    fname.write_text("# nightly jobs\nstats -p 'Some Project'\n\nreformat 2024  # comment\n")
+    assert read_commands(str(fname)) == [['stats', '-p', 'Some Project'], ['reformat', '2024']]
+
+
+def test_chained_commands_all_run(tmp_path, capsys):
+    reformat = ['reformat', '2023', '-d', str(tmp_path), '--dry_run']
+    assert run(reformat + ['+', 'nonsense', '+'] + reformat) == 1
+    captured = capsys.readouterr()
+    assert captured.out.count('0 changes needed in 0 deployment directories.') == 2
+    assert 'Unknown command nonsense' in captured.err
+    assert 'Failed: nonsense (exit 2)' in captured.err
+
+
+def test_bad_arguments_fail_one_command(tmp_path, capsys):
+    fname = tmp_path / 'commands.txt'
+    fname.write_text(f'reformat not_a_year\nreformat 2023 -d {tmp_path} -n\n')
+    assert run(commands=str(fname)) == 1
+    assert '0 changes needed' in capsys.readouterr().out
+    assert run(['reformat', '2023', '-d', str(tmp_path), '-n']) is None
+
+
+def test_subcommands_import_only_what_they_use(tmp_path):
+    code = ('import sys, glider_tools\n'
+            f"glider_tools.run_command(['reformat', '2023', '-d', {str(tmp_path)!r}, '-n'])\n"
+            "print(sorted(m for m in ['glider_map_and_info', 'erddapy', 'matplotlib'] if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=scripts_dir, capture_output=True, text=True, check=True)
+    assert out.stdout.strip().splitlines()[-1] == '[]'
@@ -0,0 +1,61 @@
+from reconcile_binaries import disk_binaries, reconcile, segment_keys, source_filetype
+
+
+def test_segment_keys():
+    assert segment_keys('ru40-2024-123-0-12-sbd(01230012)') == ['ru40-2024-123-0-12', '01230012']
+    assert segment_keys('ru40-2024-123-0-12-sbd') == ['ru40-2024-123-0-12']
+
+
+def test_disk_binaries_counts_copies_once(tmp_path):
+    for path in ['from-glider/sbd/01230012.SBD', 'sbd/01230012.sbd', 'sbd/01230013.sbd', 'tbd/01230012.tbd',
+                 'logs/01230012.mlg']:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_bytes(b'')
+    assert disk_binaries(str(tmp_path), ['sbd', 'tbd', 'scd']) == {'sbd': {'01230012', '01230013'},
+                                                                  'tbd': {'01230012'}, 'scd': set()}
+
+
+def test_reconcile_long_and_short_names():
+    source_files = ['ru40-2024-123-0-12-sbd(01230012)', 'ru40-2024-123-0-13-sbd(01230013)',
+                    'ru40-2024-123-0-14-sbd(01230014)']
+    results = reconcile(source_files, {'sbd': ['01230012', 'RU40-2024-123-0-13', '01230015']})
+    assert results['sbd']['matched'] == 2
+    assert results['sbd']['disk_only'] == ['01230015.sbd']
+    assert results['sbd']['erddap_only'] == ['ru40-2024-123-0-14-sbd(01230014)']
+
+
+def test_source_filetype():
+    assert source_filetype('ru40-2024-123-0-12-tbd(01230012)') == 'tbd'
+    assert source_filetype('RU40-2024-123-0-12-SBD(01230012)') == 'sbd'
+
+
+def test_reconcile_mixed_filetypes_complete_disk():
+    source_files = ['ru40-2024-123-0-12-sbd(01230012)', 'ru40-2024-123-0-12-tbd(01230012)',
+                    'ru40-2024-123-0-13-sbd(01230013)', 'ru40-2024-123-0-13-tbd(01230013)']
+    disk = {'sbd': ['01230012', 'ru40-2024-123-0-13'], 'tbd': ['01230012', '01230013']}
+    results = reconcile(source_files, disk)
+    for ftype in ['sbd', 'tbd']:
+        assert results[ftype]['source_type'] == ftype
+        assert results[ftype]['matched'] == 2
+        assert results[ftype]['disk_only'] == []
+        assert results[ftype]['erddap_only'] == []
+
+
+def test_reconcile_mixed_filetypes_missing_files():
+    source_files = ['ru40-2024-123-0-12-sbd(01230012)', 'ru40-2024-123-0-12-tbd(01230012)',
+                    'ru40-2024-123-0-13-sbd(01230013)', 'ru40-2024-123-0-13-tbd(01230013)']
+    disk = {'sbd': ['01230012', '01230013', '01230014'], 'tbd': ['01230013']}
+    results = reconcile(source_files, disk)
+    assert results['sbd']['disk_only'] == ['01230014.sbd']
+    assert results['sbd']['erddap_only'] == []
+    assert results['tbd']['disk_only'] == []
+    assert results['tbd']['erddap_only'] == ['ru40-2024-123-0-12-tbd(01230012)']
+
+
+def test_reconcile_science_against_flight_source_files():
+    source_files = ['ru40-2024-123-0-12-sbd(01230012)', 'ru40-2024-123-0-13-sbd(01230013)']
+    results = reconcile(source_files, {'sbd': ['01230012', '01230013'], 'tbd': ['01230013']})
+    assert results['sbd']['erddap_only'] == []
+    assert results['tbd']['source_type'] == 'sbd'
+    assert results['tbd']['matched'] == 1
+    assert results['tbd']['erddap_only'] == ['ru40-2024-123-0-12-sbd(01230012)']
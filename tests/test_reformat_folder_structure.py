@@ -0,0 +1,94 @@
+import argparse
+import errno
+import os
+import pytest
+import reformat_folder_structure
+from reformat_folder_structure import build_plan, clone_file, main, same_file
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+@pytest.fixture
+def slocum(tmp_path):
+    template = tmp_path / 'deployment-template'
+    for cdir in ['ngdac-profile', 'sci-profile', 'raw-trajectory']:
+        write(str(template / 'config' / cdir / 'sensor_defs.json'), f'{{"{cdir}": 1}}')
+    write(str(template / 'data' / 'out' / 'nc' / 'ngdac-profile' / 'rt' / 'README'), 'ngdac')
+    deployment = tmp_path / 'deployments' / '2024' / 'ru40-20240101T0000'
+    write(str(deployment / 'config' / 'sci-profile' / 'sensor_defs.json'), '{"old": 1}')
+    os.makedirs(deployment / 'data' / 'out' / 'nc' / 'sci-profile' / 'rt')
+    return tmp_path
+
+
+def run(slocum, dry_run=False, link='copy'):
+    main(argparse.Namespace(parent_dir=str(slocum), years=[2024], workers=2, dry_run=dry_run, link=link))
+
+
+def test_dry_run_changes_nothing(slocum, capsys):
+    run(slocum, dry_run=True)
+    assert '9 changes needed in 1 deployment directories.' in capsys.readouterr().out
+    deployment = slocum / 'deployments' / '2024' / 'ru40-20240101T0000'
+    assert (deployment / 'config' / 'sci-profile' / 'sensor_defs.json').read_text() == '{"old": 1}'
+    assert not (deployment / 'config' / 'ngdac-profile').exists()
+
+
+def test_apply_then_rerun_is_a_no_op(slocum, capsys):
+    run(slocum)
+    deployment = slocum / 'deployments' / '2024' / 'ru40-20240101T0000'
+    assert (deployment / 'config' / 'sci-profile' / 'sensor_defs.json').read_text() == '{"sci-profile": 1}'
+    assert (deployment / 'data' / 'out' / 'nc' / 'ngdac-profile' / 'rt' / 'README').read_text() == 'ngdac'
+    assert (deployment / 'data' / 'out' / 'nc' / 'ngdac-profile' / 'delayed' / 'qc_queue').is_dir()
+    assert build_plan(str(slocum), [2024]) == []
+    run(slocum)
+    assert 'already up to date' in capsys.readouterr().out
+
+
+def test_reflink_falls_back_to_copy(tmp_path, monkeypatch):
+    import fcntl
+
+    def no_reflink(*args):
+        raise OSError(errno.EOPNOTSUPP, 'reflinks not supported')
+    monkeypatch.setattr(fcntl, 'ioctl', no_reflink)
+    source, target = str(tmp_path / 'a.json'), str(tmp_path / 'b.json')
+    write(source, 'template')
+    clone_file(source, target, 'reflink')
+    assert open(target).read() == 'template'
+    assert not os.path.samefile(source, target)
+
+
+def test_hardlink_falls_back_to_copy_across_devices(tmp_path, monkeypatch):
+    def cross_device(source, target):
+        raise OSError(errno.EXDEV, 'cross-device link')
+    monkeypatch.setattr(reformat_folder_structure.os, 'link', cross_device)
+    source, target = str(tmp_path / 'a.json'), str(tmp_path / 'b.json')
+    write(source, 'template')
+    clone_file(source, target, 'hardlink')
+    assert open(target).read() == 'template'
+    assert not os.path.samefile(source, target)
+
+
+def test_existing_hardlink_is_replaced_not_written_through(tmp_path):
+    source, target = str(tmp_path / 'a.json'), str(tmp_path / 'b.json')
+    write(source, 'template')
+    clone_file(source, target, 'hardlink')
+    assert os.path.samefile(source, target)
+    other = str(tmp_path / 'c.json')
+    write(other, 'other')
+    clone_file(other, target, 'copy')
+    assert open(source).read() == 'template'
+    assert open(target).read() == 'other'
+
+
+def test_same_file_sees_a_rewritten_target(tmp_path):
+    source = str(tmp_path / 'a.txt')
+    target = str(tmp_path / 'b.txt')
+    write(source, 'abc')
+    write(target, 'abc')
+    assert same_file(source, target)
+    write(target, 'abd')
+    os.utime(target, ns=(0, 0))
+    assert not same_file(source, target)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from sensor_inventory import build_inventory, query_inventory, sensor_days, write_inventory, write_xlsx
+
+catalog = pd.DataFrame({'deployment_name': ['ru40-20240101T0000', 'sbu01-20240301T0000', 'ru39-20250101T0000'],
+                        'start_time': pd.to_datetime(['2024-01-01', '2024-03-01', '2025-01-01']),
+                        'end_time': pd.to_datetime(['2024-01-31', '2024-03-11', '1970-01-01']),
+                        'ongoing': [False, False, True]})
+deployment_info = pd.DataFrame({'deployment_name': catalog['deployment_name'],
+                                'year': [2024, 2024, 2025],
+                                'glider': ['ru40', 'sbu01', 'ru39'],
+                                'ru_glider': [True, False, True],
+                                'project': ['MARACOOS', 'NYDEC', 'RMI'],
+                                'nDays': [30.0, 10.0, 'ongoing'],
+                                'ctd': [1, 1, 1],
+                                'pam': [0, 0, 300]})
+
+
+def test_build_inventory_types():
+    inventory = build_inventory(deployment_info, catalog, ['ctd', 'pam'])
+    assert inventory['glider'].dtype == 'category'
+    assert inventory['project'].dtype == 'category'
+    assert inventory['ctd'].dtype == np.uint8
+    assert inventory['pam'][2] == 255
+    assert inventory['nDays'].dtype == np.float32
+    assert np.isnan(inventory['nDays'][2])
+    assert pd.isna(inventory['end_time'][2])
+    assert inventory['end_time'][0] == pd.Timestamp('2024-01-31')
+
+
+def test_query_inventory(tmp_path):
+    fname = str(tmp_path / 'sensors.feather')
+    write_inventory(build_inventory(deployment_info, catalog, ['ctd', 'pam']), fname)
+    assert list(query_inventory(fname, categories=['pam'])['deployment_name']) == ['ru39-20250101T0000']
+    assert list(query_inventory(fname, projects=['NYDEC'])['glider'].astype(str)) == ['sbu01']
+    assert list(query_inventory(fname, ongoing=False)['deployment_name']) == list(catalog['deployment_name'][:2])
+    assert len(query_inventory(fname)) == 3
+
+
+def test_sensor_days():
+    deployments = pd.DataFrame({'year': [2024, 2024, 2025], 'nDays': [30.0, 10.0, 5.0],
+                                'ctd': [1, 2, 1], 'pam': [0, 1, 0]})
+    summary = sensor_days(deployments, ['ctd', 'pam'])
+    assert list(summary.columns) == ['year', 'ctd days', 'pam days']
+    assert list(summary['ctd days']) == [50.0, 5.0]
+    assert list(summary['pam days']) == [10.0, 0.0]
+
+
+def test_write_xlsx_not_on_erddap_without_ru_glider(tmp_path):
+    fname = str(tmp_path / 'sensors.xlsx')
+    inventory = build_inventory(deployment_info.iloc[:2], catalog, ['ctd', 'pam'])
+    not_on_erddap = pd.DataFrame({'deployment_name': ['ru01-20030101T0000'], 'year': [2024], 'glider': ['ru01'],
+                                  'ru_glider': [np.nan], 'project': ['old'], 'nDays': [100.0], 'ctd': [1], 'pam': [1]})
+    write_xlsx(inventory, fname, not_on_erddap)
+    rutgers = pd.read_excel(fname, sheet_name='summary_rutgers')
+    everything = pd.read_excel(fname, sheet_name='summary')
+    assert list(rutgers['ctd days']) == [30.0]
+    assert list(everything['ctd days']) == [140.0]
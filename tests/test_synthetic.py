@@ -0,0 +1,36 @@
+import os
+import pandas as pd
+import synthetic
+from get_binary_info import parse_binary_list
+from check_tbd_gaps import flag_segments
+
+
+def test_fileopen_times():
+    times = pd.DatetimeIndex(['2024-01-01 00:00', '2024-02-29 13:05:09'])
+    assert synthetic.fileopen_times(times) == ['Mon_Jan__1_00:00:00_2024', 'Thu_Feb_29_13:05:09_2024']
+
+
+def test_make_tree_matches_its_listing(tmp_path):
+    lines = synthetic.make_tree(str(tmp_path), 'ru00', '2024-01-01T12:00', 40, file_size=4096, n_dirs=2)
+    binary_list = parse_binary_list(lines, cwd=str(tmp_path))
+    assert sorted(binary_list['filetype'].unique()) == synthetic.filetypes
+    assert binary_list['time'].min() == pd.Timestamp('2024-01-01 12:00')
+    for path in binary_list['directory'] + '/' + binary_list['filename']:
+        assert os.path.getsize(path) == 4096
+    first = os.path.join(binary_list['directory'][0], binary_list['filename'][0])
+    with open(first, 'rb') as f:
+        header = f.read(1024).decode('ascii', errors='ignore')
+    assert 'fileopen_time:    Mon_Jan__1_12:00:00_2024' in header
+    # every file is in the first directory, the other one has a duplicated subset
+    counts = binary_list.groupby(binary_list['directory'].str.contains('from-glider-0')).size()
+    assert counts[True] > counts[False] > 0
+
+
+def test_make_segments():
+    segment_info = synthetic.make_segments(2000, seed=1)
+    assert segment_info['source_file'].is_unique
+    assert (segment_info['t1'] > segment_info['t0']).all()
+    # shuffled like ERDDAP's source_file order
+    assert not segment_info['t0'].is_monotonic_increasing
+    flagged = flag_segments(segment_info)['tbdFlag']
+    assert 0 < flagged.mean() < 0.1
@@ -0,0 +1,95 @@
+import os
+import gsw
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+import shapely
+import track_index
+from track_index import TrackIndex, extent_geometry, load_track, load_tracks, track_metrics
+
+tracks = {'ru40-20240101T0000': np.array([[-74.0, 39.0], [-73.0, 40.0]]),
+          'ru39-20240101T0000': np.array([[-70.0, 42.0], [-69.0, 43.0]]),
+          'ru38-20240101T0000': np.array([[179.5, 10.0]])}
+
+
+@pytest.fixture
+def fetches(tmp_path, monkeypatch):
+    fetched = []
+
+    def fetch_track(deployment):
+        fetched.append(deployment)
+        return np.array([[-74.0, 39.0], [np.nan, np.nan], [-73.0, 40.0]])
+    monkeypatch.setattr(track_index, 'track_dir', str(tmp_path))
+    monkeypatch.setattr(track_index, 'fetch_track', fetch_track)
+    return fetched
+
+
+def test_query_box_and_antimeridian():
+    index = TrackIndex(tracks)
+    assert index.query(extent_geometry([-75, -72, 38, 41])) == ['ru40-20240101T0000']
+    assert index.query(extent_geometry([179, -179, 0, 20])) == ['ru38-20240101T0000']
+    assert index.query(shapely.from_wkt('POLYGON ((-71 41, -68 41, -68 44, -71 41))')) == ['ru39-20240101T0000']
+    assert index.query(extent_geometry([0, 10, 0, 10])) == []
+
+
+def test_recovered_tracks_are_cached_ongoing_tracks_expire(fetches, tmp_path):
+    load_track('ru40-20240101T0000')
+    load_track('ru40-20240101T0000')
+    load_track('ru39-20250101T0000', ongoing=True)
+    stale = os.path.getmtime(tmp_path / 'ru39-20250101T0000.npy') - track_index.ongoing_max_age - 1
+    os.utime(tmp_path / 'ru39-20250101T0000.npy', (stale, stale))
+    load_track('ru39-20250101T0000', ongoing=True)
+    assert fetches == ['ru40-20240101T0000', 'ru39-20250101T0000', 'ru39-20250101T0000']
+
+
+def test_load_tracks_drops_missing_positions(fetches):
+    catalog = pd.DataFrame({'deployment_name': ['ru40-20240101T0000'], 'ongoing': [False]})
+    loaded = load_tracks(catalog, workers=2)
+    np.testing.assert_array_equal(loaded['ru40-20240101T0000'], [[-74, 39], [-73, 40]])
+
+
+def test_load_tracks_reports_skipped_deployments(tmp_path, monkeypatch, capsys):
+    def fetch_track(deployment):
+        if deployment == 'ru39-20240101T0000':
+            raise requests.HTTPError('500 Server Error')
+        if deployment == 'ru38-20240101T0000':
+            raise IndexError('list index out of range')
+        return tracks['ru40-20240101T0000']
+    monkeypatch.setattr(track_index, 'track_dir', str(tmp_path))
+    monkeypatch.setattr(track_index, 'fetch_track', fetch_track)
+    catalog = pd.DataFrame({'deployment_name': list(tracks), 'ongoing': False})
+    assert list(load_tracks(catalog, workers=2)) == ['ru40-20240101T0000']
+    err = capsys.readouterr().err
+    assert 'Unable to load tracks for 2 deployments' in err
+    assert 'ru39-20240101T0000' in err and 'ru38-20240101T0000' in err
+
+
+def test_load_tracks_does_not_hide_bugs(tmp_path, monkeypatch):
+    def fetch_track(deployment):
+        raise TypeError('bug')
+    monkeypatch.setattr(track_index, 'track_dir', str(tmp_path))
+    monkeypatch.setattr(track_index, 'fetch_track', fetch_track)
+    with pytest.raises(TypeError):
+        load_tracks(pd.DataFrame({'deployment_name': ['ru40-20240101T0000'], 'ongoing': [False]}))
+
+
+def test_track_metrics_one_pass_matches_each_track():
+    tracks = {'a': np.array([[-74.0, 39.0], [-73.9, 39.0], [-73.5, 39.2]]),
+              'b': np.array([[10.0, 50.0]]),
+              'c': np.array([[-70.0, 40.0], [-70.0, 40.1]])}
+    metrics = track_metrics(tracks, pd.Series({'a': 3600.0, 'c': 0.0})).set_index('deployment_name')
+    for name in ['a', 'c']:
+        steps = gsw.distance(tracks[name][:, 0], tracks[name][:, 1])/1000
+        assert metrics.loc[name, 'track_distance_km'] == pytest.approx(steps.sum())
+        assert metrics.loc[name, 'max_gap_km'] == pytest.approx(steps.max())
+    # no step from the end of one track to the start of the next
+    assert metrics.loc['b', 'track_distance_km'] == 0
+    assert metrics.loc['b', 'max_gap_km'] == 0
+    assert metrics.loc['a', 'mean_speed_m_s'] == pytest.approx(metrics.loc['a', 'track_distance_km']*1000/3600)
+    assert np.isnan(metrics.loc['b', 'mean_speed_m_s'])
+    assert np.isnan(metrics.loc['c', 'mean_speed_m_s'])
+
+
+def test_track_metrics_no_tracks():
+    assert track_metrics({}).empty